@@ -0,0 +1,128 @@
+"""
+Idempotency-Key support for retried writes
+
+Clients on flaky networks retry POSTs whose response they never saw. When a
+request carries an Idempotency-Key header, @idempotent stores the rendered
+response in the cache under (user, endpoint, key) for IDEMPOTENCY_KEY_TTL:
+
+- the first request claims the key with an atomic cache.add and runs;
+- a duplicate that arrives while it runs waits for its result (up to
+  IDEMPOTENCY_WAIT_TIMEOUT, then 409);
+- later duplicates get the stored status, headers and body byte for byte,
+  marked with an Idempotent-Replayed header, without running the view;
+- reusing a key with a different request body is refused with 422.
+
+Server errors and exceptions release the key so the retry runs again.
+Requests without the header are not affected.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+CACHE_PREFIX = 'idempotency:'
+MAX_KEY_LENGTH = 255
+# Headers Django or DRF set again on every response
+SKIPPED_HEADERS = {'vary', 'allow', 'content-length'}
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_key(request, view_name, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'{CACHE_PREFIX}{request.user.pk}:{view_name}:{digest}'
+
+
+def _replay(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _wait(cache_key):
+    """The finished entry for cache_key, or None if the key was released or the wait timed out"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        entry = cache.get(cache_key)
+        if entry is None or entry['state'] == 'done':
+            return entry
+    return None
+
+
+def idempotent(view):
+    """Make a DRF view method safe to retry with an Idempotency-Key header"""
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(request, f'{type(self).__name__}.{view.__name__}', key)
+        fingerprint = _fingerprint(request)
+        claim = {'state': 'running', 'fingerprint': fingerprint}
+        while not cache.add(cache_key, claim, settings.IDEMPOTENCY_WAIT_TIMEOUT + 60):
+            entry = cache.get(cache_key)
+            if entry is None:
+                # Released or expired between add and get; try to claim it again
+                continue
+            if entry['fingerprint'] != fingerprint:
+                return Response({
+                    'error': f'{HEADER} was already used for a different request'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if entry['state'] == 'running':
+                entry = _wait(cache_key)
+                if entry is None:
+                    if cache.get(cache_key) is None:
+                        continue
+                    return Response({
+                        'error': f'A request with this {HEADER} is still being processed'
+                    }, status=status.HTTP_409_CONFLICT)
+            return _replay(entry)
+
+        try:
+            response = view(self, request, *args, **kwargs)
+            if isinstance(response, Response):
+                # Render now so the stored bytes are exactly what this client gets
+                response = self.finalize_response(request, response, *args, **kwargs)
+                response.render()
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code >= 500 or getattr(response, 'streaming', False):
+            cache.delete(cache_key)
+            return response
+        cache.set(cache_key, {
+            'state': 'done',
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'headers': [(name, value) for name, value in response.items() if name.lower() not in SKIPPED_HEADERS],
+            'content': response.content,
+        }, settings.IDEMPOTENCY_KEY_TTL)
+        return response
+
+    return wrapper
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -78,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -91,6 +93,36 @@ DATABASES = {
 }
 
 
+# Password hashing
+# PASSWORD_HASHER picks the hasher for new hashes (pbkdf2, scrypt or argon2).
+# Existing hashes made with another algorithm or work factor are upgraded
+# transparently the next time the user logs in.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '1000000'))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', str(2 ** 14)))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', '2'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', '102400'))
+
+_PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'users.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Login/registration hashing runs in this many worker threads (0 = inline on
+# Django's sync thread); requests beyond AUTH_HASHER_MAX_PENDING waiting jobs
+# are rejected with 503
+AUTH_HASHER_WORKERS = int(os.getenv('AUTH_HASHER_WORKERS', str(os.cpu_count() or 1)))
+AUTH_HASHER_MAX_PENDING = int(os.getenv('AUTH_HASHER_MAX_PENDING', '64'))
+
+# Bulk onboarding: rows handled per batch and processes used for password hashing
+ONBOARDING_CHUNK_SIZE = 500
+ONBOARDING_HASH_WORKERS = int(os.getenv('ONBOARDING_HASH_WORKERS', str(os.cpu_count() or 1)))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -131,6 +163,115 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Profile pictures are re-encoded and thumbnailed in a worker pool
+# (PROFILE_IMAGE_WORKERS = 0 processes them inline after the upload commits)
+PROFILE_IMAGE_WORKERS = int(os.getenv('PROFILE_IMAGE_WORKERS', '2'))
+PROFILE_PICTURE_MAX_SIZE = 1024
+PROFILE_PICTURE_SIZES = [64, 160, 320]
+
+# Voice input is re-encoded to mono Opus by ffmpeg in a worker pool
+# (VOICE_TRANSCODE_WORKERS = 0 transcodes inline after the upload commits)
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+VOICE_TRANSCODE_WORKERS = int(os.getenv('VOICE_TRANSCODE_WORKERS', '2'))
+VOICE_TRANSCODE_TIMEOUT = 120
+VOICE_BITRATE = os.getenv('VOICE_BITRATE', '24k')
+
+# Scheme popularity counters are buffered per process and flushed in batches
+SCHEME_STATS_FLUSH_INTERVAL = int(os.getenv('SCHEME_STATS_FLUSH_INTERVAL', '5'))
+SCHEME_STATS_FLUSH_SIZE = int(os.getenv('SCHEME_STATS_FLUSH_SIZE', '500'))
+
+# Trending schemes: scores halve every TRENDING_HALF_LIFE; each process
+# merges its events into the database every TRENDING_CHECKPOINT_INTERVAL seconds
+TRENDING_HALF_LIFE = timedelta(days=2)
+TRENDING_CHECKPOINT_INTERVAL = int(os.getenv('TRENDING_CHECKPOINT_INTERVAL', '60'))
+
+# Co-occurrence recommendations: neighbours kept per scheme, and the number
+# of shared users a neighbour needs before it is recommended
+RECOMMENDATION_NEIGHBOURS = 20
+RECOMMENDATION_MIN_SUPPORT = int(os.getenv('RECOMMENDATION_MIN_SUPPORT', '2'))
+
+# New schemes are matched against a columnar snapshot of user profiles and an
+# application reminder is queued for each eligible user, ELIGIBILITY_MATCH_CHUNK_SIZE
+# users at a time (ELIGIBILITY_MATCH_WORKERS = 0 matches inline after the scheme commits)
+NOTIFY_ELIGIBLE_ON_NEW_SCHEME = os.getenv('NOTIFY_ELIGIBLE_ON_NEW_SCHEME', 'True') == 'True'
+ELIGIBILITY_MATCH_WORKERS = int(os.getenv('ELIGIBILITY_MATCH_WORKERS', '1'))
+ELIGIBILITY_MATCH_CHUNK_SIZE = 5000
+
+# Language model used by the chatbot and offline translation; BACKEND is a
+# chatbot.llm class path and the remaining keys are passed to it lowercased
+LLM_BACKEND = {
+    'BACKEND': os.getenv('LLM_BACKEND', 'chatbot.llm.OpenAIBackend'),
+    'MODEL': os.getenv('LLM_MODEL', 'gpt-3.5-turbo'),
+}
+
+# Deadline, document, apply-link and eligibility questions about a named scheme
+# are answered from Scheme fields without the LLM when the intent classifier is
+# at least this confident
+CHATBOT_FAST_PATH = os.getenv('CHATBOT_FAST_PATH', 'True') == 'True'
+CHATBOT_FAST_PATH_MIN_CONFIDENCE = float(os.getenv('CHATBOT_FAST_PATH_MIN_CONFIDENCE', '0.6'))
+
+# Replies to json/structured/list prompt templates that are still invalid after
+# the local repair pass are asked for again at most this many times
+STRUCTURED_OUTPUT_MAX_RETRIES = int(os.getenv('STRUCTURED_OUTPUT_MAX_RETRIES', '1'))
+
+# Scheme content is translated offline into these languages and served with ?lang=
+TRANSLATION_LANGUAGES = {'hi': 'Hindi'}
+# translate_schemes sends this many schemes per LLM request, at most
+# TRANSLATION_REQUESTS_PER_MINUTE requests a minute
+TRANSLATION_BATCH_SIZE = int(os.getenv('TRANSLATION_BATCH_SIZE', '5'))
+TRANSLATION_REQUESTS_PER_MINUTE = int(os.getenv('TRANSLATION_REQUESTS_PER_MINUTE', '20'))
+
+# Requests sent with an Idempotency-Key header (send_message, create_reminder,
+# save_scheme) are answered from the stored response for this many seconds; a
+# duplicate of a request still running waits up to IDEMPOTENCY_WAIT_TIMEOUT
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '60'))
+
+# Document vault
+# Chunks are staged on local disk and moved to default storage once complete
+VAULT_STAGING_DIR = os.getenv('VAULT_STAGING_DIR', os.path.join(BASE_DIR, 'vault_staging'))
+VAULT_CHUNK_SIZE = int(os.getenv('VAULT_CHUNK_SIZE', 1024 * 1024))
+VAULT_MAX_FILE_SIZE = int(os.getenv('VAULT_MAX_FILE_SIZE', 20 * 1024 * 1024))
+VAULT_UPLOAD_TTL = timedelta(hours=int(os.getenv('VAULT_UPLOAD_TTL_HOURS', 24)))
+
+# Cache
+# Set REDIS_URL to share cached data (e.g. token lookups) between processes
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Real-time notifications (WebSockets)
+# Redis carries events between processes when REDIS_URL is set; the in-memory
+# layer only reaches sockets of the same process (tests, runserver)
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+# Open sockets are counted in the cache; a count not refreshed by a ping for
+# this long is dropped (e.g. after a worker crash)
+NOTIFICATIONS_PRESENCE_TTL = int(os.getenv('NOTIFICATIONS_PRESENCE_TTL', 24 * 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -142,7 +283,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -153,6 +294,19 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# API tokens expire after AUTH_TOKEN_TTL of inactivity; use extends the expiry
+# at most once per AUTH_TOKEN_RENEW_INTERVAL
+AUTH_TOKEN_TTL = timedelta(days=7)
+AUTH_TOKEN_RENEW_INTERVAL = timedelta(hours=1)
+
+# Token authentication cache (seconds)
+TOKEN_AUTH_CACHE_TTL = 60
+TOKEN_AUTH_LOCAL_CACHE_TTL = 2
+TOKEN_AUTH_LOCAL_CACHE_SIZE = 10000
+
+# Cached profile snapshots (seconds); writes invalidate them immediately
+PROFILE_CACHE_TTL = 600
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 OPENAI_MODEL = 'gpt-4'
@@ -161,10 +315,38 @@ OPENAI_MODEL = 'gpt-4'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'smartgov@example.com'
 
+# Reminder delivery: users handled per dispatch chunk and the SMS gateway class
+REMINDER_DISPATCH_CHUNK_SIZE = 500
+# Reminders claimed by a dispatcher that died are retried after this long
+REMINDER_CLAIM_TIMEOUT = timedelta(minutes=10)
+# Failed deliveries are retried after REMINDER_RETRY_DELAY, doubling every
+# attempt, and the reminder is marked failed after REMINDER_MAX_ATTEMPTS
+REMINDER_RETRY_DELAY = timedelta(minutes=5)
+REMINDER_MAX_ATTEMPTS = int(os.getenv('REMINDER_MAX_ATTEMPTS', 5))
+SMS_GATEWAY = os.getenv('SMS_GATEWAY', 'schemes.sms.ConsoleSMSGateway')
+
+# Near-term reminder scheduler: how far ahead it loads reminders and how often
+# (seconds) it renews its leader lease and checks for changes
+REMINDER_SCHEDULER_WINDOW = timedelta(minutes=15)
+REMINDER_SCHEDULER_TICK = 0.25
+
+# Deadline reminders are generated this long before a scheme's deadline for
+# everyone who saved it (and every eligible user when the flag is set)
+DEADLINE_REMINDER_LEAD = timedelta(days=3)
+DEADLINE_REMINDERS_FOR_ELIGIBLE = False
+
 # Celery Configuration (for background tasks like reminders)
 CELERY_BROKER_URL = 'redis://localhost:6379'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379'
 
+# Aadhar verification
+# Aadhar numbers are indexed by HMAC(AADHAR_HMAC_KEY, number); changing the key
+# requires recomputing AadharVerification.aadhar_hash
+AADHAR_HMAC_KEY = os.getenv('AADHAR_HMAC_KEY', SECRET_KEY)
+AADHAR_VERIFICATION_CLIENT = os.getenv('AADHAR_VERIFICATION_CLIENT', 'users.aadhar.StubAadharVerificationClient')
+AADHAR_BATCH_CONCURRENCY = 50
+AADHAR_STUB_LATENCY = 0
+
 # Google Cloud Speech-to-Text and Text-to-Speech (for voice features)
 GOOGLE_CLOUD_PROJECT = os.getenv('GOOGLE_CLOUD_PROJECT', '')
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', '')
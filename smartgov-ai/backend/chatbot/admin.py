@@ -28,7 +28,7 @@ class PromptTemplateAdmin(admin.ModelAdmin):
 
 @admin.register(AIInteractionLog)
 class AIInteractionLogAdmin(admin.ModelAdmin):
-    list_display = ['user', 'language_used', 'accuracy_rating', 'timestamp']
-    list_filter = ['language_used', 'accuracy_rating', 'timestamp']
+    list_display = ['user', 'language_used', 'served_by', 'intent', 'accuracy_rating', 'timestamp']
+    list_filter = ['language_used', 'served_by', 'intent', 'accuracy_rating', 'timestamp']
     search_fields = ['user__username', 'user_input']
     readonly_fields = ['timestamp']
@@ -0,0 +1,110 @@
+"""
+Voice message transcoding
+
+Browsers often upload voice input as uncompressed WAV. After the upload
+commits, a worker pool runs ffmpeg to re-encode it as mono Opus at a
+speech bitrate (VOICE_BITRATE). The message is switched to the new file
+with a compare-and-set on the stored name, and the original is deleted
+only once that succeeds.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg does the work in a child process, so threads only wait on it
+_executor = (
+    ThreadPoolExecutor(max_workers=settings.VOICE_TRANSCODE_WORKERS, thread_name_prefix='voice-transcode')
+    if settings.VOICE_TRANSCODE_WORKERS else None
+)
+
+
+class TranscodeError(Exception):
+    """ffmpeg is missing or could not decode the upload"""
+
+
+def schedule_transcode(message_id, name):
+    """Transcode the voice input once the transaction that saved it commits"""
+    def submit():
+        if _executor is None:
+            transcode_voice_input(message_id, name)
+        else:
+            _executor.submit(transcode_voice_input, message_id, name)
+    transaction.on_commit(submit)
+
+
+def _local_copy(name, workdir):
+    """Path to the stored file on local disk, copying it from remote storage if needed"""
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        path = os.path.join(workdir, 'source' + os.path.splitext(name)[1])
+        with default_storage.open(name, 'rb') as source, open(path, 'wb') as local:
+            shutil.copyfileobj(source, local)
+        return path
+
+
+def encode_opus(source, target):
+    command = [
+        settings.FFMPEG_BINARY, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', source,
+        '-vn', '-map_metadata', '-1',
+        '-ac', '1', '-ar', '16000',
+        '-c:a', 'libopus', '-b:a', settings.VOICE_BITRATE, '-application', 'voip',
+        target,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=settings.VOICE_TRANSCODE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise TranscodeError(str(e))
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode(errors='replace').strip()[-500:])
+
+
+def transcode_voice_input(message_id, name):
+    """Re-encode one message's voice input; returns True if the stored file was replaced"""
+    with tempfile.TemporaryDirectory(prefix='voice-') as workdir:
+        target = os.path.join(workdir, 'voice.ogg')
+        try:
+            # Inside the guard: in the pool an unhandled error would vanish unlogged
+            original_size = default_storage.size(name)
+            encode_opus(_local_copy(name, workdir), target)
+        except (TranscodeError, OSError) as e:
+            logger.warning('Could not transcode voice input %s of message %s: %s', name, message_id, e)
+            return False
+
+        encoded_size = os.path.getsize(target)
+        if encoded_size >= original_size:
+            # Already compact (e.g. an Opus upload); keep it as it is
+            ChatMessage.objects.filter(pk=message_id, voice_input=name).update(
+                voice_original_size=original_size,
+                voice_input_size=original_size,
+                voice_transcoded_at=timezone.now()
+            )
+            return False
+
+        stem = os.path.splitext(os.path.basename(name))[0]
+        with open(target, 'rb') as encoded:
+            new_name = default_storage.save(f'voice_messages/{stem}.ogg', File(encoded))
+
+    # Compare-and-set: only replace the file this job was started for
+    updated = ChatMessage.objects.filter(pk=message_id, voice_input=name).update(
+        voice_input=new_name,
+        voice_original_size=original_size,
+        voice_input_size=encoded_size,
+        voice_transcoded_at=timezone.now()
+    )
+    default_storage.delete(name if updated else new_name)
+    return bool(updated)
@@ -0,0 +1,230 @@
+"""
+Zero-LLM answers for factual chatbot questions
+
+send_message first classifies the question (intents.py) and looks for the
+scheme it names. When the intent is a direct lookup (deadline, documents,
+apply link, eligibility), the classifier is confident and exactly one
+scheme matches, the answer is filled into an English or Hindi template
+from Scheme fields. Everything else goes to the LLM.
+
+Scheme names are matched against an in-process index of names, their
+bracketed short forms (e.g. PM-KISAN) and stored Hindi translations. The
+index is rebuilt when INDEX_VERSION_KEY changes, which scheme and
+translation saves bump.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from schemes.documents import document_label, get_scheme_documents
+from schemes.eligibility import has_complete_profile, unmet_criteria
+from schemes.models import Scheme, SchemeTranslation
+from schemes.translations import translated_fields
+from . import intents
+
+INDEX_VERSION_KEY = 'chatbot:scheme-index-version'
+# Words too common in scheme names to identify one on their own
+GENERIC_WORDS = {
+    'scheme', 'yojana', 'yojna', 'pradhan', 'mantri', 'pm', 'national', 'rashtriya', 'the', 'of', 'for',
+    'and', 'india', 'bharat', 'programme', 'program', 'mission', 'abhiyan', 'government', 'state', 'central',
+    'योजना', 'प्रधानमंत्री', 'प्रधान', 'मंत्री', 'राष्ट्रीय', 'भारत', 'की', 'के', 'का',
+}
+MIN_TOKEN_OVERLAP = 0.6
+
+TEMPLATES = {
+    'en': {
+        'deadline': 'The last date to apply for {name} is {date} ({days} days left). Apply at {link}',
+        'deadline_today': 'Today is the last date to apply for {name}. Apply at {link}',
+        'deadline_passed': 'Applications for {name} closed on {date}.',
+        'no_deadline': '{name} has no fixed last date; you can apply any time at {link}',
+        'documents': 'Documents needed for {name}:\n{items}',
+        'apply_link': 'You can apply for {name} online at {link}',
+        'eligible': 'Based on your profile (age {age}, {occupation}, {state}) you are eligible for {name}. Apply at {link}',
+        'not_eligible': 'Based on your profile you are not eligible for {name}:\n{items}',
+        'profile_incomplete': 'Please add your age, occupation and state to your profile so I can check your eligibility for {name}.',
+        'age_min': 'You must be at least {value} years old',
+        'age_max': 'You must be at most {value} years old',
+        'state': 'It is only available in: {value}',
+        'occupation': 'It is only for: {value}',
+        'rule': 'Requirement not met: {value}',
+    },
+    'hi': {
+        'deadline': '{name} के लिए आवेदन की अंतिम तिथि {date} है ({days} दिन बाकी)। आवेदन करें: {link}',
+        'deadline_today': '{name} के लिए आवेदन की आज अंतिम तिथि है। आवेदन करें: {link}',
+        'deadline_passed': '{name} के लिए आवेदन {date} को बंद हो गए।',
+        'no_deadline': '{name} की कोई निश्चित अंतिम तिथि नहीं है; आप कभी भी यहाँ आवेदन कर सकते हैं: {link}',
+        'documents': '{name} के लिए आवश्यक दस्तावेज़:\n{items}',
+        'apply_link': '{name} के लिए ऑनलाइन आवेदन यहाँ करें: {link}',
+        'eligible': 'आपकी प्रोफ़ाइल (आयु {age}, {occupation}, {state}) के अनुसार आप {name} के लिए पात्र हैं। आवेदन करें: {link}',
+        'not_eligible': 'आपकी प्रोफ़ाइल के अनुसार आप {name} के लिए पात्र नहीं हैं:\n{items}',
+        'profile_incomplete': '{name} के लिए आपकी पात्रता जाँचने के लिए कृपया अपनी प्रोफ़ाइल में आयु, व्यवसाय और राज्य जोड़ें।',
+        'age_min': 'आयु कम से कम {value} वर्ष होनी चाहिए',
+        'age_max': 'आयु अधिकतम {value} वर्ष होनी चाहिए',
+        'state': 'यह केवल इन राज्यों में उपलब्ध है: {value}',
+        'occupation': 'यह केवल इनके लिए है: {value}',
+        'rule': 'यह शर्त पूरी नहीं होती: {value}',
+    },
+}
+DATE_FORMATS = {'en': '%d %B %Y', 'hi': '%d-%m-%Y'}
+
+
+def normalize(text):
+    return ' '.join(intents.WORD_RE.findall(intents.normalize(text)))
+
+
+def invalidate_scheme_index():
+    cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+
+
+class SchemeIndex:
+    """Finds the one scheme a question names"""
+
+    def __init__(self, aliases):
+        # aliases: [(scheme_id, alias text)]
+        self.phrases = []
+        self.tokens = {}
+        self.distinctive = {}
+        for scheme_id, alias in aliases:
+            phrase = normalize(alias)
+            if not phrase:
+                continue
+            self.phrases.append((f' {phrase} ', phrase.replace(' ', ''), scheme_id))
+            words = set(phrase.split()) - GENERIC_WORDS
+            if words:
+                self.distinctive.setdefault(scheme_id, []).append(words)
+                for word in words:
+                    self.tokens.setdefault(word, set()).add(scheme_id)
+        # Longest aliases first, so 'pm kisan maandhan' wins over 'pm kisan'
+        self.phrases.sort(key=lambda entry: -len(entry[0]))
+
+    @classmethod
+    def build(cls):
+        aliases = []
+        for scheme_id, name in Scheme.objects.values_list('id', 'name'):
+            aliases.append((scheme_id, name))
+            outer = re.sub(r'\(.*?\)', ' ', name)
+            if outer != name:
+                aliases.append((scheme_id, outer))
+                aliases.extend((scheme_id, short) for short in re.findall(r'\((.*?)\)', name))
+        for scheme_id, fields in SchemeTranslation.objects.values_list('scheme_id', 'fields'):
+            if fields.get('name'):
+                aliases.append((scheme_id, fields['name']))
+        return cls(aliases)
+
+    def match(self, text):
+        """Scheme id named in text, or None if there is none or it is ambiguous"""
+        phrase = normalize(text)
+        padded, compact = f' {phrase} ', phrase.replace(' ', '')
+        for alias, alias_compact, scheme_id in self.phrases:
+            if alias in padded or (len(alias_compact) >= 5 and alias_compact in compact):
+                return scheme_id
+
+        words = set(phrase.split()) - GENERIC_WORDS
+        candidates = set().union(*(self.tokens.get(word, ()) for word in words)) if words else set()
+        scores = {}
+        for scheme_id in candidates:
+            scores[scheme_id] = max(
+                len(distinctive & words) / len(distinctive) for distinctive in self.distinctive[scheme_id]
+            )
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        if not ranked or ranked[0][1] < MIN_TOKEN_OVERLAP:
+            return None
+        if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+            return None
+        return ranked[0][0]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_scheme_index():
+    global _index, _index_version
+    version = cache.get(INDEX_VERSION_KEY)
+    if _index is None or version != _index_version:
+        with _index_lock:
+            # Threads that queued behind the rebuild find it done
+            if _index is None or version != _index_version:
+                _index = SchemeIndex.build()
+                _index_version = version
+    return _index
+
+
+@dataclass
+class Route:
+    intent: str
+    confidence: float
+    scheme_id: int = None
+    answer: str = None  # None: ask the LLM
+
+
+def _scheme_name(scheme, language):
+    if language != 'en':
+        fields = translated_fields(scheme, language)
+        if fields and fields.get('name'):
+            return fields['name']
+    return scheme.name
+
+
+def render_answer(intent, scheme, user, language):
+    """Answer text from the scheme's fields, or None if they can't answer the question"""
+    templates = TEMPLATES[language]
+    name = _scheme_name(scheme, language)
+    link = scheme.apply_link
+
+    if intent == 'deadline':
+        if scheme.deadline is None:
+            return templates['no_deadline'].format(name=name, link=link)
+        deadline = timezone.localtime(scheme.deadline)
+        date = deadline.strftime(DATE_FORMATS[language])
+        days = (deadline.date() - timezone.localdate()).days
+        if deadline <= timezone.now():
+            return templates['deadline_passed'].format(name=name, date=date)
+        if days == 0:
+            return templates['deadline_today'].format(name=name, link=link)
+        return templates['deadline'].format(name=name, date=date, days=days, link=link)
+
+    if intent == 'documents':
+        keys = get_scheme_documents([scheme.pk]).get(scheme.pk)
+        if not keys:
+            return None
+        return templates['documents'].format(name=name, items='\n'.join(f'- {document_label(key)}' for key in keys))
+
+    if intent == 'apply_link':
+        return templates['apply_link'].format(name=name, link=link)
+
+    if intent == 'eligibility':
+        if not has_complete_profile(user):
+            return templates['profile_incomplete'].format(name=name)
+        unmet = unmet_criteria(scheme, user)
+        if not unmet:
+            return templates['eligible'].format(
+                name=name, age=user.age, occupation=user.occupation, state=user.state, link=link
+            )
+        items = '\n'.join(f'- {templates[criterion].format(value=value)}' for criterion, value in unmet)
+        return templates['not_eligible'].format(name=name, items=items)
+    return None
+
+
+def route(message, user, language='en', scheme_id=None):
+    """Classify a question and answer it from Scheme fields when that is safe"""
+    intent, confidence = intents.classify(message)
+    decision = Route(intent=intent, confidence=confidence)
+    if (
+        intent == intents.OTHER
+        or confidence < settings.CHATBOT_FAST_PATH_MIN_CONFIDENCE
+        or language not in TEMPLATES
+    ):
+        return decision
+
+    decision.scheme_id = int(scheme_id) if str(scheme_id or '').isdigit() else get_scheme_index().match(message)
+    scheme = Scheme.objects.filter(pk=decision.scheme_id).first() if decision.scheme_id else None
+    if scheme is not None:
+        decision.answer = render_answer(intent, scheme, user, language)
+    return decision
@@ -0,0 +1,178 @@
+"""
+Local intent classifier for factual chatbot questions
+
+A multinomial logistic regression over hashed features: word unigrams and
+bigrams plus character 3-grams, which copes with Hindi, romanized Hindi
+and typos. Features are hashed with CRC32 into FEATURE_DIMENSIONS buckets,
+so there is no vocabulary to store and results are stable across processes.
+
+The model is trained from the seed phrases below the first time it is
+needed (well under a second on one core) and kept in memory. Scheme names
+are filled into the phrases during training so the model learns to ignore
+them; the entity matcher in fast_path.py finds them instead.
+"""
+import re
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+FEATURE_DIMENSIONS = 2 ** 18
+OTHER = 'other'
+INTENTS = ('deadline', 'documents', 'apply_link', 'eligibility', OTHER)
+
+SAMPLE_SCHEMES = [
+    'pm kisan', 'ayushman bharat', 'pradhan mantri awas yojana', 'sukanya samriddhi',
+    'mudra loan', 'national scholarship', 'ujjwala yojana', 'atal pension yojana',
+]
+
+SEED_PHRASES = {
+    'deadline': [
+        'what is the last date for {s}', 'last date to apply for {s}', 'deadline for {s}',
+        'when is the deadline of {s}', 'when does {s} close', 'till when can i apply for {s}',
+        'is {s} still open', '{s} last date', 'when will {s} applications end', 'closing date of {s}',
+        'how many days left to apply for {s}', '{s} ki last date kya hai', '{s} ki antim tithi',
+        '{s} kab tak apply kar sakte hain', '{s} की अंतिम तिथि क्या है', '{s} में आवेदन की आखिरी तारीख',
+        '{s} के लिए कब तक आवेदन कर सकते हैं', '{s} की लास्ट डेट',
+    ],
+    'documents': [
+        'what documents are needed for {s}', 'documents required for {s}', 'which papers do i need for {s}',
+        'list of documents for {s}', 'what should i submit for {s}', 'do i need aadhaar for {s}',
+        '{s} documents', 'certificates required to apply for {s}', 'what proofs are needed for {s}',
+        'paperwork for {s}', '{s} ke liye kaun se documents chahiye', '{s} ke kagaz',
+        '{s} ke liye dastavej', '{s} के लिए कौन से दस्तावेज़ चाहिए', '{s} के लिए आवश्यक दस्तावेज',
+        '{s} में कौन से कागज़ लगेंगे', '{s} के डॉक्यूमेंट',
+    ],
+    'apply_link': [
+        'how do i apply for {s}', 'where can i apply for {s}', 'apply link for {s}',
+        'website of {s}', 'give me the link for {s}', 'online application for {s}',
+        'official portal of {s}', 'registration link {s}', 'url to apply {s}', '{s} apply online',
+        '{s} ka link', '{s} ke liye apply kaise kare', '{s} ki website', '{s} के लिए आवेदन कैसे करें',
+        '{s} का लिंक', '{s} की वेबसाइट', '{s} में ऑनलाइन आवेदन',
+    ],
+    'eligibility': [
+        'am i eligible for {s}', 'can i apply for {s}', 'do i qualify for {s}', 'eligibility of {s}',
+        'who can apply for {s}', 'am i eligible', 'is my profile eligible for {s}', 'can i get {s}',
+        'will i get benefits of {s}', 'eligibility criteria for {s}', 'kya main {s} ke liye eligible hoon',
+        'kya mujhe {s} milega', '{s} ki patrata', 'क्या मैं {s} के लिए पात्र हूँ', '{s} के लिए पात्रता',
+        'क्या मुझे {s} का लाभ मिलेगा', 'क्या मैं {s} में आवेदन कर सकता हूँ',
+    ],
+    OTHER: [
+        'hello', 'hi there', 'thank you', 'thanks a lot', 'what is {s}', 'tell me about {s}',
+        'explain the benefits of {s}', 'how much money do i get from {s}', 'my application was rejected',
+        'compare {s} with other schemes', 'which schemes are best for farmers', 'what schemes are there for women',
+        'why was my payment delayed', 'how does {s} work', 'who runs {s}', 'can you help me',
+        'what is the status of my application', 'i uploaded the wrong document', 'translate this to hindi',
+        'namaste', 'dhanyavaad', '{s} kya hai', '{s} ke fayde', 'नमस्ते', 'धन्यवाद', '{s} क्या है',
+        '{s} के फायदे बताइए', 'किसानों के लिए कौन सी योजनाएं हैं', 'मेरा पैसा कब आएगा',
+    ],
+}
+
+WORD_RE = re.compile(r'[\w\u0900-\u097F]+')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFC', (text or '').lower()).strip()
+
+
+def features(text):
+    """{bucket: count} of hashed word 1-2 grams and character 3-grams"""
+    words = WORD_RE.findall(normalize(text))
+    grams = [f'w:{word}' for word in words]
+    grams += [f'b:{first} {second}' for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f' {word} '
+        grams += [f'c:{padded[i:i + 3]}' for i in range(len(padded) - 2)]
+    buckets = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode()) % FEATURE_DIMENSIONS
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    return buckets
+
+
+def _vectorize(texts):
+    """CSR-style (indices, values, offsets) with each row L2-normalized"""
+    indices, values, offsets = [], [], [0]
+    for text in texts:
+        row = features(text)
+        norm = np.sqrt(sum(count * count for count in row.values())) or 1.0
+        indices.extend(row)
+        values.extend(count / norm for count in row.values())
+        offsets.append(len(indices))
+    return np.array(indices, dtype=np.int64), np.array(values, dtype=np.float32), np.array(offsets, dtype=np.int64)
+
+
+def training_set(phrases=None, names=SAMPLE_SCHEMES):
+    phrases = phrases or SEED_PHRASES
+    texts, labels = [], []
+    for intent, templates in phrases.items():
+        for template in templates:
+            for name in (names if '{s}' in template else [None]):
+                texts.append(template.format(s=name) if name else template)
+                labels.append(INTENTS.index(intent))
+    return texts, np.array(labels, dtype=np.int64)
+
+
+class IntentClassifier:
+    def __init__(self, weights=None, bias=None):
+        self.weights = weights  # (FEATURE_DIMENSIONS, len(INTENTS))
+        self.bias = bias
+
+    def fit(self, texts, labels, epochs=300, learning_rate=4.0, l2=1e-4):
+        """Full-batch gradient descent on the softmax cross-entropy"""
+        indices, values, offsets = _vectorize(texts)
+        rows = np.repeat(np.arange(len(texts)), np.diff(offsets))
+        targets = np.eye(len(INTENTS), dtype=np.float32)[labels]
+        used = np.unique(indices)
+        # Only touched buckets get weights during training
+        local = np.searchsorted(used, indices)
+        weights = np.zeros((len(used), len(INTENTS)), dtype=np.float32)
+        bias = np.zeros(len(INTENTS), dtype=np.float32)
+        for _ in range(epochs):
+            scores = np.add.reduceat(weights[local] * values[:, None], offsets[:-1])
+            probabilities = self._softmax(scores + bias)
+            error = (probabilities - targets) / len(texts)
+            contributions = error[rows] * values[:, None]
+            gradient = np.stack([
+                np.bincount(local, weights=contributions[:, k], minlength=len(used)) for k in range(len(INTENTS))
+            ], axis=1)
+            weights -= learning_rate * (gradient.astype(np.float32) + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        self.weights = np.zeros((FEATURE_DIMENSIONS, len(INTENTS)), dtype=np.float32)
+        self.weights[used] = weights
+        self.bias = bias
+        return self
+
+    @staticmethod
+    def _softmax(scores):
+        scores = scores - scores.max(axis=-1, keepdims=True)
+        exponents = np.exp(scores)
+        return exponents / exponents.sum(axis=-1, keepdims=True)
+
+    def predict(self, text):
+        """(intent, probability) of the most likely intent"""
+        row = features(text)
+        buckets = np.fromiter(row, dtype=np.int64, count=len(row))
+        counts = np.fromiter(row.values(), dtype=np.float32, count=len(row))
+        counts /= np.sqrt((counts * counts).sum()) or 1.0
+        probabilities = self._softmax(counts @ self.weights[buckets] + self.bias)
+        best = int(probabilities.argmax())
+        return INTENTS[best], float(probabilities[best])
+
+
+_classifier = None
+_lock = threading.Lock()
+
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        with _lock:
+            if _classifier is None:
+                _classifier = IntentClassifier().fit(*training_set())
+    return _classifier
+
+
+def classify(text):
+    return get_classifier().predict(text)
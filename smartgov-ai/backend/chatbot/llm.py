@@ -0,0 +1,124 @@
+"""
+Pluggable LLM backends
+
+Everything that talks to a language model (the chatbot, offline scheme
+translation) goes through get_backend(), which builds the class named by
+settings.LLM_BACKEND once per process. A backend takes chat messages and
+returns the reply text, raising LLMError when the model can't be reached.
+"""
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+
+class LLMError(Exception):
+    """The model could not produce a reply"""
+
+
+class LLMUnavailable(LLMError):
+    """The backend is not installed or not configured"""
+
+
+class LLMRateLimited(LLMError):
+    """The provider asked us to slow down; retry later"""
+
+
+class BaseBackend:
+    def __init__(self, model=None, **options):
+        self.model = model
+        self.options = options
+
+    def complete(self, messages, temperature=0.7, max_tokens=500):
+        """Reply text for a list of {'role', 'content'} messages"""
+        raise NotImplementedError
+
+    def stream(self, messages, temperature=0.7, max_tokens=500):
+        """Yield the reply in pieces; backends without streaming yield it whole"""
+        yield self.complete(messages, temperature=temperature, max_tokens=max_tokens)
+
+
+class OpenAIBackend(BaseBackend):
+    """OpenAI chat completions (openai>=1.0 client)"""
+
+    def __init__(self, model=None, api_key=None, **options):
+        super().__init__(model or 'gpt-3.5-turbo', **options)
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self._client = None
+
+    @property
+    def client(self):
+        if openai is None:
+            raise LLMUnavailable('AI service not available. Please try again later.')
+        if not self.api_key:
+            raise LLMUnavailable('OpenAI API key not configured. Please contact administrator.')
+        if self._client is None:
+            self._client = openai.OpenAI(api_key=self.api_key, **self.options)
+        return self._client
+
+    def _create(self, messages, temperature, max_tokens, **kwargs):
+        client = self.client
+        try:
+            return client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+        except openai.RateLimitError as e:
+            raise LLMRateLimited(str(e))
+        except openai.OpenAIError as e:
+            raise LLMError(f'Error communicating with AI service: {e}')
+
+    def complete(self, messages, temperature=0.7, max_tokens=500):
+        response = self._create(messages, temperature, max_tokens)
+        return response.choices[0].message.content or ''
+
+    def stream(self, messages, temperature=0.7, max_tokens=500):
+        try:
+            for chunk in self._create(messages, temperature, max_tokens, stream=True):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            raise LLMError(f'Error communicating with AI service: {e}')
+
+
+class EchoBackend(BaseBackend):
+    """Returns the last user message; for development and tests without a provider"""
+
+    def complete(self, messages, temperature=0.7, max_tokens=500):
+        return next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = dict(settings.LLM_BACKEND)
+        try:
+            backend_class = import_string(config.pop('BACKEND'))
+        except (KeyError, ImportError) as e:
+            raise ImproperlyConfigured(f'Invalid LLM_BACKEND: {e}')
+        _backend = backend_class(**{key.lower(): value for key, value in config.items()})
+    return _backend
+
+
+def complete(system_message, user_message, temperature=0.7, max_tokens=500):
+    """One system + user exchange with the configured backend"""
+    return get_backend().complete(
+        [
+            {'role': 'system', 'content': system_message},
+            {'role': 'user', 'content': user_message},
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
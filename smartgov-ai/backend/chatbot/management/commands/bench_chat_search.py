@@ -0,0 +1,97 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chatbot.models import ChatMessage, ChatSession
+from chatbot.search import _search_fallback, query_terms, search_messages
+from users.models import CustomUser
+
+WORDS = (
+    'scheme apply eligible documents aadhaar ration card income certificate caste bank passbook land records '
+    'deadline registration farmer pension scholarship housing loan subsidy insurance health ayushman kisan '
+    'ujjwala mudra awas student widow disability village district office portal status payment installment '
+    'last date how much amount benefit required submit online offline verification rejected pending approved'
+).split()
+HINDI_WORDS = 'योजना किसान पेंशन आवेदन दस्तावेज़ अंतिम तिथि राशन कार्ड आय प्रमाण पत्र बैंक खाता छात्रवृत्ति आवास'.split()
+QUERIES = [
+    'aadhaar', 'deadline', 'kisan installment', 'scholarship last date', 'ration card rejected', 'ayu',
+    'pension amount', 'आवेदन', 'अंतिम तिथि', 'mudra loan status', 'housing subsidy required documents',
+    # Rare and missing words, where a scan has to read every message
+    'ref 4711', 'passport renewal',
+]
+
+
+def message_text(rng):
+    words = HINDI_WORDS if rng.random() < 0.2 else WORDS
+    text = ' '.join(rng.choices(words, k=rng.randint(8, 80))).capitalize() + '.'
+    if rng.random() < 0.01:
+        text += f' Your application ref {rng.randint(1000, 9999)} is under review.'
+    return text
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat history search for a user with tens of thousands of messages, among other users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=30_000, help='Messages of the searching user')
+        parser.add_argument('--other-users', type=int, default=50)
+        parser.add_argument('--other-messages', type=int, default=2_000, help='Messages per other user')
+        parser.add_argument('--messages-per-session', type=int, default=40)
+        parser.add_argument('--repeat', type=int, default=20, help='Times each query is timed')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create([
+                CustomUser(username=f'bench-search-{i}', email=f'search{i}@example.com')
+                for i in range(options['other_users'] + 1)
+            ])
+            started = time.perf_counter()
+            total = 0
+            for user in users:
+                count = options['messages'] if user is users[0] else options['other_messages']
+                sessions = ChatSession.objects.bulk_create([
+                    ChatSession(user=user, title=f'Session {number}')
+                    for number in range(-(-count // options['messages_per_session']))
+                ])
+                ChatMessage.objects.bulk_create([
+                    ChatMessage(
+                        session=sessions[number // options['messages_per_session']], user=user,
+                        role='user' if number % 2 == 0 else 'assistant', message=message_text(rng),
+                    )
+                    for number in range(count)
+                ], batch_size=2000)
+                total += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Inserted {total:,} messages in {elapsed:.1f}s ({total / elapsed:,.0f}/s with the index triggers)'
+            )
+
+            user = users[0]
+            self.stdout.write(
+                f"{'query':<36}{'results':>8}{'relevance p50':>15}{'p95':>9}{'recent p50':>12}{'p95':>9}{'scan':>9}"
+            )
+            for query in QUERIES:
+                columns = []
+                for recent in (False, True):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        results = search_messages(user, query, recent=recent)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    columns += [timings[len(timings) // 2], timings[int(len(timings) * 0.95)]]
+
+                # What a LIKE '%...%' search over the same messages costs
+                started = time.perf_counter()
+                _search_fallback(user.pk, query_terms(query), None, 20)
+                columns.append((time.perf_counter() - started) * 1000)
+
+                self.stdout.write(
+                    f'{query:<36}{len(results):>8}{columns[0]:>13.1f}ms{columns[1]:>7.1f}ms'
+                    f'{columns[2]:>10.1f}ms{columns[3]:>7.1f}ms{columns[4]:>7.1f}ms'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,134 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.structured import StreamParser, validate
+
+SCHEMA = {
+    'type': 'object',
+    'required': ['documents'],
+    'properties': {
+        'summary': {'type': 'string'},
+        'documents': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['name', 'mandatory'],
+                'properties': {
+                    'name': {'type': 'string', 'minLength': 2},
+                    'mandatory': {'type': 'boolean'},
+                    'note': {'type': 'string'},
+                },
+            },
+        },
+    },
+}
+DOCUMENTS = [
+    'Aadhaar card', 'Ration card', 'Income certificate', 'Caste certificate', 'Bank passbook',
+    'Land records', 'Passport size photograph', 'Domicile certificate', 'Age proof', 'Disability certificate',
+]
+
+
+def clean_reply(rng):
+    documents = [
+        {'name': name, 'mandatory': rng.random() < 0.7, 'note': f'Self-attested copy of the {name.lower()}'}
+        for name in rng.sample(DOCUMENTS, rng.randint(3, 8))
+    ]
+    return json.dumps({'summary': 'Documents you will need to apply', 'documents': documents}, indent=2)
+
+
+# Mistakes models make despite the format instructions
+DEFECTS = {
+    'code_fence': lambda text, rng: f'```json\n{text}\n```',
+    'prose': lambda text, rng: f'Sure! Here are the documents:\n{text}\nLet me know if you need anything else.',
+    'trailing_comma': lambda text, rng: text.replace('\n    }\n  ]', '\n    },\n  ]', 1),
+    'python_literals': lambda text, rng: text.replace('true', 'True').replace('false', 'False'),
+    'single_quotes': lambda text, rng: text.replace('"', "'"),
+    'bare_keys': lambda text, rng: text.replace('"name":', 'name:').replace('"note":', 'note:'),
+    'string_booleans': lambda text, rng: text.replace('true', '"yes"').replace('false', '"no"'),
+    'truncated': lambda text, rng: text[:int(len(text) * rng.uniform(0.6, 0.95))],
+    'missing_field': lambda text, rng: text.replace('"mandatory"', '"required"'),
+    'not_json': lambda text, rng: 'You will need your Aadhaar card, ration card and bank passbook.',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark structured reply parsing: retry rate with and without repair, and time to first item'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replies', type=int, default=2000)
+        parser.add_argument('--defect-rate', type=float, default=0.3, help='Share of replies with one defect')
+        parser.add_argument('--chunk-chars', type=int, default=4, help='Characters per streamed chunk (about a token)')
+        parser.add_argument('--token-ms', type=float, default=25.0, help='Simulated model time per chunk')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        chunk, token_ms = options['chunk_chars'], options['token_ms']
+        replies = []
+        for _ in range(options['replies']):
+            defect = rng.choice(sorted(DEFECTS)) if rng.random() < options['defect_rate'] else None
+            text = clean_reply(rng)
+            replies.append((defect, DEFECTS[defect](text, rng) if defect else text))
+
+        strict_failures = retries = 0
+        by_defect = {}
+        first_item_ms, full_reply_ms = [], []
+        parse_seconds = 0.0
+        characters = 0
+        for defect, text in replies:
+            # What a client parsing the finished reply with json.loads would accept
+            try:
+                value = json.loads(text)
+            except ValueError:
+                strict_ok = False
+            else:
+                strict_ok = isinstance(value, dict) and not validate(value, SCHEMA)
+
+            started = time.perf_counter()
+            parser = StreamParser('structured', SCHEMA)
+            first = None
+            chunks = range(0, len(text), chunk)
+            for number, offset in enumerate(chunks, 1):
+                if parser.feed(text[offset:offset + chunk]) and first is None:
+                    first = number
+            items, result = parser.close()
+            parse_seconds += time.perf_counter() - started
+            characters += len(text)
+
+            strict_failures += not strict_ok
+            retries += not result.ok
+            stats = by_defect.setdefault(defect or 'clean', [0, 0, 0])
+            stats[0] += 1
+            stats[1] += not strict_ok
+            stats[2] += not result.ok
+            if first is None and items:
+                first = len(chunks)
+            if first is not None:
+                first_item_ms.append(first * token_ms)
+                full_reply_ms.append(len(chunks) * token_ms)
+
+        total = len(replies)
+        self.stdout.write(f"{'defect':<18}{'replies':>8}{'strict fail':>13}{'after repair':>14}")
+        for defect, (count, strict, repaired) in sorted(by_defect.items()):
+            self.stdout.write(f'{defect:<18}{count:>8}{strict / count:>13.0%}{repaired / count:>14.0%}')
+        self.stdout.write(
+            f'Retry rate: {strict_failures / total:.1%} parsing strictly, {retries / total:.1%} with repair '
+            f'({strict_failures - retries} of {total} retries avoided)'
+        )
+        if first_item_ms:
+            first_item_ms.sort()
+            full_reply_ms.sort()
+            self.stdout.write(
+                f'Time to first item: median {first_item_ms[len(first_item_ms) // 2]:.0f}ms, '
+                f'p95 {first_item_ms[int(len(first_item_ms) * 0.95)]:.0f}ms; '
+                f'whole reply: median {full_reply_ms[len(full_reply_ms) // 2]:.0f}ms '
+                f'(at {token_ms:g}ms per {chunk}-character chunk)'
+            )
+        self.stdout.write(
+            f'Parser: {characters / 1024 / parse_seconds:,.0f} KB/s, '
+            f'{parse_seconds / total * 1000:.2f}ms per reply'
+        )
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from chatbot.models import AIInteractionLog
+
+
+class Command(BaseCommand):
+    help = 'Report how many chatbot questions were answered without the LLM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        logs = AIInteractionLog.objects.filter(timestamp__gte=timezone.now() - timedelta(days=options['days']))
+        rows = logs.values('intent').annotate(
+            total=Count('id'),
+            fast=Count('id', filter=Q(served_by='fast_path')),
+            confidence=Avg('intent_confidence')
+        ).order_by('-total')
+
+        total = fast = 0
+        self.stdout.write(f"{'intent':<14}{'questions':>10}{'fast path':>11}{'hit rate':>10}{'confidence':>12}")
+        for row in rows:
+            total += row['total']
+            fast += row['fast']
+            confidence = f"{row['confidence']:.2f}" if row['confidence'] is not None else '-'
+            self.stdout.write(
+                f"{row['intent'] or '(none)':<14}{row['total']:>10}{row['fast']:>11}"
+                f"{row['fast'] / row['total']:>10.0%}{confidence:>12}"
+            )
+        rate = fast / total if total else 0
+        self.stdout.write(f'{fast} of {total} questions in the last {options["days"]} days answered without the LLM ({rate:.0%})')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from chatbot.audio import transcode_voice_input
+from chatbot.models import ChatMessage
+
+
+class Command(BaseCommand):
+    help = 'Report storage saved by transcoding voice messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--process-pending', action='store_true',
+            help='Transcode voice messages uploaded before the pipeline existed'
+        )
+
+    def handle(self, *args, **options):
+        voice = ChatMessage.objects.exclude(voice_input='').exclude(voice_input__isnull=True)
+        pending = voice.filter(voice_transcoded_at__isnull=True)
+
+        if options['process_pending']:
+            transcoded = 0
+            for message_id, name in pending.values_list('id', 'voice_input').iterator():
+                transcoded += transcode_voice_input(message_id, name)
+            self.stdout.write(f'Transcoded {transcoded} voice messages')
+
+        totals = voice.filter(voice_transcoded_at__isnull=False).aggregate(
+            count=Count('id'),
+            original=Sum('voice_original_size'),
+            stored=Sum('voice_input_size')
+        )
+        self.stdout.write(f"Processed voice messages: {totals['count']} ({pending.count()} pending)")
+        if totals['count']:
+            original, stored = totals['original'] or 0, totals['stored'] or 0
+            saved = (1 - stored / original) * 100 if original else 0
+            self.stdout.write(
+                f'Storage: {original / 1024 / 1024:.2f} MB uploaded -> {stored / 1024 / 1024:.2f} MB stored '
+                f'({saved:.1f}% saved)'
+            )
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='voice_input_size',
+            field=models.BigIntegerField(blank=True, help_text='Bytes stored after transcoding', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='voice_original_size',
+            field=models.BigIntegerField(blank=True, help_text='Bytes uploaded before transcoding', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='voice_transcoded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
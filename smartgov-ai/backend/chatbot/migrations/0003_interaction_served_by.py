@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_voice_transcoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiinteractionlog',
+            name='intent',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='aiinteractionlog',
+            name='intent_confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aiinteractionlog',
+            name='served_by',
+            field=models.CharField(choices=[('llm', 'LLM'), ('fast_path', 'Fast Path')], default='llm', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_interaction_served_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='response_schema',
+            field=models.JSONField(blank=True, help_text='JSON Schema subset the parsed reply must match (json, structured and list formats)', null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from chatbot.search import install
+    install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from chatbot.search import uninstall
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_prompttemplate_response_schema'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,6 +1,9 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .structured import SchemaError, check_schema
+
 User = get_user_model()
 
 class ChatSession(models.Model):
@@ -33,6 +36,9 @@ class ChatMessage(models.Model):
     message = models.TextField()
     voice_input = models.FileField(upload_to='voice_messages/', null=True, blank=True)
     voice_output = models.FileField(upload_to='voice_responses/', null=True, blank=True)
+    voice_original_size = models.BigIntegerField(null=True, blank=True, help_text="Bytes uploaded before transcoding")
+    voice_input_size = models.BigIntegerField(null=True, blank=True, help_text="Bytes stored after transcoding")
+    voice_transcoded_at = models.DateTimeField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     language = models.CharField(max_length=10, default='en')
 
@@ -57,6 +63,10 @@ class PromptTemplate(models.Model):
         choices=[('text', 'Text'), ('json', 'JSON'), ('list', 'List'), ('structured', 'Structured')],
         default='text'
     )
+    response_schema = models.JSONField(
+        null=True, blank=True,
+        help_text="JSON Schema subset the parsed reply must match (json, structured and list formats)"
+    )
     temperature = models.FloatField(default=0.7, help_text="Creativity level 0-1")
     max_tokens = models.IntegerField(default=500)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -68,6 +78,16 @@ class PromptTemplate(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.response_schema is None:
+            return
+        if self.response_format == 'text':
+            raise ValidationError({'response_schema': 'Text templates have no schema.'})
+        try:
+            check_schema(self.response_schema)
+        except SchemaError as e:
+            raise ValidationError({'response_schema': str(e)})
+
 
 class AIInteractionLog(models.Model):
     """Model to log all AI interactions for monitoring and improvement"""
@@ -76,6 +96,13 @@ class AIInteractionLog(models.Model):
     ai_response = models.TextField()
     prompt_template = models.ForeignKey(PromptTemplate, on_delete=models.SET_NULL, null=True, blank=True)
     language_used = models.CharField(max_length=10)
+    served_by = models.CharField(
+        max_length=20,
+        choices=[('llm', 'LLM'), ('fast_path', 'Fast Path')],
+        default='llm'
+    )
+    intent = models.CharField(max_length=30, blank=True, default='')  # chatbot.intents label
+    intent_confidence = models.FloatField(null=True, blank=True)
     accuracy_rating = models.IntegerField(null=True, blank=True, help_text="User rating 1-5")
     timestamp = models.DateTimeField(auto_now_add=True)
 
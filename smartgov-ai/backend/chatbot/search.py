@@ -0,0 +1,236 @@
+"""
+Full-text search over a user's chat history
+
+ChatMessage.message is indexed in the database itself:
+
+- SQLite: an FTS5 table (chatbot_chatmessage_fts) that reads its text from
+  chatbot_chatmessage and is kept up to date by insert/update/delete
+  triggers. user_id and session_id are indexed alongside the message, so a
+  search only walks the postings of that user (and session).
+- PostgreSQL: a GIN index on to_tsvector('simple', message), combined with
+  the user_id index by the planner.
+
+The 'simple' configuration / unicode61 tokenizer do no stemming, which keeps
+English and Hindi messages searchable the same way. The last word of a query
+matches as a prefix so results show up while the user is still typing.
+
+install() is idempotent. The migration runs it once and post_migrate runs it
+again, because SQLite drops the triggers whenever a later migration rebuilds
+the chatbot_chatmessage table.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+
+from .models import ChatMessage
+
+FTS_TABLE = 'chatbot_chatmessage_fts'
+MAX_QUERY_TERMS = 8
+SNIPPET_TOKENS = 16
+# Kept out of the stored text so they can't collide with it
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# unicode61 splits words at vowel signs and viramas; keep the combining marks
+# of the Indic blocks (Devanagari to Sinhala) inside tokens
+INDIC_MARKS = ''.join(
+    chr(code) for code in range(0x0900, 0x0E00) if unicodedata.category(chr(code)).startswith('M')
+)
+TERM_RE = re.compile(r'[\w\u0900-\u0dff]+')
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        message, user_id, session_id,
+        content='chatbot_chatmessage', content_rowid='id',
+        tokenize="unicode61 tokenchars '{INDIC_MARKS}'"
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON chatbot_chatmessage BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message, user_id, session_id)
+        VALUES (new.id, new.message, new.user_id, new.session_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON chatbot_chatmessage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, user_id, session_id)
+        VALUES ('delete', old.id, old.message, old.user_id, old.session_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF message, user_id, session_id ON chatbot_chatmessage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, user_id, session_id)
+        VALUES ('delete', old.id, old.message, old.user_id, old.session_id);
+        INSERT INTO {FTS_TABLE}(rowid, message, user_id, session_id)
+        VALUES (new.id, new.message, new.user_id, new.session_id);
+    END
+    """,
+]
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+POSTGRES_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS chatbot_chatmessage_message_fts "
+    "ON chatbot_chatmessage USING gin (to_tsvector('simple', message))",
+]
+POSTGRES_UNINSTALL = ['DROP INDEX IF EXISTS chatbot_chatmessage_message_fts']
+
+
+def install(connection):
+    """Create the search index for connection's database if it is missing"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            created = cursor.fetchone() is None
+            for statement in SQLITE_INSTALL:
+                cursor.execute(statement)
+            if created:
+                # Index the messages that already exist
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            for statement in POSTGRES_INSTALL:
+                cursor.execute(statement)
+
+
+def uninstall(connection):
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def query_terms(query):
+    """The words of a search box query, without any FTS syntax"""
+    return TERM_RE.findall(query.lower())[:MAX_QUERY_TERMS]
+
+
+def _sqlite_match(terms):
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def _postgres_tsquery(terms):
+    lexemes = [f"'{term}'" for term in terms]
+    lexemes[-1] += ':*'
+    return ' & '.join(lexemes)
+
+
+def _highlights(snippet):
+    """Strip the highlight markers from snippet and return (text, [[start, end], ...])"""
+    text, spans = [], []
+    length = 0
+    for number, part in enumerate(re.split(f'[{HIGHLIGHT_START}{HIGHLIGHT_END}]', snippet)):
+        if number % 2:
+            spans.append([length, length + len(part)])
+        text.append(part)
+        length += len(part)
+    return ''.join(text), spans
+
+
+def _search_sqlite(cursor, user_id, terms, session_id, limit, recent):
+    # user_id and session_id are indexed too, so the match only reads this user's postings
+    # Quoted so the IDs are never parsed as FTS syntax
+    match = f'user_id:"{int(user_id)}" AND '
+    if session_id:
+        match += f'session_id:"{int(session_id)}" AND '
+    match += f'message:({_sqlite_match(terms)})'
+    cursor.execute(f"""
+        SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', {SNIPPET_TOKENS})
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH %s AND rank MATCH 'bm25(1.0, 0.0, 0.0)'
+        ORDER BY {'rowid DESC' if recent else 'rank'}
+        LIMIT %s
+    """, [HIGHLIGHT_START, HIGHLIGHT_END, match, limit])
+    return cursor.fetchall()
+
+
+def _search_postgres(cursor, user_id, terms, session_id, limit, recent):
+    # Headlines are only built for the page of results, not every match
+    cursor.execute(f"""
+        SELECT id, ts_headline('simple', message, query, %s)
+        FROM (
+            SELECT m.id, m.message, query
+            FROM chatbot_chatmessage m, to_tsquery('simple', %s) query
+            WHERE m.user_id = %s {'AND m.session_id = %s' if session_id else ''}
+              AND to_tsvector('simple', m.message) @@ query
+            ORDER BY {'m.id DESC' if recent else "ts_rank(to_tsvector('simple', m.message), query) DESC, m.id DESC"}
+            LIMIT %s
+        ) page
+    """, [
+        f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords={SNIPPET_TOKENS}, MinWords=6, '
+        'MaxFragments=1, FragmentDelimiter=…',
+        _postgres_tsquery(terms), user_id, *([session_id] if session_id else []), limit,
+    ])
+    return cursor.fetchall()
+
+
+def _excerpt(message, terms):
+    """A snippet around the first matching term, for databases without a search index"""
+    lowered = message.lower()
+    start = min((lowered.find(term) for term in terms if term in lowered), default=0)
+    begin = max(0, start - 60)
+    excerpt = message[begin:begin + 160]
+    for term in terms:
+        excerpt = re.sub(re.escape(term), lambda found: HIGHLIGHT_START + found.group(0) + HIGHLIGHT_END,
+                         excerpt, flags=re.IGNORECASE)
+    return ('…' if begin else '') + excerpt + ('…' if begin + 160 < len(message) else '')
+
+
+def _search_fallback(user_id, terms, session_id, limit):
+    # No ranking without an index: newest first
+    messages = ChatMessage.objects.filter(user_id=user_id)
+    if session_id:
+        messages = messages.filter(session_id=session_id)
+    for term in terms:
+        messages = messages.filter(message__icontains=term)
+    messages = messages.order_by('-id')[:limit].values_list('id', 'message')
+    return [(message_id, _excerpt(message, terms)) for message_id, message in messages]
+
+
+def search_messages(user, query, session_id=None, limit=20, recent=False):
+    """
+    Messages of user matching query, best match first (or newest first with
+    recent=True), as dicts with the message and session IDs and a snippet
+    whose matching words are listed in highlights as [start, end] offsets
+    """
+    terms = query_terms(query)
+    # The tokenizer would read -1 as 1; IDs are positive, so nothing matches
+    if not terms or (session_id is not None and int(session_id) <= 0):
+        return []
+    connection = connections[ChatMessage.objects.db]
+    if connection.vendor in ('sqlite', 'postgresql'):
+        search = _search_sqlite if connection.vendor == 'sqlite' else _search_postgres
+        with connection.cursor() as cursor:
+            rows = search(cursor, user.pk, terms, session_id, limit, recent)
+    else:
+        rows = _search_fallback(user.pk, terms, session_id, limit)
+
+    snippets = dict(rows)
+    messages = ChatMessage.objects.filter(pk__in=snippets).select_related('session').only(
+        'id', 'role', 'timestamp', 'language', 'session__id', 'session__title'
+    )
+    messages = {message.pk: message for message in messages}
+    results = []
+    for message_id, _ in rows:
+        message = messages.get(message_id)
+        if message is None:
+            continue
+        snippet, highlights = _highlights(snippets[message_id])
+        results.append({
+            'message_id': message.pk,
+            'session_id': message.session_id,
+            'session_title': message.session.title,
+            'role': message.role,
+            'language': message.language,
+            'timestamp': message.timestamp,
+            'snippet': snippet,
+            'highlights': highlights,
+        })
+    return results
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import ChatSession, ChatMessage, PromptTemplate, AIInteractionLog
+from .structured import SchemaError, check_schema
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
@@ -7,9 +8,10 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         model = ChatMessage
         fields = [
             'id', 'session', 'user', 'role', 'message',
-            'voice_input', 'voice_output', 'timestamp', 'language'
+            'voice_input', 'voice_output', 'voice_input_size', 'voice_transcoded_at',
+            'timestamp', 'language'
         ]
-        read_only_fields = ['id', 'timestamp']
+        read_only_fields = ['id', 'voice_input_size', 'voice_transcoded_at', 'timestamp']
 
 
 class ChatSessionSerializer(serializers.ModelSerializer):
@@ -26,11 +28,27 @@ class PromptTemplateSerializer(serializers.ModelSerializer):
         model = PromptTemplate
         fields = [
             'id', 'name', 'category', 'english_prompt', 'hindi_prompt',
-            'system_instructions', 'response_format', 'temperature',
+            'system_instructions', 'response_format', 'response_schema', 'temperature',
             'max_tokens', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
 
+    def validate_response_schema(self, value):
+        if value is None:
+            return value
+        try:
+            check_schema(value)
+        except SchemaError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, attrs):
+        response_format = attrs.get('response_format', getattr(self.instance, 'response_format', 'text'))
+        response_schema = attrs.get('response_schema', getattr(self.instance, 'response_schema', None))
+        if response_schema is not None and response_format == 'text':
+            raise serializers.ValidationError({'response_schema': 'Text templates have no schema.'})
+        return attrs
+
 
 class AIInteractionLogSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,38 @@
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from schemes.models import Scheme, SchemeTranslation
+from .audio import schedule_transcode
+from .fast_path import invalidate_scheme_index
+from .models import ChatMessage
+from .search import install as install_search_index
+
+SEARCH_INDEX_MIGRATION = '0005_chatmessage_search_index'
+
+
+@receiver(post_save, sender=ChatMessage)
+def transcode_voice_input(sender, instance, created, **kwargs):
+    """New voice uploads are re-encoded to Opus after the upload commits"""
+    if created and instance.voice_input and instance.voice_transcoded_at is None:
+        schedule_transcode(instance.pk, instance.voice_input.name)
+
+
+@receiver(post_save, sender=Scheme)
+@receiver(post_delete, sender=Scheme)
+@receiver(post_save, sender=SchemeTranslation)
+@receiver(post_delete, sender=SchemeTranslation)
+def rebuild_scheme_index(sender, **kwargs):
+    """Scheme names and their translations feed the fast path's entity matcher"""
+    invalidate_scheme_index()
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    """SQLite drops the search triggers when a migration rebuilds the message table"""
+    if sender.name != 'chatbot':
+        return
+    connection = connections[using]
+    if ('chatbot', SEARCH_INDEX_MIGRATION) in MigrationRecorder(connection).applied_migrations():
+        install_search_index(connection)
@@ -0,0 +1,501 @@
+"""
+Structured replies for PromptTemplate.response_format
+
+Templates with a json, structured or list format tell the model what shape
+to reply in, and may carry a response_schema: a small JSON Schema subset
+(type, properties, required, items, enum, minItems, maxItems, minLength,
+maxLength) that the parsed reply is validated against.
+
+StreamParser reads the reply while the model streams it and emits each item
+as soon as it is complete: the elements of a top-level array, the members of
+a top-level object and the elements of arrays directly inside it (each entry
+of {"documents": [...]}), or the bullet lines of a list. Every item is
+validated against its part of the schema before it is emitted.
+
+A reply that does not parse goes through repair() before anything is asked
+again: code fences and surrounding prose are dropped, trailing commas
+removed, Python literals, single quotes and bare keys converted, and a reply
+cut off by max_tokens is closed. Only a reply that is still invalid after
+repair is retried, with the errors sent back to the model.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from . import llm
+
+STRUCTURED_FORMATS = ('json', 'structured', 'list')
+
+TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+    'null': type(None),
+}
+SCHEMA_KEYWORDS = {
+    'type', 'properties', 'required', 'items', 'enum', 'minItems', 'maxItems', 'minLength', 'maxLength',
+    'description', 'title',
+}
+
+FENCE_RE = re.compile(r'```[a-zA-Z]*\s*(.*?)(?:```|$)', re.S)
+WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+KEY_RE = re.compile(r'\s*(["\'])((?:[^\\]|\\.)*?)\1\s*:\s*$', re.S)
+BULLET_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+(.*\S)')
+LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+CLOSERS = {'{': '}', '[': ']'}
+# Truncated replies are cut back to at most this many earlier commas before giving up
+MAX_TRUNCATION_CUTS = 3
+
+FORMAT_INSTRUCTIONS = {
+    'json': 'Reply with only valid JSON, without code fences or any text before or after it.',
+    'structured': 'Reply with only a valid JSON object, without code fences or any text before or after it.',
+    'list': 'Reply with a list: one item per line, each line starting with "- ".',
+}
+RETRY_PROMPT = 'Your reply could not be used: {errors}. Reply again with only the corrected output.'
+
+
+class SchemaError(ValueError):
+    """A response_schema uses something the validator does not support"""
+
+
+def check_schema(schema, path='$'):
+    """Raise SchemaError unless schema is within the supported subset"""
+    if not isinstance(schema, dict):
+        raise SchemaError(f'{path}: a schema must be an object')
+    unknown = set(schema) - SCHEMA_KEYWORDS
+    if unknown:
+        raise SchemaError(f'{path}: unsupported keywords {", ".join(sorted(unknown))}')
+    if 'type' in schema and schema['type'] not in TYPES:
+        raise SchemaError(f'{path}: unknown type {schema["type"]!r}')
+    if not isinstance(schema.get('properties', {}), dict):
+        raise SchemaError(f'{path}: properties must be an object')
+    for name, subschema in schema.get('properties', {}).items():
+        check_schema(subschema, f'{path}.{name}')
+    required = schema.get('required', [])
+    if not isinstance(required, list) or not all(isinstance(name, str) for name in required):
+        raise SchemaError(f'{path}: required must be a list of property names')
+    if 'items' in schema:
+        check_schema(schema['items'], f'{path}[]')
+    if not isinstance(schema.get('enum', []), list):
+        raise SchemaError(f'{path}: enum must be a list')
+    for keyword in ('minItems', 'maxItems', 'minLength', 'maxLength'):
+        if keyword in schema and (not isinstance(schema[keyword], int) or schema[keyword] < 0):
+            raise SchemaError(f'{path}: {keyword} must be a non-negative integer')
+
+
+def _is_type(value, name):
+    # bool is a subclass of int, but true is not a number in JSON
+    if name in ('number', 'integer') and isinstance(value, bool):
+        return False
+    return isinstance(value, TYPES[name])
+
+
+def validate(value, schema, path='$'):
+    """List of problems with value against schema; empty when it is valid"""
+    if not schema:
+        return []
+    expected = schema.get('type')
+    if expected and not _is_type(value, expected):
+        return [f'{path}: expected {expected}, got {type(value).__name__}']
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f'{path}: {value!r} is not one of {schema["enum"]}')
+    if isinstance(value, str):
+        if len(value) < schema.get('minLength', 0):
+            errors.append(f'{path}: shorter than {schema["minLength"]} characters')
+        if 'maxLength' in schema and len(value) > schema['maxLength']:
+            errors.append(f'{path}: longer than {schema["maxLength"]} characters')
+    if isinstance(value, dict):
+        errors += [f'{path}: missing {name}' for name in schema.get('required', []) if name not in value]
+        for name, subschema in schema.get('properties', {}).items():
+            if name in value:
+                errors += validate(value[name], subschema, f'{path}.{name}')
+    if isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f'{path}: fewer than {schema["minItems"]} items')
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            errors.append(f'{path}: more than {schema["maxItems"]} items')
+        for index, item in enumerate(value):
+            errors += validate(item, schema.get('items'), f'{path}[{index}]')
+    return errors
+
+
+def coerce(value, schema):
+    """Cheap fixes for values of almost the right type: "3" for 3, a lone item for a list"""
+    if not schema:
+        return value
+    expected = schema.get('type')
+    if expected == 'array' and value is not None and not isinstance(value, list):
+        value = [value]
+    elif expected == 'string' and isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    elif expected in ('number', 'integer') and isinstance(value, str):
+        try:
+            number = float(value.replace(',', '').strip())
+        except ValueError:
+            pass
+        else:
+            value = int(number) if expected == 'integer' and number.is_integer() else number
+    elif expected == 'boolean' and isinstance(value, str) and value.strip().lower() in ('true', 'false', 'yes', 'no'):
+        value = value.strip().lower() in ('true', 'yes')
+
+    if isinstance(value, dict):
+        properties = schema.get('properties', {})
+        value = {name: coerce(item, properties.get(name)) for name, item in value.items()}
+    elif isinstance(value, list):
+        value = [coerce(item, schema.get('items')) for item in value]
+    return value
+
+
+def _drop_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+def _close(out, stack, in_string=False, escaped=False):
+    out = list(out)
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    if out and out[-1] == ':':
+        out.append('null')
+    out.extend(CLOSERS[opener] for opener in reversed(stack))
+    return ''.join(out)
+
+
+def repair(text):
+    """Valid JSON text recovered from a malformed reply, or None"""
+    text = text or ''
+    match = FENCE_RE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [index for index in (text.find('{'), text.find('[')) if index >= 0]
+    if not starts:
+        return None
+
+    out, stack, checkpoints = [], [], []
+    quote, escaped = None, False
+    i = min(starts)
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+                if ch == "'" and quote == "'":
+                    out[-1] = "'"
+                else:
+                    out.append(ch)
+            elif ch == '\\':
+                escaped = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            else:
+                out.append('\\"' if ch == '"' else ch)
+        elif ch in '"\'':
+            quote = ch
+            out.append('"')
+        elif ch in '{[':
+            stack.append(ch)
+            out.append(ch)
+        elif ch in '}]':
+            _drop_trailing_comma(out)
+            out.append(CLOSERS[stack.pop()])
+            if not stack:
+                # The value is complete; whatever follows is prose
+                break
+        elif ch == ',':
+            _drop_trailing_comma(out)
+            checkpoints.append((len(out), list(stack)))
+            out.append(ch)
+        elif ch.isalpha() or ch == '_':
+            word = WORD_RE.match(text, i).group()
+            if text[i + len(word):].lstrip().startswith(':'):
+                out.append(json.dumps(word))
+            else:
+                out.append(LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if not stack:
+        candidates = [''.join(out)]
+    else:
+        # Cut off by max_tokens: close what is open, or drop the unfinished last element
+        candidates = [_close(out, stack, quote is not None, escaped)]
+        candidates += [_close(out[:length], saved) for length, saved in checkpoints[::-1][:MAX_TRUNCATION_CUTS]]
+    for candidate in candidates:
+        try:
+            json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+        return candidate
+    return None
+
+
+def parse_json(text):
+    """(value, repaired) from a reply; raises ValueError if it can't be recovered"""
+    try:
+        return json.loads(text), False
+    except (TypeError, ValueError):
+        pass
+    repaired = repair(text)
+    if repaired is None:
+        raise ValueError('Reply is not JSON')
+    return json.loads(repaired, strict=False), True
+
+
+def parse_list(text):
+    """Bullet or numbered items of a list reply; every non-empty line if there are none"""
+    lines = (text or '').splitlines()
+    items = [match.group(1) for match in map(BULLET_RE.match, lines) if match]
+    return items or [line.strip() for line in lines if line.strip()]
+
+
+@dataclass
+class ParseResult:
+    value: object = None
+    errors: list = field(default_factory=list)
+    repaired: bool = False
+    attempts: int = 1
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def parse_reply(text, response_format, schema=None):
+    """Parse and validate a complete reply in a template's response_format"""
+    if response_format not in STRUCTURED_FORMATS:
+        return ParseResult(value=text)
+    if response_format == 'list':
+        value, repaired = parse_list(text), False
+    else:
+        try:
+            value, repaired = parse_json(text)
+        except ValueError as e:
+            return ParseResult(errors=[str(e)])
+        if response_format == 'structured' and not isinstance(value, dict):
+            return ParseResult(value=value, errors=['Reply is not a JSON object'], repaired=repaired)
+    if schema:
+        coerced = coerce(value, schema)
+        repaired = repaired or coerced != value
+        value = coerced
+    return ParseResult(value=value, errors=validate(value, schema), repaired=repaired)
+
+
+def schema_at(schema, path):
+    """The part of schema describing the value at path"""
+    for part in path:
+        if not schema:
+            return None
+        schema = schema.get('items') if isinstance(part, int) else schema.get('properties', {}).get(part)
+    return schema
+
+
+def iter_items(value):
+    """(path, item) pairs that StreamParser emits for a complete value"""
+    if isinstance(value, list):
+        for index, item in enumerate(value):
+            yield (index,), item
+    elif isinstance(value, dict):
+        for key, member in value.items():
+            if isinstance(member, list):
+                for index, item in enumerate(member):
+                    yield (key, index), item
+            else:
+                yield (key,), member
+
+
+@dataclass
+class Item:
+    path: tuple
+    value: object
+
+    def as_dict(self):
+        return {'path': list(self.path), 'value': self.value}
+
+
+@dataclass
+class _Frame:
+    opener: str
+    start: int  # buffer offset where the current element begins
+    index: int = 0
+    key: str = None  # member name, for an array inside the top-level object
+
+
+def _load_fragment(text, opener):
+    """Value of one array element ('[') or object member ('{') cut from the stream"""
+    text = text.strip()
+    try:
+        value = json.loads(f'{opener}{text}{CLOSERS[opener]}', strict=False)
+    except ValueError:
+        repaired = repair(f'{opener}{text}{CLOSERS[opener]}')
+        if repaired is None:
+            raise
+        value = json.loads(repaired, strict=False)
+    if opener == '[':
+        if len(value) != 1:
+            raise ValueError('Not a single array element')
+        return value[0]
+    return value
+
+
+class StreamParser:
+    """Feed a reply in chunks; get back items as soon as they are complete"""
+
+    def __init__(self, response_format, schema=None):
+        self.response_format = response_format
+        self.schema = schema
+        self.buffer = ''
+        self.pos = 0
+        self.stack = []
+        self.quote = None
+        self.escaped = False
+        self.finished = False
+        self.emitted = set()
+        self.rejected = []  # (path, errors) of items that failed validation
+        self.list_items = 0
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.response_format == 'list':
+            return self._scan_lines()
+        if self.response_format in STRUCTURED_FORMATS:
+            return self._scan_json()
+        return []
+
+    def close(self):
+        """(items not yet emitted, ParseResult of the whole reply)"""
+        items = []
+        result = parse_reply(self.buffer, self.response_format, self.schema)
+        if result.value is not None and self.response_format in STRUCTURED_FORMATS:
+            for path, value in iter_items(result.value):
+                if path not in self.emitted and path not in dict(self.rejected):
+                    self._accept(path, value, items)
+        return items, result
+
+    def _accept(self, path, value, items):
+        schema = schema_at(self.schema, path)
+        value = coerce(value, schema)
+        location = ''.join(f'[{part}]' if isinstance(part, int) else f'.{part}' for part in path)
+        errors = validate(value, schema, f'${location}')
+        if errors:
+            self.rejected.append((path, errors))
+            return
+        self.emitted.add(path)
+        items.append(Item(path, value))
+
+    def _scan_lines(self):
+        items = []
+        end = self.buffer.rfind('\n') + 1
+        for line in self.buffer[self.pos:end].splitlines():
+            match = BULLET_RE.match(line)
+            if match:
+                self._accept((self.list_items,), match.group(1), items)
+                self.list_items += 1
+        self.pos = max(self.pos, end)
+        return items
+
+    def _scan_json(self):
+        items = []
+        buffer = self.buffer
+        i = self.pos
+        while i < len(buffer) and not self.finished:
+            ch = buffer[i]
+            if self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == self.quote:
+                    self.quote = None
+            elif not self.stack:
+                # Prose or a code fence before the value starts
+                if ch in '{[':
+                    self.stack.append(_Frame(ch, i + 1))
+            elif ch in '"\'':
+                self.quote = ch
+            elif ch in '{[':
+                parent = self.stack[-1]
+                key = None
+                if ch == '[' and len(self.stack) == 1 and parent.opener == '{':
+                    match = KEY_RE.match(buffer, parent.start, i)
+                    key = match.group(2) if match else None
+                self.stack.append(_Frame(ch, i + 1, key=key))
+            elif ch in ',}]':
+                frame = self.stack[-1]
+                self._element(frame, buffer[frame.start:i], items)
+                frame.start = i + 1
+                if ch != ',':
+                    self.stack.pop()
+                    self.finished = not self.stack
+            i += 1
+        self.pos = i
+        return items
+
+    def _element(self, frame, text, items):
+        depth = len(self.stack)
+        if not text.strip() or depth > 2 or (depth == 2 and frame.key is None):
+            return
+        path_index = frame.index
+        frame.index += 1
+        try:
+            value = _load_fragment(text, frame.opener)
+        except ValueError:
+            # Left for close(), which parses the whole reply with more context
+            return
+        if depth == 2:
+            self._accept((frame.key, path_index), value, items)
+        elif frame.opener == '[':
+            self._accept((path_index,), value, items)
+        elif isinstance(value, dict) and len(value) == 1:
+            (key, member), = value.items()
+            # Arrays were emitted element by element
+            if not isinstance(member, list):
+                self._accept((key,), member, items)
+
+
+def format_instructions(template):
+    """What to add to the system message so the model replies in the template's format"""
+    instructions = FORMAT_INSTRUCTIONS.get(template.response_format)
+    if not instructions:
+        return ''
+    if template.response_schema and template.response_format != 'list':
+        schema = json.dumps(template.response_schema, ensure_ascii=False)
+        instructions += f'\nThe JSON must match this JSON Schema: {schema}'
+    return f'\n{instructions}\n'
+
+
+def complete(template, system_message, user_message, backend=None, max_retries=None):
+    """(reply text, ParseResult) for a structured template, repairing before retrying"""
+    backend = backend or llm.get_backend()
+    if max_retries is None:
+        max_retries = settings.STRUCTURED_OUTPUT_MAX_RETRIES
+    messages = [
+        {'role': 'system', 'content': system_message + format_instructions(template)},
+        {'role': 'user', 'content': user_message},
+    ]
+    for attempt in range(1, max_retries + 2):
+        reply = backend.complete(messages, temperature=template.temperature, max_tokens=template.max_tokens)
+        result = parse_reply(reply, template.response_format, template.response_schema)
+        result.attempts = attempt
+        if result.ok:
+            break
+        messages += [
+            {'role': 'assistant', 'content': reply},
+            {'role': 'user', 'content': RETRY_PROMPT.format(errors='; '.join(result.errors[:5]))},
+        ]
+    return reply, result
@@ -1,3 +1,82 @@
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from users.models import CustomUser
+
+from .models import ChatMessage, ChatSession
+from .search import FTS_TABLE, search_messages
+
+
+class SearchMessagesTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='kavya')
+        self.session = ChatSession.objects.create(user=self.user, title='PM Kisan')
+        self.other_session = ChatSession.objects.create(user=self.user, title='Scholarship')
+
+    def add(self, text, session=None, user=None):
+        session = session or self.session
+        return ChatMessage.objects.create(session=session, user=user or session.user, role='user', message=text)
+
+    def test_sqlite_uses_fts5_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 is SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            self.assertIsNotNone(cursor.fetchone())
+
+    def test_matches_are_highlighted(self):
+        message = self.add('When is the next Kisan installment paid?')
+        self.add('How do I apply for a scholarship?')
+
+        results = search_messages(self.user, 'installment')
+
+        self.assertEqual([result['message_id'] for result in results], [message.pk])
+        result = results[0]
+        self.assertEqual(result['session_title'], 'PM Kisan')
+        start, end = result['highlights'][0]
+        self.assertEqual(result['snippet'][start:end].lower(), 'installment')
+
+    def test_last_word_matches_as_prefix(self):
+        message = self.add('Ayushman card hospital list')
+
+        self.assertEqual([result['message_id'] for result in search_messages(self.user, 'ayush')], [message.pk])
+
+    def test_hindi_words_are_searchable(self):
+        message = self.add('किसान योजना की अंतिम तिथि क्या है')
+        self.add('पेंशन आवेदन')
+
+        self.assertEqual([result['message_id'] for result in search_messages(self.user, 'अंतिम तिथि')], [message.pk])
+
+    def test_other_users_messages_are_not_returned(self):
+        stranger = CustomUser.objects.create_user(username='stranger')
+        self.add('ration card rejected', session=ChatSession.objects.create(user=stranger, title='Ration'))
+
+        self.assertEqual(search_messages(self.user, 'ration'), [])
+
+    def test_session_filter(self):
+        self.add('income certificate needed')
+        wanted = self.add('income certificate for scholarship', session=self.other_session)
+
+        results = search_messages(self.user, 'income certificate', session_id=self.other_session.pk)
+
+        self.assertEqual([result['message_id'] for result in results], [wanted.pk])
+        self.assertEqual(search_messages(self.user, 'income', session_id=-1), [])
+
+    def test_recent_orders_newest_first(self):
+        older = self.add('aadhaar update aadhaar aadhaar')
+        newer = self.add('aadhaar seeding')
+
+        results = search_messages(self.user, 'aadhaar', recent=True)
+
+        self.assertEqual([result['message_id'] for result in results], [newer.pk, older.pk])
+
+    def test_edits_and_deletes_update_the_index(self):
+        message = self.add('bank passbook copy')
+        message.message = 'land records copy'
+        message.save()
+
+        self.assertEqual(search_messages(self.user, 'passbook'), [])
+        self.assertEqual(len(search_messages(self.user, 'land')), 1)
+
+        message.delete()
+        self.assertEqual(search_messages(self.user, 'land'), [])
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ChatSessionViewSet, ChatBotViewSet, PromptTemplateViewSet
+from .views import ChatSessionViewSet, ChatBotViewSet, PromptTemplateViewSet, VoiceMessageViewSet
 
 router = DefaultRouter()
 router.register(r'sessions', ChatSessionViewSet, basename='chat-session')
 router.register(r'chatbot', ChatBotViewSet, basename='chatbot')
 router.register(r'prompts', PromptTemplateViewSet, basename='prompt-template')
+router.register(r'voice', VoiceMessageViewSet, basename='voice-message')
 
 app_name = 'chatbot'
 
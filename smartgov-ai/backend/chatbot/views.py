@@ -3,21 +3,27 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from datetime import datetime
-import os
+import mimetypes
 import json
+import logging
+import re
 
-try:
-    import openai
-except ImportError:
-    openai = None
-
+from backend.idempotency import idempotent
+from schemes.models import Scheme
+from schemes.rules import compile_rules, profile_values
+from . import fast_path, llm, structured
 from .models import ChatSession, ChatMessage, PromptTemplate, AIInteractionLog
+from .search import query_terms, search_messages
 from .serializers import (
     ChatSessionSerializer, ChatMessageSerializer,
     PromptTemplateSerializer, AIInteractionLogSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 
 class ChatSessionViewSet(viewsets.ModelViewSet):
     """
@@ -65,41 +71,106 @@ User Profile:
 - Age: {user_profile.get('age', 'N/A')}
 - Occupation: {user_profile.get('occupation', 'N/A')}
 - State: {user_profile.get('state', 'N/A')}
+- Annual Income: {user_profile.get('annual_income') or 'N/A'}
+- Gender: {user_profile.get('gender') or 'N/A'}
+- Social Category: {user_profile.get('social_category') or 'N/A'}
+- Land Holding (acres): {user_profile.get('land_holding') or 'N/A'}
 - Aadhar Verified: {user_profile.get('aadhar_verified', False)}
 
 Provide accurate, clear, and helpful information about government schemes.
 """
         return system_msg + context
 
-    def _call_openai(self, system_message, user_message, language='en', temperature=0.7, max_tokens=500):
-        """Call OpenAI API with controlled prompts"""
-        if not openai:
-            return "AI service not available. Please try again later."
-
+    def _eligibility_context(self, user, scheme_id):
+        """Result of the scheme's structured rules for this user, checked without the LLM"""
+        scheme = Scheme.objects.filter(pk=scheme_id).first()
+        if scheme is None or not scheme.eligibility_rules:
+            return ''
+        rule = compile_rules(scheme.eligibility_rules)
+        values = profile_values(user)
+        unmet = rule.unmet(values)
+        if not unmet:
+            return f"\nStructured eligibility check for {scheme.name}: the user meets all criteria ({rule}).\n"
+        return (
+            f"\nStructured eligibility check for {scheme.name}: the user does not meet: "
+            f"{'; '.join(unmet)}. Explain these criteria rather than guessing eligibility.\n"
+        )
+
+    def _call_llm(self, system_message, user_message, language='en', temperature=0.7, max_tokens=500):
+        """Call the configured LLM backend with controlled prompts"""
         try:
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                return "OpenAI API key not configured. Please contact administrator."
-
-            openai.api_key = api_key
-
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ]
-
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            return llm.complete(system_message, user_message, temperature=temperature, max_tokens=max_tokens)
+        except llm.LLMError as e:
+            return str(e)
 
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"Error communicating with AI service: {str(e)}"
+    def _call_structured(self, template, system_message, user_message):
+        """Reply text and ParseResult for a json, structured or list template"""
+        try:
+            reply, result = structured.complete(template, system_message, user_message)
+        except llm.LLMError as e:
+            return str(e), None
+        if result.ok and template.response_format != 'list':
+            reply = json.dumps(result.value, ensure_ascii=False)
+        return reply, result
+
+    def _user_profile(self, user):
+        return {
+            'age': user.age,
+            'occupation': user.occupation,
+            'state': user.state,
+            'annual_income': user.annual_income,
+            'gender': user.get_gender_display() if user.gender else None,
+            'social_category': user.get_social_category_display() if user.social_category else None,
+            'land_holding': user.land_holding,
+            'aadhar_verified': user.aadhar_verified
+        }
+
+    def _llm_prompt(self, user, template, user_message, language, scheme_id):
+        """System and user message for the LLM"""
+        system_message = self._build_system_message(template, self._user_profile(user))
+        if scheme_id:
+            system_message += self._eligibility_context(user, scheme_id)
+
+        # Adjust prompt based on language
+        if language == 'hi':
+            user_message = f"{user_message}\n\n[Please respond in Hindi if possible, with English terms where necessary]"
+        return system_message, user_message
+
+    def _save_exchange(self, user, session, template, user_message, ai_response, language, served_by, route):
+        """Store both messages and the interaction log; returns the assistant message"""
+        ChatMessage.objects.create(
+            session=session,
+            user=user,
+            role='user',
+            message=user_message,
+            language=language
+        )
+        assistant_msg = ChatMessage.objects.create(
+            session=session,
+            user=user,
+            role='assistant',
+            message=ai_response,
+            language=language
+        )
+        AIInteractionLog.objects.create(
+            user=user,
+            user_input=user_message,
+            ai_response=ai_response,
+            prompt_template=template,
+            language_used=language,
+            served_by=served_by,
+            intent=route.intent if route else '',
+            intent_confidence=route.confidence if route else None
+        )
+
+        # Update session title if first message
+        if session.messages.count() == 2:
+            session.title = user_message[:50]
+            session.save()
+        return assistant_msg
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def send_message(self, request):
         """
         Send a message to the chatbot
@@ -109,6 +180,7 @@ Provide accurate, clear, and helpful information about government schemes.
         session_id = request.data.get('session_id')
         language = request.data.get('language', 'en')
         category = request.data.get('category', 'general')  # scheme_info, eligibility, documents, etc.
+        scheme_id = request.data.get('scheme_id')  # optional: the scheme being asked about
 
         if not user_message:
             return Response({
@@ -122,77 +194,48 @@ Provide accurate, clear, and helpful information about government schemes.
             else:
                 session = ChatSession.objects.create(user=request.user)
 
-            # Get user profile info
-            user_profile = {
-                'age': request.user.age,
-                'occupation': request.user.occupation,
-                'state': request.user.state,
-                'aadhar_verified': request.user.aadhar_verified
-            }
-
             # Get prompt template
             template = self._get_prompt_template(category, language)
 
-            # Build system message
-            system_message = self._build_system_message(template, user_profile)
-
-            # Adjust prompt based on language
-            if language == 'hi':
-                user_message_with_lang = f"{user_message}\n\n[Please respond in Hindi if possible, with English terms where necessary]"
+            # Direct lookups about a named scheme are answered from its fields
+            route = fast_path.route(user_message, request.user, language, scheme_id) if settings.CHATBOT_FAST_PATH else None
+            result = None
+            if route and route.answer:
+                ai_response = route.answer
+                served_by = 'fast_path'
             else:
-                user_message_with_lang = user_message
-
-            # Get AI response
-            temperature = template.temperature if template else 0.7
-            max_tokens = template.max_tokens if template else 500
-
-            ai_response = self._call_openai(
-                system_message,
-                user_message_with_lang,
-                language=language,
-                temperature=temperature,
-                max_tokens=max_tokens
+                system_message, user_message_with_lang = self._llm_prompt(
+                    request.user, template, user_message, language, scheme_id
+                )
+                if template and template.response_format in structured.STRUCTURED_FORMATS:
+                    # Parsed, validated and repaired here so clients get the value
+                    ai_response, result = self._call_structured(template, system_message, user_message_with_lang)
+                else:
+                    ai_response = self._call_llm(
+                        system_message,
+                        user_message_with_lang,
+                        language=language,
+                        temperature=template.temperature if template else 0.7,
+                        max_tokens=template.max_tokens if template else 500
+                    )
+                served_by = 'llm'
+
+            assistant_msg = self._save_exchange(
+                request.user, session, template, user_message, ai_response, language, served_by, route
             )
 
-            # Store user message
-            user_msg = ChatMessage.objects.create(
-                session=session,
-                user=request.user,
-                role='user',
-                message=user_message,
-                language=language
-            )
-
-            # Store AI response
-            assistant_msg = ChatMessage.objects.create(
-                session=session,
-                user=request.user,
-                role='assistant',
-                message=ai_response,
-                language=language
-            )
-
-            # Log interaction
-            AIInteractionLog.objects.create(
-                user=request.user,
-                user_input=user_message,
-                ai_response=ai_response,
-                prompt_template=template,
-                language_used=language
-            )
-
-            # Update session title if first message
-            if session.messages.count() == 2:
-                session.title = user_message[:50]
-                session.save()
-
-            return Response({
+            data = {
                 'session_id': session.id,
                 'user_message': user_message,
                 'ai_response': ai_response,
                 'language': language,
+                'served_by': served_by,
                 'timestamp': assistant_msg.timestamp
-            }, status=status.HTTP_201_CREATED)
+            }
+            if result is not None:
+                data['data'] = result.value
+                data['format_errors'] = result.errors
+            return Response(data, status=status.HTTP_201_CREATED)
 
         except ChatSession.DoesNotExist:
             return Response({
@@ -203,6 +246,101 @@ Provide accurate, clear, and helpful information about government schemes.
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def stream_message(self, request):
+        """
+        Send a message and stream the reply as newline-delimited JSON events
+        Json, structured and list templates emit each item as soon as it is
+        complete ({"type": "item", "path": [...], "value": ...}); other replies
+        stream as {"type": "text"} pieces. The last event is "done", carrying
+        the whole parsed reply and any format errors, or "error". Items already
+        sent can't be taken back, so an invalid reply is reported, not retried.
+        """
+        user_message = request.data.get('message', '')
+        session_id = request.data.get('session_id')
+        language = request.data.get('language', 'en')
+        category = request.data.get('category', 'general')
+        scheme_id = request.data.get('scheme_id')
+
+        if not user_message:
+            return Response({
+                'error': 'Message is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if session_id:
+                session = ChatSession.objects.get(id=session_id, user=request.user)
+            else:
+                session = ChatSession.objects.create(user=request.user)
+        except ChatSession.DoesNotExist:
+            return Response({
+                'error': 'Chat session not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        template = self._get_prompt_template(category, language)
+        route = fast_path.route(user_message, request.user, language, scheme_id) if settings.CHATBOT_FAST_PATH else None
+        response = StreamingHttpResponse(
+            self._stream_events(request.user, session, template, user_message, language, scheme_id, route),
+            content_type='application/x-ndjson'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the events
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _stream_events(self, user, session, template, user_message, language, scheme_id, route):
+        def event(**data):
+            return json.dumps(data, ensure_ascii=False, default=str) + '\n'
+
+        yield event(type='session', session_id=session.id)
+        response_format = template.response_format if template else 'text'
+        parser = structured.StreamParser(response_format, template.response_schema if template else None)
+        result = None
+
+        if route and route.answer:
+            ai_response = route.answer
+            served_by = 'fast_path'
+            yield event(type='text', text=ai_response)
+        else:
+            system_message, user_message_with_lang = self._llm_prompt(user, template, user_message, language, scheme_id)
+            if template:
+                system_message += structured.format_instructions(template)
+            pieces = []
+            try:
+                for chunk in llm.get_backend().stream(
+                    [
+                        {'role': 'system', 'content': system_message},
+                        {'role': 'user', 'content': user_message_with_lang},
+                    ],
+                    temperature=template.temperature if template else 0.7,
+                    max_tokens=template.max_tokens if template else 500
+                ):
+                    pieces.append(chunk)
+                    if response_format in structured.STRUCTURED_FORMATS:
+                        for item in parser.feed(chunk):
+                            yield event(type='item', **item.as_dict())
+                    else:
+                        yield event(type='text', text=chunk)
+            except llm.LLMError as e:
+                yield event(type='error', error=str(e))
+                return
+            ai_response = ''.join(pieces)
+            served_by = 'llm'
+            if response_format in structured.STRUCTURED_FORMATS:
+                items, result = parser.close()
+                for item in items:
+                    yield event(type='item', **item.as_dict())
+                if result.ok and response_format != 'list':
+                    ai_response = json.dumps(result.value, ensure_ascii=False)
+
+        assistant_msg = self._save_exchange(
+            user, session, template, user_message, ai_response, language, served_by, route
+        )
+        done = {'message_id': assistant_msg.id, 'served_by': served_by}
+        if result is not None:
+            done.update(value=result.value, errors=result.errors, repaired=result.repaired)
+        yield event(type='done', **done)
+
     @action(detail=False, methods=['post'])
     def voice_input(self, request):
         """
@@ -249,6 +387,30 @@ Provide accurate, clear, and helpful information about government schemes.
         serializer = ChatSessionSerializer(sessions, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Search the user's chat history: ?q=<words>&session_id=&limit=&order=relevance|recent"""
+        query = request.query_params.get('q', '').strip()
+        if not query_terms(query):
+            return Response({
+                'error': 'q is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+            session_id = int(request.query_params['session_id']) if request.query_params.get('session_id') else None
+            if session_id is not None and session_id <= 0:
+                raise ValueError(session_id)
+        except ValueError:
+            return Response({
+                'error': 'limit and session_id must be positive integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search_messages(
+            request.user, query, session_id=session_id, limit=limit,
+            recent=request.query_params.get('order') == 'recent',
+        )
+        return Response({'query': query, 'count': len(results), 'results': results})
+
     @action(detail=False, methods=['post'])
     def rate_response(self, request):
         """Rate the accuracy of AI response"""
@@ -272,6 +434,97 @@ Provide accurate, clear, and helpful information about government schemes.
             }, status=status.HTTP_404_NOT_FOUND)
 
 
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def _stream_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(STREAM_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def ranged_file_response(request, field_file):
+    """Serve a stored file honouring a single HTTP Range header"""
+    try:
+        size = field_file.size
+    except OSError:
+        # The row outlived its file (deleted or lost storage)
+        logger.exception('Stored file %s is missing', field_file.name)
+        return Response({
+            'error': 'Message has no voice recording'
+        }, status=status.HTTP_404_NOT_FOUND)
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    start, end = 0, size - 1
+    partial = False
+
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if match and (match.group(1) or match.group(2)):
+        if match.group(1):
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), size - 1)
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(match.group(2)), 0)
+        if start > end or start >= size:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        partial = True
+
+    try:
+        stored = field_file.open('rb')
+    except OSError:
+        logger.exception('Stored file %s could not be opened', field_file.name)
+        return Response({
+            'error': 'Message has no voice recording'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _stream_range(stored, start, length),
+        status=status.HTTP_206_PARTIAL_CONTENT if partial else status.HTTP_200_OK,
+        content_type=content_type
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if partial:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+class VoiceMessageViewSet(viewsets.ViewSet):
+    """
+    Serve voice recordings of the user's chat messages
+    Supports Range requests so audio players can seek
+    """
+    permission_classes = [IsAuthenticated]
+
+    def retrieve(self, request, pk=None):
+        """Voice input of a message, or its voice output with ?kind=output"""
+        try:
+            message = ChatMessage.objects.get(pk=pk, user=request.user)
+        except ChatMessage.DoesNotExist:
+            return Response({
+                'error': 'Message not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        field_file = message.voice_output if request.query_params.get('kind') == 'output' else message.voice_input
+        if not field_file:
+            return Response({
+                'error': 'Message has no voice recording'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return ranged_file_response(request, field_file)
+
+
 class PromptTemplateViewSet(viewsets.ModelViewSet):
     """
     API endpoints for managing prompt templates
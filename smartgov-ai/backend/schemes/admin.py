@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Scheme, DocumentChecklist, SchemeHistory,
-    SchemeReminder, UserSavedScheme
+    SchemeReminder, UserSavedScheme, DocumentBlob, UserDocument, UploadSession,
+    SchemeStats, TrendingScore, SchemeRecommendation, SchemeTranslation
 )
 
 
@@ -12,7 +13,7 @@ class SchemeAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description', 'applicable_states']
     fieldsets = (
         ('Basic Information', {'fields': ('name', 'category', 'description', 'benefits')}),
-        ('Eligibility', {'fields': ('age_min', 'age_max', 'applicable_states', 'applicable_occupations')}),
+        ('Eligibility', {'fields': ('age_min', 'age_max', 'applicable_states', 'applicable_occupations', 'eligibility_rules')}),
         ('Documents & Process', {'fields': ('documents', 'application_process', 'apply_link')}),
         ('Contact', {'fields': ('contact_info',)}),
         ('Deadline', {'fields': ('deadline',)}),
@@ -47,3 +48,59 @@ class UserSavedSchemeAdmin(admin.ModelAdmin):
     list_filter = ['saved_at']
     search_fields = ['user__username', 'scheme__name']
     readonly_fields = ['saved_at']
+
+
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'content_type', 'ref_count', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'size', 'content_type', 'ref_count', 'created_at']
+
+
+@admin.register(UserDocument)
+class UserDocumentAdmin(admin.ModelAdmin):
+    list_display = ['user', 'document_type', 'original_name', 'updated_at']
+    list_filter = ['document_type']
+    search_fields = ['user__username', 'original_name']
+    raw_id_fields = ['blob']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'document_type', 'received', 'total_size', 'status', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['user__username', 'file_name']
+
+
+@admin.register(SchemeStats)
+class SchemeStatsAdmin(admin.ModelAdmin):
+    list_display = ['scheme', 'views', 'applies', 'saves', 'shares', 'score', 'reconciled_at']
+    search_fields = ['scheme__name']
+    readonly_fields = ['views', 'applies', 'saves', 'shares', 'score', 'reconciled_at']
+
+
+@admin.register(TrendingScore)
+class TrendingScoreAdmin(admin.ModelAdmin):
+    list_display = ['scheme', 'state', 'score', 'updated_at']
+    list_filter = ['state']
+    search_fields = ['scheme__name']
+
+
+@admin.register(SchemeRecommendation)
+class SchemeRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['scheme', 'user_count', 'updated_at']
+    search_fields = ['scheme__name']
+    readonly_fields = ['neighbours', 'user_count', 'updated_at']
+
+
+@admin.register(SchemeTranslation)
+class SchemeTranslationAdmin(admin.ModelAdmin):
+    list_display = ['scheme', 'language', 'is_current', 'backend', 'translated_at']
+    list_filter = ['language', 'translated_at']
+    search_fields = ['scheme__name']
+    list_select_related = ['scheme']
+    readonly_fields = ['source_updated_at', 'backend', 'translated_at']
+
+    @admin.display(boolean=True, description='Current')
+    def is_current(self, obj):
+        return obj.is_current
@@ -0,0 +1,49 @@
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from users.websocket import token_still_valid
+from . import notifications
+
+# Close codes in the 4000-4999 range are for applications
+CLOSE_UNAUTHORIZED = 4401
+
+
+def _presence(func):
+    # Cache calls don't touch the database, so they needn't queue behind
+    # other sync code on the single thread-sensitive worker
+    return sync_to_async(func, thread_sensitive=False)
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes reminder, checklist and new-scheme events to the signed-in user
+    Connect with ?token=<auth token> (or an Authorization: Token header);
+    send {"type": "ping"} to keep the connection marked as online. Each ping
+    re-checks the token; expired or revoked tokens close the socket with 4401.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+        self.group = notifications.group_name(self.user.pk)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await _presence(notifications.connected)(self.user.pk)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'group', None):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+            await _presence(notifications.disconnected)(self.user.pk)
+
+    async def receive_json(self, content, **kwargs):
+        if isinstance(content, dict) and content.get('type') == 'ping':
+            if not await token_still_valid(self.scope):
+                await self.close(code=CLOSE_UNAUTHORIZED)
+                return
+            await _presence(notifications.still_connected)(self.user.pk)
+            await self.send_json({'type': 'pong'})
+
+    async def notify(self, message):
+        await self.send_json({'type': 'event', 'event': message['event'], 'data': message['data']})
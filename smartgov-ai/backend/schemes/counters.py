@@ -0,0 +1,184 @@
+"""
+Incremental scheme popularity counters
+
+History and saved-scheme writes add deltas to an in-memory buffer once their
+transaction commits. The buffer is flushed to SchemeStats with F() updates
+every SCHEME_STATS_FLUSH_INTERVAL seconds or SCHEME_STATS_FLUSH_SIZE events,
+grouping schemes with the same delta into one UPDATE. Counters can drift
+(e.g. a process killed with unflushed deltas or bulk deletes), so
+reconcile() periodically recounts them from the source tables.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Scheme, SchemeHistory, SchemeStats, UserSavedScheme
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('views', 'applies', 'saves', 'shares')
+HISTORY_FIELDS = {'viewed': 'views', 'applied': 'applies', 'shared': 'shares'}
+POPULARITY_WEIGHTS = {'views': 1, 'applies': 5, 'saves': 3, 'shares': 3}
+
+
+def popularity(counts):
+    return sum(POPULARITY_WEIGHTS[name] * counts.get(name, 0) for name in FIELDS)
+
+
+class CounterBuffer:
+    """Per-process buffer of counter deltas keyed by scheme id"""
+
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._deltas = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, scheme_id, field, amount=1):
+        with self._lock:
+            self._deltas[scheme_id][field] += amount
+            self._pending += 1
+            full = self._pending >= self.flush_size
+            if self._timer is None and self.flush_interval:
+                self._start_timer()
+        if full:
+            self.flush()
+
+    def _start_timer(self):
+        self._timer = threading.Thread(target=self._run, name='scheme-stats-flush', daemon=True)
+        self._timer.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not flush scheme counters')
+            finally:
+                close_old_connections()
+
+    def _take(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+            self._pending = 0
+        return deltas
+
+    def _restore(self, deltas):
+        with self._lock:
+            for scheme_id, counts in deltas.items():
+                for name, amount in counts.items():
+                    self._deltas[scheme_id][name] += amount
+
+    def flush(self):
+        """Write buffered deltas; returns the number of schemes updated"""
+        with self._flush_lock:
+            deltas = {scheme_id: counts for scheme_id, counts in self._take().items() if any(counts.values())}
+            if not deltas:
+                return 0
+            try:
+                apply_deltas(deltas)
+            except Exception:
+                self._restore(deltas)
+                raise
+            return len(deltas)
+
+    def discard(self):
+        self._take()
+
+
+def apply_deltas(deltas):
+    """Add {scheme_id: {field: delta}} to SchemeStats, one UPDATE per distinct delta"""
+    groups = defaultdict(list)
+    for scheme_id, counts in deltas.items():
+        groups[tuple(counts[name] for name in FIELDS)].append(scheme_id)
+
+    with transaction.atomic():
+        existing = Scheme.objects.filter(pk__in=list(deltas)).values_list('pk', flat=True)
+        SchemeStats.objects.bulk_create(
+            [SchemeStats(scheme_id=scheme_id) for scheme_id in existing],
+            ignore_conflicts=True
+        )
+        for key, scheme_ids in groups.items():
+            counts = dict(zip(FIELDS, key))
+            updates = {name: F(name) + amount for name, amount in counts.items() if amount}
+            updates['score'] = F('score') + popularity(counts)
+            SchemeStats.objects.filter(pk__in=scheme_ids).update(**updates)
+
+
+buffer = CounterBuffer(
+    flush_size=getattr(settings, 'SCHEME_STATS_FLUSH_SIZE', 500),
+    flush_interval=getattr(settings, 'SCHEME_STATS_FLUSH_INTERVAL', 5),
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Could not flush scheme counters on exit')
+
+
+def record(scheme_id, field, amount=1):
+    """Count an event once the current transaction commits"""
+    transaction.on_commit(lambda: buffer.add(scheme_id, field, amount))
+
+
+def count_events(scheme_ids=None):
+    """{scheme_id: {field: count}} recounted from SchemeHistory and UserSavedScheme"""
+    counts = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    history = SchemeHistory.objects.filter(action__in=HISTORY_FIELDS)
+    saved = UserSavedScheme.objects.all()
+    if scheme_ids is not None:
+        history = history.filter(scheme_id__in=scheme_ids)
+        saved = saved.filter(scheme_id__in=scheme_ids)
+
+    for scheme_id, action, total in history.values_list('scheme_id', 'action').annotate(total=Count('id')).order_by():
+        counts[scheme_id][HISTORY_FIELDS[action]] = total
+    for scheme_id, total in saved.values_list('scheme_id').annotate(total=Count('id')).order_by():
+        counts[scheme_id]['saves'] = total
+    return counts
+
+
+def reconcile(chunk_size=1000):
+    """
+    Overwrite every scheme's counters with counts from the source tables
+    Deltas still buffered in other processes are added on top when they
+    flush, so run this where traffic is quiet or accept a small overshoot
+    until the next run. Returns the number of schemes reconciled.
+    """
+    buffer.flush()
+    scheme_ids = list(Scheme.objects.order_by('pk').values_list('pk', flat=True))
+    reconciled = 0
+    for start in range(0, len(scheme_ids), chunk_size):
+        chunk = scheme_ids[start:start + chunk_size]
+        counts = count_events(chunk)
+        now = timezone.now()
+        stats = []
+        for scheme_id in chunk:
+            scheme_counts = counts.get(scheme_id, dict.fromkeys(FIELDS, 0))
+            stats.append(SchemeStats(
+                scheme_id=scheme_id,
+                score=popularity(scheme_counts),
+                reconciled_at=now,
+                **scheme_counts
+            ))
+        SchemeStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['scheme'],
+            update_fields=[*FIELDS, 'score', 'reconciled_at']
+        )
+        reconciled += len(stats)
+    return reconciled
@@ -0,0 +1,124 @@
+"""
+Set-based deadline reminders
+
+When a scheme's deadline is set or changes, everyone who saved the scheme
+(and, with DEADLINE_REMINDERS_FOR_ELIGIBLE, every eligible user) gets a
+deadline reminder DEADLINE_REMINDER_LEAD ahead of it. The whole audience is
+handled with three statements regardless of its size:
+
+1. DELETE auto-generated reminders of users who left the audience
+2. UPDATE the date of the remaining active ones
+3. INSERT ... SELECT reminders for audience members who have none yet
+
+Only auto-generated reminders are touched; reminders users created
+themselves through create_reminder are left alone.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .eligibility import eligible_users
+from .models import SchemeReminder, UserSavedScheme
+from .scheduler import bump_generation
+
+
+class SyncResult:
+    def __init__(self):
+        self.retracted = 0
+        self.updated = 0
+        self.created = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (
+            f'{self.created} created, {self.updated} updated, '
+            f'{self.retracted} retracted in {self.elapsed:.2f}s'
+        )
+
+
+def reminder_date_for(deadline, now=None):
+    """When the deadline reminder should fire, or None if the deadline has passed"""
+    now = now or timezone.now()
+    if deadline is None or deadline <= now:
+        return None
+    return max(deadline - settings.DEADLINE_REMINDER_LEAD, now)
+
+
+def _audience(scheme, include_eligible, user_ids):
+    savers = UserSavedScheme.objects.filter(scheme=scheme)
+    if user_ids is not None:
+        savers = savers.filter(user_id__in=user_ids)
+    audience = savers.values('user_id')
+    if include_eligible:
+        eligible = eligible_users(scheme)
+        if user_ids is not None:
+            eligible = eligible.filter(id__in=user_ids)
+        audience = audience.union(eligible.values('id'))
+    return audience.query.sql_with_params()
+
+
+def sync_deadline_reminders(scheme, include_eligible=None, user_ids=None):
+    """
+    Bring auto-generated deadline reminders for a scheme in line with its deadline
+    Pass user_ids to limit the pass to those users (e.g. a user who just saved the scheme)
+    """
+    if include_eligible is None:
+        include_eligible = settings.DEADLINE_REMINDERS_FOR_ELIGIBLE
+    result = SyncResult()
+    start = time.perf_counter()
+    now = timezone.now()
+    reminder_date = reminder_date_for(scheme.deadline, now)
+
+    table = connection.ops.quote_name(SchemeReminder._meta.db_table)
+    managed = 'scheme_id = %s AND auto_generated = %s AND status = %s AND reminder_type = %s'
+    managed_params = [scheme.pk, True, 'active', 'deadline']
+    scope = ''
+    scope_params = []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        scope = f' AND user_id IN ({", ".join(["%s"] * len(user_ids))})'
+        scope_params = user_ids
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if reminder_date is None:
+            cursor.execute(f'DELETE FROM {table} WHERE {managed}{scope}', managed_params + scope_params)
+            result.retracted = cursor.rowcount
+        else:
+            audience_sql, audience_params = _audience(scheme, include_eligible, user_ids)
+            now = connection.ops.adapt_datetimefield_value(now)
+            reminder_date = connection.ops.adapt_datetimefield_value(reminder_date)
+
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {managed}{scope} AND user_id NOT IN ({audience_sql})',
+                managed_params + scope_params + list(audience_params)
+            )
+            result.retracted = cursor.rowcount
+
+            cursor.execute(
+                f'UPDATE {table} SET reminder_date = %s WHERE {managed}{scope} AND reminder_date <> %s',
+                [reminder_date] + managed_params + scope_params + [reminder_date]
+            )
+            result.updated = cursor.rowcount
+
+            # Skip users who already have an active reminder or were already reminded for this date
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, scheme_id, reminder_date, status, reminder_type, auto_generated, created_at) '
+                f'SELECT audience.user_id, %s, %s, %s, %s, %s, %s FROM ({audience_sql}) audience '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} existing '
+                f'WHERE existing.scheme_id = %s AND existing.user_id = audience.user_id '
+                f'AND existing.auto_generated = %s AND existing.reminder_type = %s '
+                f'AND (existing.status = %s OR existing.reminder_date = %s))',
+                [scheme.pk, reminder_date, 'active', 'deadline', True, now]
+                + list(audience_params)
+                + [scheme.pk, True, 'deadline', 'active', reminder_date]
+            )
+            result.created = cursor.rowcount
+
+    if result.retracted or result.updated or result.created:
+        # Raw statements bypass signals; let the near-term scheduler reload
+        bump_generation()
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,273 @@
+"""
+Canonical document vocabulary for checklists
+
+Scheme.documents is free comma-separated text. It is parsed once per scheme
+into canonical document keys (aliases such as "Aadhaar" and "Aadhar Card"
+collapse to one key) and cached until the scheme is saved again.
+"""
+import re
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import notifications
+from .models import DocumentChecklist, Scheme
+
+# Every checklist starts with these documents
+BASE_DOCUMENTS = [
+    'identity_proof',
+    'address_proof',
+    'age_proof',
+    'income_certificate',
+    'occupation_certificate',
+    'state_residency_proof',
+    'bank_account_details',
+    'aadhar_card',
+    'application_form',
+    'supporting_documents',
+]
+
+DOCUMENT_ALIASES = {
+    'aadhar': 'aadhar_card',
+    'aadhaar': 'aadhar_card',
+    'aadhaar_card': 'aadhar_card',
+    'aadhar_number': 'aadhar_card',
+    'uid': 'aadhar_card',
+    'pan': 'pan_card',
+    'ration': 'ration_card',
+    'bank_passbook': 'bank_account_details',
+    'bank_details': 'bank_account_details',
+    'bank_account': 'bank_account_details',
+    'income_proof': 'income_certificate',
+    'domicile_certificate': 'state_residency_proof',
+    'residence_certificate': 'state_residency_proof',
+    'residence_proof': 'state_residency_proof',
+    'photo': 'passport_size_photo',
+    'photograph': 'passport_size_photo',
+    'passport_photo': 'passport_size_photo',
+    'birth_certificate': 'age_proof',
+    'caste_certificate': 'category_certificate',
+}
+
+CACHE_KEY = 'scheme:documents:{}'
+VOCABULARY_KEY = 'scheme:documents:vocabulary'
+CACHE_TTL = 60 * 60 * 24
+
+
+def canonical_document_key(name):
+    key = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+    return DOCUMENT_ALIASES.get(key, key)
+
+
+def document_label(key):
+    return key.replace('_', ' ').title()
+
+
+def parse_documents(text):
+    """Canonical keys of a Scheme.documents string, in order and without duplicates"""
+    keys = []
+    for name in (text or '').split(','):
+        key = canonical_document_key(name) if name.strip() else ''
+        if key and key not in keys:
+            keys.append(key)
+    return tuple(keys)
+
+
+def get_scheme_documents(scheme_ids):
+    """Map each existing scheme id to its canonical document keys (one query for cache misses)"""
+    scheme_ids = list(scheme_ids)
+    cached = cache.get_many([CACHE_KEY.format(scheme_id) for scheme_id in scheme_ids])
+    documents = {}
+    missing = []
+    for scheme_id in scheme_ids:
+        keys = cached.get(CACHE_KEY.format(scheme_id))
+        if keys is None:
+            missing.append(scheme_id)
+        else:
+            documents[scheme_id] = keys
+    if missing:
+        parsed = {
+            scheme_id: parse_documents(text)
+            for scheme_id, text in Scheme.objects.filter(pk__in=missing).values_list('id', 'documents')
+        }
+        cache.set_many({CACHE_KEY.format(scheme_id): keys for scheme_id, keys in parsed.items()}, CACHE_TTL)
+        documents.update(parsed)
+    return documents
+
+
+def get_document_vocabulary():
+    """Every canonical document key used by the base checklist or any scheme"""
+    vocabulary = cache.get(VOCABULARY_KEY)
+    if vocabulary is None:
+        keys = set(BASE_DOCUMENTS)
+        for text in Scheme.objects.values_list('documents', flat=True).iterator():
+            keys.update(parse_documents(text))
+        vocabulary = sorted(keys)
+        cache.set(VOCABULARY_KEY, vocabulary, CACHE_TTL)
+    return vocabulary
+
+
+def invalidate_scheme_documents(scheme_id):
+    cache.delete_many([CACHE_KEY.format(scheme_id), VOCABULARY_KEY])
+
+
+def build_checklist_documents(scheme_keys, existing=None, uploaded=()):
+    """
+    Checklist {document: uploaded} for a scheme, keeping statuses already
+    ticked and ticking documents already in the user's vault
+    """
+    existing = existing or {}
+    documents = {key: False for key in BASE_DOCUMENTS}
+    for key in scheme_keys:
+        documents[key] = False
+    for key in documents:
+        if existing.get(key) or key in uploaded:
+            documents[key] = True
+    return documents
+
+
+def completion_percentage(documents):
+    if not documents:
+        return 0
+    return int(sum(1 for value in documents.values() if value) * 100 / len(documents))
+
+
+class ChecklistVersionConflict(Exception):
+    """The checklist changed since the version the client last saw"""
+
+    def __init__(self, current_version):
+        super().__init__(f'Checklist is at version {current_version}')
+        self.current_version = current_version
+
+
+class UnknownDocument(Exception):
+    """A document to update is not part of the checklist"""
+
+
+MAX_UPDATE_ATTEMPTS = 5
+
+
+def _write_documents(checklist_id, user, expected_version, apply):
+    """
+    Replace a checklist's documents with apply(current documents)
+
+    The row is locked while the change is applied and only the documents,
+    completion and version columns are written. The write is also conditional
+    on the version read, so backends without row locks (SQLite) retry instead
+    of losing a concurrent tick.
+    """
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        with transaction.atomic():
+            checklist = DocumentChecklist.objects.select_for_update().get(id=checklist_id, user=user)
+            if expected_version is not None and checklist.version != expected_version:
+                raise ChecklistVersionConflict(checklist.version)
+
+            documents = apply(dict(checklist.documents or {}))
+            if documents == checklist.documents:
+                return checklist
+
+            checklist.documents = documents
+            checklist.calculate_completion(save=False)
+            checklist.updated_at = timezone.now()
+            updated = DocumentChecklist.objects.filter(pk=checklist.pk, version=checklist.version).update(
+                documents=documents,
+                completion_percentage=checklist.completion_percentage,
+                version=F('version') + 1,
+                updated_at=checklist.updated_at
+            )
+            if updated:
+                checklist.version += 1
+                notifications.notify(user.pk, notifications.CHECKLIST_UPDATED, notifications.checklist_data(checklist))
+                return checklist
+        if expected_version is not None:
+            raise ChecklistVersionConflict(DocumentChecklist.objects.values_list('version', flat=True).get(pk=checklist_id))
+    raise ChecklistVersionConflict(checklist.version)
+
+
+def set_document_status(checklist_id, user, changes, expected_version=None):
+    """Set the uploaded status of individual documents on a checklist"""
+    def apply(documents):
+        for name, uploaded in changes.items():
+            key = name if name in documents else canonical_document_key(name)
+            if key not in documents:
+                raise UnknownDocument(name)
+            documents[key] = bool(uploaded)
+        return documents
+
+    return _write_documents(checklist_id, user, expected_version, apply)
+
+
+def replace_documents(checklist_id, user, documents, expected_version=None):
+    """Replace the whole {document: uploaded} map of a checklist"""
+    return _write_documents(checklist_id, user, expected_version, lambda current: dict(documents))
+
+
+def save_checklists(user, scheme_documents, uploaded=()):
+    """
+    Create or regenerate the user's checklists for {scheme_id: document keys}
+
+    Ticks already on a checklist are kept. Existing rows are locked, merged and
+    written with version = version + 1 only if their version is still the one
+    read; rows a concurrent toggle changed in between are merged again, so no
+    tick is lost and every write gets its own version. New rows are inserted
+    in bulk. Returns (checklists by scheme id, scheme ids created).
+    """
+    profile = {'age': user.age or 0, 'occupation': user.occupation or '', 'state': user.state or ''}
+    pending = dict(scheme_documents)
+    created = set()
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        with transaction.atomic():
+            existing = {
+                scheme_id: (pk, documents, version)
+                for scheme_id, pk, documents, version in DocumentChecklist.objects.select_for_update().filter(
+                    user=user, scheme_id__in=pending
+                ).values_list('scheme_id', 'pk', 'documents', 'version')
+            }
+            new = []
+            for scheme_id, keys in pending.items():
+                if scheme_id not in existing:
+                    documents = build_checklist_documents(keys, uploaded=uploaded)
+                    new.append(DocumentChecklist(
+                        user=user, scheme_id=scheme_id, documents=documents,
+                        completion_percentage=completion_percentage(documents), **profile
+                    ))
+            if new:
+                try:
+                    with transaction.atomic():
+                        DocumentChecklist.objects.bulk_create(new)
+                except IntegrityError:
+                    # Created concurrently; merge into those rows on the next attempt
+                    continue
+                created.update(checklist.scheme_id for checklist in new)
+
+            now = timezone.now()
+            written = set(created)
+            for scheme_id, (pk, current, version) in existing.items():
+                documents = build_checklist_documents(pending[scheme_id], current, uploaded)
+                if DocumentChecklist.objects.filter(pk=pk, version=version).update(
+                    documents=documents,
+                    completion_percentage=completion_percentage(documents),
+                    version=F('version') + 1,
+                    updated_at=now,
+                    **profile
+                ):
+                    written.add(scheme_id)
+            pending = {scheme_id: keys for scheme_id, keys in pending.items() if scheme_id not in written}
+        if not pending:
+            break
+    else:
+        raise ChecklistVersionConflict(None)
+
+    checklists = {
+        checklist.scheme_id: checklist
+        for checklist in DocumentChecklist.objects.filter(
+            user=user, scheme_id__in=scheme_documents
+        ).select_related('scheme')
+    }
+    notifications.notify_many(
+        (user.pk, notifications.CHECKLIST_UPDATED, notifications.checklist_data(checklist))
+        for checklist in checklists.values()
+    )
+    return checklists, created
@@ -0,0 +1,78 @@
+"""
+Eligibility matching between schemes and user profiles
+
+The same age/state/occupation rules back both directions: schemes for a
+user (SchemeViewSet.personalized) and users for a scheme (reminders and
+notifications). Schemes' structured eligibility_rules (rules.py) are applied
+in SQL for users of a scheme, and in-process for schemes of a user.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q, Value
+
+from .rules import compile_rules, profile_values
+
+User = get_user_model()
+
+
+def has_complete_profile(user):
+    return all([user.age, user.occupation, user.state])
+
+
+def schemes_for_user_q(user):
+    """Q object selecting the schemes a user is eligible for"""
+    return (
+        Q(applicable_states__icontains=user.state)
+        & (Q(age_min__isnull=True) | Q(age_min__lte=user.age))
+        & (Q(age_max__isnull=True) | Q(age_max__gte=user.age))
+        & (Q(applicable_occupations__isnull=True) | Q(applicable_occupations__icontains=user.occupation))
+    )
+
+
+def filter_by_rules(schemes, user):
+    """Schemes (already matched by schemes_for_user_q) whose structured rules the user meets"""
+    values = profile_values(user)
+    return [
+        scheme for scheme in schemes
+        if not scheme.eligibility_rules or compile_rules(scheme.eligibility_rules).matches(values)
+    ]
+
+
+def unmet_criteria(scheme, user):
+    """
+    [(criterion, requirement)] the user's complete profile fails for one scheme
+    criterion is age_min, age_max, state, occupation or rule (requirement is the clause text)
+    """
+    unmet = []
+    if scheme.age_min is not None and user.age < scheme.age_min:
+        unmet.append(('age_min', scheme.age_min))
+    if scheme.age_max is not None and user.age > scheme.age_max:
+        unmet.append(('age_max', scheme.age_max))
+    if user.state.lower() not in (scheme.applicable_states or '').lower():
+        unmet.append(('state', scheme.applicable_states))
+    if scheme.applicable_occupations is not None and user.occupation.lower() not in scheme.applicable_occupations.lower():
+        unmet.append(('occupation', scheme.applicable_occupations))
+    if scheme.eligibility_rules:
+        unmet.extend(('rule', clause) for clause in compile_rules(scheme.eligibility_rules).unmet(profile_values(user)))
+    return unmet
+
+
+def eligible_users(scheme):
+    """Queryset of active users with a complete profile who are eligible for the scheme"""
+    users = User.objects.filter(is_active=True, age__isnull=False).exclude(
+        Q(state__isnull=True) | Q(state='') | Q(occupation__isnull=True) | Q(occupation='')
+    )
+    if scheme.age_min is not None:
+        users = users.filter(age__gte=scheme.age_min)
+    if scheme.age_max is not None:
+        users = users.filter(age__lte=scheme.age_max)
+    # The scheme's comma-separated lists must contain the user's value (icontains, reversed)
+    users = users.alias(_scheme_states=Value(scheme.applicable_states or '')).filter(
+        _scheme_states__icontains=F('state')
+    )
+    if scheme.applicable_occupations is not None:
+        users = users.alias(_scheme_occupations=Value(scheme.applicable_occupations)).filter(
+            _scheme_occupations__icontains=F('occupation')
+        )
+    if scheme.eligibility_rules:
+        users = users.filter(compile_rules(scheme.eligibility_rules).to_q())
+    return users
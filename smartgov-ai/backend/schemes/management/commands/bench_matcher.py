@@ -0,0 +1,125 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schemes.eligibility import eligible_users
+from schemes.matcher import UserColumns
+from schemes.models import Scheme
+from users.models import CustomUser
+
+STATES = [
+    'Andhra Pradesh', 'Assam', 'Bihar', 'Gujarat', 'Karnataka', 'Kerala', 'Madhya Pradesh',
+    'Maharashtra', 'Odisha', 'Punjab', 'Rajasthan', 'Tamil Nadu', 'Telangana', 'Uttar Pradesh', 'West Bengal',
+]
+OCCUPATIONS = ['Farmer', 'Student', 'Teacher', 'Self Employed', 'Daily Wage Worker', 'Homemaker', 'Retired', 'Fisherman']
+GENDERS = ['male', 'female', 'other']
+CATEGORIES = ['general', 'obc', 'sc', 'st', 'ews']
+
+SCHEMES = [
+    Scheme(name='Every state, all ages', applicable_states=', '.join(STATES)),
+    Scheme(name='Farmers in the south', age_min=18, applicable_states='Tamil Nadu, Kerala, Karnataka',
+           applicable_occupations='Farmer, Fisherman'),
+    Scheme(name='Students 18-25', age_min=18, age_max=25, applicable_states=', '.join(STATES),
+           applicable_occupations='Student'),
+    Scheme(name='Seniors in Bihar', age_min=60, applicable_states='Bihar'),
+    Scheme(name='Small farmers from reserved categories', applicable_states=', '.join(STATES),
+           applicable_occupations='Farmer',
+           eligibility_rules='income <= 250000 and land_holding < 2 and category in (sc, st, obc)'),
+]
+
+
+def _coded(rng, vocabulary, values, size, missing):
+    """Random codes for values, with a `missing` fraction left at code 0"""
+    codes = np.array([vocabulary.code(value) for value in values], dtype=np.int32)
+    return codes[rng.integers(0, len(codes), size)] * (rng.random(size) >= missing)
+
+
+def synthetic_columns(rng, size):
+    """UserColumns for `size` random users, without touching the database"""
+    columns = UserColumns()
+    columns.ids = np.arange(1, size + 1, dtype=np.int64)
+    columns.active = rng.random(size) >= 0.03
+    ages = rng.integers(0, 90, size).astype(np.float32)
+    ages[rng.random(size) < 0.02] = np.nan
+    incomes = np.round(rng.lognormal(12, 0.8, size), -3)
+    incomes[rng.random(size) < 0.3] = np.nan
+    land = np.round(rng.exponential(1.5, size), 2)
+    land[rng.random(size) < 0.5] = np.nan
+    columns.numbers = {'age': ages, 'annual_income': incomes, 'land_holding': land}
+    # A few percent of profiles are incomplete (missing state or occupation)
+    columns.codes = {
+        'state': _coded(rng, columns.vocabularies['state'], STATES, size, 0.02),
+        'occupation': _coded(rng, columns.vocabularies['occupation'], OCCUPATIONS, size, 0.01),
+        'gender': _coded(rng, columns.vocabularies['gender'], GENDERS, size, 0.2),
+        'social_category': _coded(rng, columns.vocabularies['social_category'], CATEGORIES, size, 0.3),
+    }
+    return columns
+
+
+class Command(BaseCommand):
+    help = 'Benchmark reverse eligibility matching of schemes against user profile columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000_000, help='Synthetic users held in columns')
+        parser.add_argument(
+            '--db-users', type=int, default=50_000,
+            help='Users inserted to measure snapshot load throughput and check results against SQL'
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        self.bench_columns(rng, options['users'], options['chunk_size'])
+        if options['db_users']:
+            self.bench_database(rng, options['db_users'])
+
+    def bench_columns(self, rng, size, chunk_size):
+        started = time.perf_counter()
+        columns = synthetic_columns(rng, size)
+        self.stdout.write(f'Built columns for {size:,} users in {time.perf_counter() - started:.2f}s')
+        for scheme in SCHEMES:
+            started = time.perf_counter()
+            ids = columns.match(scheme)
+            matched = time.perf_counter()
+            chunks = sum(1 for start in range(0, len(ids), chunk_size) if ids[start:start + chunk_size].tolist())
+            streamed = time.perf_counter()
+            self.stdout.write(
+                f'{scheme.name}: {len(ids):,} eligible, matched in {(matched - started) * 1000:.0f} ms, '
+                f'{chunks:,} chunks of {chunk_size} streamed in {(streamed - matched) * 1000:.0f} ms'
+            )
+
+    def bench_database(self, rng, size):
+        with transaction.atomic():
+            CustomUser.objects.bulk_create([
+                CustomUser(
+                    username=f'bench-matcher-{i}',
+                    age=None if i % 50 == 0 else int(rng.integers(0, 90)),
+                    state=STATES[i % len(STATES)] if i % 40 else '',
+                    occupation=OCCUPATIONS[i % len(OCCUPATIONS)],
+                    annual_income=None if i % 7 == 0 else int(rng.integers(20, 500)) * 1000,
+                    gender=GENDERS[i % len(GENDERS)],
+                    social_category=CATEGORIES[i % len(CATEGORIES)] if i % 6 else None,
+                    land_holding=None if i % 3 == 0 else round(float(rng.exponential(1.5)), 2),
+                    is_active=i % 30 != 0
+                )
+                for i in range(size)
+            ], batch_size=2000)
+
+            columns = UserColumns()
+            started = time.perf_counter()
+            loaded = columns.refresh()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Loaded {loaded:,} users from the database in {elapsed:.2f}s ({loaded / elapsed:,.0f}/s)')
+
+            for scheme in SCHEMES:
+                scheme.save()
+                expected = set(eligible_users(scheme).values_list('pk', flat=True))
+                matched = set(columns.match(scheme).tolist())
+                status = self.style.SUCCESS('matches SQL') if matched == expected else self.style.ERROR(
+                    f'differs from SQL ({len(matched ^ expected)} users)'
+                )
+                self.stdout.write(f'{scheme.name}: {len(matched):,} eligible, {status}')
+            transaction.set_rollback(True)
@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schemes import recommendations
+from schemes.models import Scheme, SchemeHistory
+from schemes.serializers import SchemeSerializer
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Benchmark co-occurrence build time and recommendation request latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Synthetic history events')
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--schemes', type=int, default=2000)
+        parser.add_argument(
+            '--db-rows', type=int, default=100_000,
+            help='History rows inserted to measure database fetch throughput'
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        num_schemes = options['schemes']
+
+        with transaction.atomic():
+            schemes = Scheme.objects.bulk_create([
+                Scheme(
+                    name=f'Bench Scheme {i}', category='bench', description='', eligibility='',
+                    documents='', apply_link='https://example.com', benefits='',
+                    applicable_states='Tamil Nadu, Kerala' if i % 2 else 'Kerala',
+                    application_process=''
+                )
+                for i in range(num_schemes)
+            ], batch_size=1000)
+            scheme_ids = np.array([scheme.pk for scheme in schemes], dtype=np.int64)
+
+            # Skewed popularity, like real scheme traffic
+            popularity = 1 / np.arange(1, num_schemes + 1) ** 0.8
+            events = scheme_ids[rng.choice(num_schemes, size=options['rows'], p=popularity / popularity.sum())]
+            users = rng.integers(1, options['users'] + 1, size=options['rows'])
+
+            started = time.perf_counter()
+            matrix = recommendations.cooccurrence(
+                recommendations.interaction_matrix(users, events, int(scheme_ids.max()) + 1)
+            )
+            built = time.perf_counter()
+            neighbours = recommendations.top_neighbours(matrix, rows=scheme_ids)
+            ranked = time.perf_counter()
+            stored = recommendations.store_neighbours(neighbours, matrix)
+            saved = time.perf_counter()
+            self.stdout.write(
+                f"{options['rows']:,} events, {options['users']:,} users, {num_schemes} schemes: "
+                f'C = X.T @ X in {built - started:.2f}s ({matrix.nnz:,} non-zeros), '
+                f'top-N in {ranked - built:.2f}s, stored {stored} rows in {saved - ranked:.2f}s'
+            )
+
+            if options['db_rows']:
+                user = CustomUser.objects.create(username='bench-recommendations')
+                SchemeHistory.objects.bulk_create([
+                    SchemeHistory(user=user, scheme_id=int(scheme_id), action='viewed')
+                    for scheme_id in events[:options['db_rows']]
+                ], batch_size=5000)
+                started = time.perf_counter()
+                fetched = len(recommendations._history_arrays(SchemeHistory.objects.filter(user=user))[0])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'History fetch: {fetched / elapsed:,.0f} rows/s '
+                    f"(~{options['rows'] / (fetched / elapsed):.1f}s for {options['rows']:,} rows)"
+                )
+
+            viewer = CustomUser.objects.create(
+                username='bench-recommendations-viewer', age=30, occupation='farmer', state='Tamil Nadu'
+            )
+            latencies = []
+            for scheme_id in rng.choice(scheme_ids[:100], size=options['requests']):
+                started = time.perf_counter()
+                SchemeSerializer([scheme for scheme, _ in recommendations.similar_schemes(
+                    int(scheme_id), viewer, limit=10
+                )], many=True).data
+                latencies.append(time.perf_counter() - started)
+            latencies = np.array(latencies) * 1000
+            self.stdout.write(
+                f'Per request (eligibility-filtered, serialized): p50 {np.percentile(latencies, 50):.2f} ms, '
+                f'p95 {np.percentile(latencies, 95):.2f} ms'
+            )
+
+            transaction.set_rollback(True)
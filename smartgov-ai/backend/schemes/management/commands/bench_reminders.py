@@ -0,0 +1,94 @@
+import socketserver
+import threading
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from schemes.models import Scheme, SchemeReminder
+from schemes.reminders import dispatch_due_reminders
+from schemes.sms import BaseSMSGateway
+from users.models import CustomUser, UserPreferences
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server that accepts and discards every message"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 sink ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith((b'EHLO', b'HELO')):
+                self.reply('250 sink')
+            elif command == b'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    messages = 0
+
+
+class NullSMSGateway(BaseSMSGateway):
+    def send_messages(self, messages):
+        return len(messages)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark reminder dispatch throughput against a local SMTP sink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--reminders-per-user', type=int, default=3)
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(('127.0.0.1', 0), SMTPSinkHandler)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        host, port = sink.server_address
+
+        with transaction.atomic():
+            now = timezone.now()
+            scheme = Scheme.objects.create(
+                name='Benchmark Scheme', category='bench', description='', eligibility='',
+                documents='', apply_link='https://example.com', applicable_states='', benefits='',
+                application_process='', deadline=now + timedelta(days=3)
+            )
+            users = CustomUser.objects.bulk_create([
+                CustomUser(username=f'bench-reminder-{i}', email=f'bench{i}@example.com', phone_number='9999999999')
+                for i in range(options['users'])
+            ])
+            UserPreferences.objects.bulk_create([
+                UserPreferences(user=user, preferred_communication='both' if i % 4 == 0 else 'email')
+                for i, user in enumerate(users)
+            ])
+            SchemeReminder.objects.bulk_create([
+                SchemeReminder(user=user, scheme=scheme, reminder_date=now - timedelta(minutes=1))
+                for user in users
+                for _ in range(options['reminders_per_user'])
+            ], batch_size=1000)
+
+            connection = get_connection('django.core.mail.backends.smtp.EmailBackend', host=host, port=port)
+            stats = dispatch_due_reminders(now=now, connection=connection, sms_gateway=NullSMSGateway())
+            self.stdout.write(str(stats))
+            self.stdout.write(f'SMTP sink received {sink.messages} messages')
+
+            transaction.set_rollback(True)
+        sink.shutdown()
@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from schemes.management.commands.bench_matcher import CATEGORIES, GENDERS, OCCUPATIONS, STATES, synthetic_columns
+from schemes.rules import compile_rules
+
+TEMPLATES = [
+    'income <= {income} and gender == female and category in (sc, st, obc)',
+    'occupation == farmer and (land_holding < {land} or not category == general)',
+    'age >= {age} and income < {income}',
+    'category not in (general, ews) or (income < {income} and land_holding <= {land})',
+    'state in ("tamil nadu", kerala, karnataka) and gender != male and age < {age}',
+]
+
+
+def rule_texts(rng, count):
+    return [
+        TEMPLATES[i % len(TEMPLATES)].format(
+            income=int(rng.integers(50, 800)) * 1000, land=round(float(rng.uniform(0.5, 5)), 1), age=int(rng.integers(18, 70))
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark eligibility rule compilation and evaluation (rules per second)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=2000, help='Distinct rules to compile')
+        parser.add_argument('--profiles', type=int, default=200_000, help='Single-profile evaluations per rule template')
+        parser.add_argument('--users', type=int, default=1_000_000, help='Users in the vectorized column snapshot')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+
+        texts = rule_texts(rng, options['rules'])
+        compile_rules.cache_clear()
+        started = time.perf_counter()
+        for text in texts:
+            compile_rules(text)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Compiled {len(texts):,} rules in {elapsed:.2f}s ({len(texts) / elapsed:,.0f} rules/s)')
+        started = time.perf_counter()
+        for text in texts:
+            compile_rules(text)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Cached lookups: {len(texts) / elapsed:,.0f} rules/s')
+
+        # One profile at a time, as personalized and the chatbot evaluate them
+        count = options['profiles']
+        profiles = [
+            {
+                'age': float(rng.integers(0, 90)),
+                'annual_income': None if i % 3 == 0 else float(rng.integers(20, 900) * 1000),
+                'land_holding': None if i % 2 else float(rng.uniform(0, 6)),
+                'gender': GENDERS[i % len(GENDERS)],
+                'social_category': CATEGORIES[i % len(CATEGORIES)],
+                'state': STATES[i % len(STATES)].lower(),
+                'occupation': OCCUPATIONS[i % len(OCCUPATIONS)].lower(),
+            }
+            for i in range(count)
+        ]
+        rules = [compile_rules(text) for text in texts[:len(TEMPLATES)]]
+        started = time.perf_counter()
+        matched = sum(rule.matches(values) for rule in rules for values in profiles)
+        elapsed = time.perf_counter() - started
+        evaluations = len(rules) * count
+        self.stdout.write(
+            f'Single profile: {evaluations:,} evaluations in {elapsed:.2f}s '
+            f'({evaluations / elapsed:,.0f} rules/s, {matched:,} matched)'
+        )
+
+        # A whole column snapshot at once, as the reverse matcher evaluates them
+        columns = synthetic_columns(rng, options['users'])
+        started = time.perf_counter()
+        matched = sum(int(rule.evaluate(columns).sum()) for rule in rules)
+        elapsed = time.perf_counter() - started
+        evaluations = len(rules) * len(columns)
+        self.stdout.write(
+            f'Vectorized: {len(rules)} rules x {len(columns):,} users in {elapsed:.2f}s '
+            f'({evaluations / elapsed:,.0f} user-rule evaluations/s, {matched:,} matched)'
+        )
@@ -0,0 +1,107 @@
+import asyncio
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+
+from channels import DEFAULT_CHANNEL_LAYER
+from channels.layers import InMemoryChannelLayer, channel_layers, get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from schemes import notifications
+from schemes.consumers import NotificationConsumer
+
+
+class ThrottledInMemoryChannelLayer(InMemoryChannelLayer):
+    """
+    The in-memory layer scans every channel for expired messages on each
+    call, which makes it quadratic in the number of sockets. Redis has no
+    such scan, so for measuring the consumer once a second is enough.
+    """
+    _cleaned = 0.0
+
+    def _clean_expired(self):
+        now = time.monotonic()
+        if now - self._cleaned >= 1:
+            self._cleaned = now
+            super()._clean_expired()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark concurrent notification sockets in one process: connect rate, memory per socket and '
+        'event fan-out. Sockets use the in-process ASGI test transport, so TCP buffers are not included.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=10_000)
+        parser.add_argument('--batch', type=int, default=500, help='Sockets connected concurrently')
+        parser.add_argument('--rounds', type=int, default=3, help='Events pushed to every socket')
+        parser.add_argument('--samples', type=int, default=500, help='Single-user pushes timed for latency')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(**options))
+
+    async def run(self, sockets, batch, rounds, samples, **options):
+        layer = get_channel_layer()
+        if type(layer) is InMemoryChannelLayer:
+            layer = channel_layers.backends[DEFAULT_CHANNEL_LAYER] = ThrottledInMemoryChannelLayer()
+        User = get_user_model()
+        application = NotificationConsumer.as_asgi()
+        self.stdout.write(f'Channel layer: {type(layer).__name__}')
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        communicators = []
+        started = time.perf_counter()
+        for first in range(0, sockets, batch):
+            connecting = []
+            for user_id in range(first + 1, min(first + batch, sockets) + 1):
+                communicator = WebsocketCommunicator(application, '/ws/notifications/')
+                communicator.scope['user'] = User(pk=user_id, username=f'bench{user_id}')
+                connecting.append(communicator)
+            results = await asyncio.gather(*(communicator.connect(timeout=60) for communicator in connecting))
+            if not all(connected for connected, _ in results):
+                raise RuntimeError('A socket was refused')
+            communicators += connecting
+        elapsed = time.perf_counter() - started
+        used = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        self.stdout.write(
+            f'Connected {sockets:,} sockets in {elapsed:.2f}s ({sockets / elapsed:,.0f}/s), '
+            f'{used / sockets / 1024:.1f} KB per socket, peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB'
+        )
+
+        # Everyone at once, as a new scheme or a reminder run would
+        for number in range(rounds):
+            messages = [(user_id, notifications.SCHEME_ELIGIBLE, {'scheme_id': number}) for user_id in range(1, sockets + 1)]
+            started = time.perf_counter()
+            await notifications.send_messages(layer, messages)
+            sent = time.perf_counter() - started
+            await asyncio.gather(*(communicator.receive_json_from(timeout=60) for communicator in communicators))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Fan-out {number + 1}: {sockets:,} events sent in {sent:.2f}s, all received after {elapsed:.2f}s '
+                f'({sockets / elapsed:,.0f} events/s)'
+            )
+
+        # One user at a time, as a checklist edit would
+        latencies = []
+        for communicator_index in random.Random(0).choices(range(sockets), k=samples):
+            started = time.perf_counter()
+            await notifications.send_messages(layer, [(communicator_index + 1, notifications.CHECKLIST_UPDATED, {})])
+            await communicators[communicator_index].receive_json_from(timeout=10)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        self.stdout.write(
+            f'Single push latency: median {statistics.median(latencies):.2f}ms, '
+            f'p99 {latencies[int(len(latencies) * 0.99)]:.2f}ms'
+        )
+
+        started = time.perf_counter()
+        for first in range(0, sockets, batch):
+            await asyncio.gather(*(communicator.disconnect(timeout=60) for communicator in communicators[first:first + batch]))
+        self.stdout.write(f'Disconnected in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from schemes import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Build or incrementally update "people also applied for" recommendations. Incremental updates '
+        'miss late-committed and deleted history, so a full build has to run periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from the whole history')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and fold in new history every N seconds (0 = run once and exit)'
+        )
+        parser.add_argument(
+            '--rebuild-interval', type=int, default=24 * 60 * 60,
+            help='With --interval, rebuild from the whole history every N seconds'
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        last_build = time.monotonic()
+        while True:
+            started = time.perf_counter()
+            if full:
+                last_build = time.monotonic()
+            result = recommendations.build() if full else recommendations.update()
+            self.stdout.write(
+                f'{"Built" if full else "Updated"} recommendations for {result.schemes} schemes '
+                f'from {result.events} events in {time.perf_counter() - started:.2f}s '
+                f'(watermark {result.watermark})'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+            full = time.monotonic() - last_build >= options['rebuild_interval']
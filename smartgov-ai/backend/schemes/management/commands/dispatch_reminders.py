@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from schemes.reminders import dispatch_due_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send due scheme reminders as per-user email/SMS digests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='Users per chunk')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and dispatch every N seconds (0 = dispatch once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = dispatch_due_reminders(chunk_size=options['chunk_size'])
+            self.stdout.write(str(stats))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
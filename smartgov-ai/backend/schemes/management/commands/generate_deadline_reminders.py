@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from schemes.deadlines import sync_deadline_reminders
+from schemes.models import Scheme
+
+
+class Command(BaseCommand):
+    help = 'Generate, move or retract auto-generated deadline reminders for schemes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scheme_ids', nargs='*', type=int, help='Schemes to process (default: all with a deadline)')
+        parser.add_argument('--eligible', action='store_true', help='Also remind every eligible user, not only savers')
+
+    def handle(self, *args, **options):
+        schemes = Scheme.objects.all()
+        if options['scheme_ids']:
+            schemes = schemes.filter(pk__in=options['scheme_ids'])
+        else:
+            schemes = schemes.filter(deadline__isnull=False)
+        for scheme in schemes.iterator():
+            result = sync_deadline_reminders(scheme, include_eligible=options['eligible'] or None)
+            self.stdout.write(f'{scheme.name}: {result}')
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from schemes.vault import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Abort stale vault upload sessions and delete their staged chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=None,
+            help='Hours without a new chunk (default: VAULT_UPLOAD_TTL)'
+        )
+
+    def handle(self, *args, **options):
+        older_than = timedelta(hours=options['older_than']) if options['older_than'] else None
+        aborted = purge_stale_uploads(older_than)
+        self.stdout.write(f'Aborted {aborted} stale upload sessions')
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from schemes import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending scheme scores from recent scheme history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='History to replay; older events have decayed to nothing anyway'
+        )
+
+    def handle(self, *args, **options):
+        replayed = trending.rebuild(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(f'Replayed {replayed} history events')
+        for scheme_id, score in trending.engine.top(k=5):
+            self.stdout.write(f'  scheme {scheme_id}: {score:.2f}')
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from schemes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount scheme popularity counters from scheme history and saved schemes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and reconcile every N seconds (0 = reconcile once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            reconciled = reconcile(chunk_size=options['chunk_size'])
+            self.stdout.write(f'Reconciled counters for {reconciled} schemes')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
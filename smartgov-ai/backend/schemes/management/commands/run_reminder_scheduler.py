@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from schemes.scheduler import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the near-term reminder scheduler (only the elected leader dispatches)'
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler()
+        self.stdout.write(f'Reminder scheduler started as {scheduler.lease.owner}')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.stop()
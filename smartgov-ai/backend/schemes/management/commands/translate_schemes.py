@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from schemes import translations
+
+
+class Command(BaseCommand):
+    help = 'Translate scheme text that is new or changed since its last translation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--language', action='append', dest='languages',
+            help='Language code to translate into (repeatable); defaults to all TRANSLATION_LANGUAGES'
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.TRANSLATION_BATCH_SIZE, help='Schemes per LLM request')
+        parser.add_argument('--rate', type=int, default=settings.TRANSLATION_REQUESTS_PER_MINUTE, help='LLM requests per minute')
+        parser.add_argument('--limit', type=int, help='Translate at most this many schemes per language')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many schemes need translating')
+
+    def handle(self, *args, **options):
+        languages = options['languages'] or list(settings.TRANSLATION_LANGUAGES)
+        unknown = set(languages) - set(settings.TRANSLATION_LANGUAGES)
+        if unknown:
+            raise CommandError(f'Unsupported language(s): {", ".join(sorted(unknown))}')
+
+        for language in languages:
+            pending = translations.schemes_needing_translation(language).count()
+            self.stdout.write(f'{language}: {pending} schemes need translating')
+            if options['dry_run'] or not pending:
+                continue
+            translator = translations.Translator(language, per_minute=options['rate'])
+            run = translations.translate_pending(
+                language, batch_size=options['batch_size'], limit=options['limit'], translator=translator
+            )
+            self.stdout.write(f'{language}: translated {run.translated} schemes in {run.requests} requests')
+            if run.failed:
+                self.stderr.write(f'{language}: failed for schemes {", ".join(map(str, run.failed))}')
@@ -0,0 +1,240 @@
+"""
+Vectorized reverse eligibility matching
+
+Finds every user eligible for a scheme without a query per user. User
+profiles are kept in columnar NumPy arrays, refreshed incrementally from
+CustomUser.updated_at. Text fields are encoded against a vocabulary of their distinct lowercased
+values, so the "scheme's list contains the user's value" rule of
+eligibility.eligible_users is evaluated once per distinct value and then
+broadcast to every user with a table lookup. A scheme's structured
+eligibility_rules are evaluated over the same columns (see rules.py).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import notifications, rules
+from .models import Scheme, SchemeReminder
+from .scheduler import bump_generation
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+FETCH_CHUNK_SIZE = 50000
+# Rows committed late can carry an updated_at just before the last refresh
+REFRESH_OVERLAP = timedelta(minutes=5)
+# Ages are whole numbers, so float32 holds them exactly; incomes and land
+# holdings stay float64 so comparisons agree with the database
+NUMBER_DTYPES = {'age': np.float32, 'annual_income': np.float64, 'land_holding': np.float64}
+
+
+class Vocabulary:
+    """Maps distinct lowercased strings to small integer codes; code 0 is 'missing'"""
+
+    def __init__(self):
+        self.values = ['']
+        self._codes = {'': 0}
+
+    def code(self, value):
+        value = (value or '').strip().lower()
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        """Code of a lowercased value, or 0 if no user has it"""
+        return self._codes.get(value, 0)
+
+    def contained_in(self, text):
+        """Boolean table: is each value a substring of text (case-insensitive)?"""
+        text = (text or '').lower()
+        return np.array([bool(value) and value in text for value in self.values], dtype=bool)
+
+
+class UserColumns:
+    """
+    Columnar snapshot of the profile fields eligibility depends on, sorted by user id
+    numbers[attribute] are floats with NaN for missing values; codes[attribute]
+    index vocabularies[attribute]
+    """
+
+    NUMBER_FIELDS = rules.NUMBER_ATTRIBUTES
+    TEXT_FIELDS = rules.TEXT_ATTRIBUTES
+    FIELDS = ('id', 'is_active') + NUMBER_FIELDS + TEXT_FIELDS
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.numbers = {name: np.zeros(0, dtype=NUMBER_DTYPES[name]) for name in self.NUMBER_FIELDS}
+        self.codes = {name: np.zeros(0, dtype=np.int32) for name in self.TEXT_FIELDS}
+        self.vocabularies = {name: Vocabulary() for name in self.TEXT_FIELDS}
+        self.synced_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _encode(self, rows):
+        count = len(rows)
+        columns = list(zip(*rows))
+        ids = np.fromiter(columns[0], dtype=np.int64, count=count)
+        active = np.fromiter(columns[1], dtype=bool, count=count)
+        numbers = {
+            name: np.fromiter(
+                (np.nan if value is None else float(value) for value in columns[2 + i]),
+                dtype=NUMBER_DTYPES[name], count=count
+            )
+            for i, name in enumerate(self.NUMBER_FIELDS)
+        }
+        offset = 2 + len(self.NUMBER_FIELDS)
+        codes = {
+            name: np.fromiter(
+                (self.vocabularies[name].code(value) for value in columns[offset + i]), dtype=np.int32, count=count
+            )
+            for i, name in enumerate(self.TEXT_FIELDS)
+        }
+        return ids, active, numbers, codes
+
+    def upsert(self, rows):
+        """Insert or overwrite users given as rows of FIELDS"""
+        if not rows:
+            return
+        ids, active, numbers, codes = self._encode(rows)
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == ids[found]
+
+        existing = positions[found]
+        self.active[existing] = active[found]
+        for current, incoming in ((self.numbers, numbers), (self.codes, codes)):
+            for name, values in incoming.items():
+                current[name][existing] = values[found]
+
+        new = ~found
+        if not new.any():
+            return
+        self.ids = np.concatenate([self.ids, ids[new]])
+        self.active = np.concatenate([self.active, active[new]])
+        for current, incoming in ((self.numbers, numbers), (self.codes, codes)):
+            for name, values in incoming.items():
+                current[name] = np.concatenate([current[name], values[new]])
+        if len(self.ids) > 1 and (np.diff(self.ids) <= 0).any():
+            order = np.argsort(self.ids, kind='stable')
+            self.ids, self.active = self.ids[order], self.active[order]
+            for current in (self.numbers, self.codes):
+                for name in current:
+                    current[name] = current[name][order]
+
+    def refresh(self):
+        """Load users changed since the last refresh (everyone on the first call)"""
+        with self._lock:
+            started = timezone.now()
+            users = User.objects.all()
+            if self.synced_at is not None:
+                users = users.filter(updated_at__gte=self.synced_at - REFRESH_OVERLAP)
+            rows = users.order_by().values_list(*self.FIELDS).iterator(chunk_size=FETCH_CHUNK_SIZE)
+            loaded = 0
+            while True:
+                chunk = list(islice(rows, FETCH_CHUNK_SIZE))
+                if not chunk:
+                    break
+                self.upsert(chunk)
+                loaded += len(chunk)
+            self.synced_at = started
+            return loaded
+
+    def match(self, scheme):
+        """Sorted ids of the users eligible for a scheme (same rules as eligibility.eligible_users)"""
+        with self._lock:
+            ages, states, occupations = self.numbers['age'], self.codes['state'], self.codes['occupation']
+            mask = self.active & ~np.isnan(ages) & (states != 0) & (occupations != 0)
+            if scheme.age_min is not None:
+                mask &= ages >= scheme.age_min
+            if scheme.age_max is not None:
+                mask &= ages <= scheme.age_max
+            mask &= self.vocabularies['state'].contained_in(scheme.applicable_states)[states]
+            if scheme.applicable_occupations is not None:
+                mask &= self.vocabularies['occupation'].contained_in(scheme.applicable_occupations)[occupations]
+            if scheme.eligibility_rules:
+                mask &= rules.compile_rules(scheme.eligibility_rules).evaluate(self)
+            return self.ids[mask]
+
+
+columns = UserColumns()
+
+
+def eligible_user_ids(scheme, chunk_size=None):
+    """Yield lists of eligible user ids, chunk_size at a time"""
+    chunk_size = chunk_size or settings.ELIGIBILITY_MATCH_CHUNK_SIZE
+    columns.refresh()
+    ids = columns.match(scheme)
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size].tolist()
+
+
+def notify_eligible_users(scheme_id):
+    """Queue an 'application' reminder, due now, for every user eligible for a new scheme"""
+    scheme = Scheme.objects.filter(pk=scheme_id).first()
+    if scheme is None:
+        return 0
+    now = timezone.now()
+    created = 0
+    event = notifications.scheme_data(scheme)
+    for chunk in eligible_user_ids(scheme):
+        # The snapshot can lag behind deletions and deactivations
+        user_ids = list(User.objects.filter(pk__in=chunk, is_active=True).values_list('pk', flat=True))
+        with transaction.atomic():
+            created += len(SchemeReminder.objects.bulk_create([
+                SchemeReminder(
+                    user_id=user_id,
+                    scheme=scheme,
+                    reminder_date=now,
+                    reminder_type='application',
+                    auto_generated=True
+                )
+                for user_id in user_ids
+            ]))
+        notifications.notify_many(
+            (user_id, notifications.SCHEME_ELIGIBLE, event) for user_id in user_ids
+        )
+    if created:
+        bump_generation()
+    return created
+
+
+_executor = (
+    ThreadPoolExecutor(max_workers=settings.ELIGIBILITY_MATCH_WORKERS, thread_name_prefix='eligibility-match')
+    if settings.ELIGIBILITY_MATCH_WORKERS else None
+)
+
+
+def _notify(scheme_id):
+    try:
+        created = notify_eligible_users(scheme_id)
+        logger.info('Queued %s new-scheme reminders for scheme %s', created, scheme_id)
+    except Exception:
+        logger.exception('Could not notify users eligible for scheme %s', scheme_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_new_scheme_notifications(scheme_id):
+    """Match and notify in the background once the scheme is committed"""
+    def submit():
+        if _executor is None:
+            notify_eligible_users(scheme_id)
+        else:
+            _executor.submit(_notify, scheme_id)
+    transaction.on_commit(submit)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schemereminder',
+            index=models.Index(fields=['status', 'reminder_date'], name='schemes_reminder_due_idx'),
+        ),
+    ]
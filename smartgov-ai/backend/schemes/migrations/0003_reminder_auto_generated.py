@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0002_reminder_due_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemereminder',
+            name='auto_generated',
+            field=models.BooleanField(default=False, help_text='Created from the scheme deadline, not by the user'),
+        ),
+        migrations.AddIndex(
+            model_name='schemereminder',
+            index=models.Index(fields=['scheme', 'user'], name='schemes_reminder_scheme_idx'),
+        ),
+    ]
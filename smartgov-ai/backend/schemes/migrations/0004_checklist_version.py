@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0003_reminder_auto_generated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchecklist',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_scheme_stats(apps, schema_editor):
+    """Count existing history and saved schemes into the new counters"""
+    from schemes.counters import FIELDS, HISTORY_FIELDS, popularity
+
+    SchemeHistory = apps.get_model('schemes', 'SchemeHistory')
+    SchemeStats = apps.get_model('schemes', 'SchemeStats')
+    UserSavedScheme = apps.get_model('schemes', 'UserSavedScheme')
+
+    counts = {}
+    history = SchemeHistory.objects.filter(action__in=HISTORY_FIELDS).values_list('scheme_id', 'action')
+    for scheme_id, action, total in history.annotate(total=Count('id')).order_by():
+        counts.setdefault(scheme_id, dict.fromkeys(FIELDS, 0))[HISTORY_FIELDS[action]] = total
+    for scheme_id, total in UserSavedScheme.objects.values_list('scheme_id').annotate(total=Count('id')).order_by():
+        counts.setdefault(scheme_id, dict.fromkeys(FIELDS, 0))['saves'] = total
+    SchemeStats.objects.bulk_create(
+        [SchemeStats(scheme_id=scheme_id, score=popularity(c), **c) for scheme_id, c in counts.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0005_document_vault'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemeStats',
+            fields=[
+                ('scheme', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='schemes.scheme')),
+                ('views', models.BigIntegerField(default=0)),
+                ('applies', models.BigIntegerField(default=0)),
+                ('saves', models.BigIntegerField(default=0)),
+                ('shares', models.BigIntegerField(default=0)),
+                ('score', models.BigIntegerField(default=0, help_text='Weighted sum used for ?ordering=popular')),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Scheme Stats',
+                'verbose_name_plural': 'Scheme Stats',
+                'indexes': [models.Index(fields=['-score'], name='schemes_stats_score_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_scheme_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0006_scheme_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(blank=True, default='', max_length=50)),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField()),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_scores', to='schemes.scheme')),
+            ],
+            options={
+                'verbose_name': 'Trending Score',
+                'verbose_name_plural': 'Trending Scores',
+                'unique_together': {('scheme', 'state')},
+            },
+        ),
+    ]
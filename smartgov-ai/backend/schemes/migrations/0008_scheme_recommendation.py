@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0007_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemeRecommendation',
+            fields=[
+                ('scheme', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendations', serialize=False, to='schemes.scheme')),
+                ('neighbours', models.JSONField(default=list)),
+                ('user_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Scheme Recommendation',
+                'verbose_name_plural': 'Scheme Recommendations',
+            },
+        ),
+    ]
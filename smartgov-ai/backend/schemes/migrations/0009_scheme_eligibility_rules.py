@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0008_scheme_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheme',
+            name='eligibility_rules',
+            field=models.TextField(blank=True, default='', help_text='Structured criteria, e.g. income <= 250000 and category in (sc, st)'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0009_scheme_eligibility_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemeTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10)),
+                ('fields', models.JSONField(default=dict)),
+                ('source_updated_at', models.DateTimeField(help_text='Scheme.updated_at of the text that was translated')),
+                ('backend', models.CharField(blank=True, max_length=200)),
+                ('translated_at', models.DateTimeField(auto_now=True)),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='schemes.scheme')),
+            ],
+            options={
+                'verbose_name': 'Scheme Translation',
+                'verbose_name_plural': 'Scheme Translations',
+                'unique_together': {('scheme', 'language')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0010_scheme_translation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemereminder',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When a dispatcher took the reminder for sending', null=True),
+        ),
+        migrations.AddField(
+            model_name='schemereminder',
+            name='email_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='schemereminder',
+            name='sms_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='schemereminder',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('sending', 'Sending'), ('sent', 'Sent'), ('completed', 'Completed')], default='active', max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemes', '0011_reminder_delivery_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemereminder',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Dispatches that failed to deliver the reminder'),
+        ),
+        migrations.AddField(
+            model_name='schemereminder',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='When a failed delivery is retried', null=True),
+        ),
+        migrations.AlterField(
+            model_name='schemereminder',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('sending', 'Sending'), ('sent', 'Sent'), ('completed', 'Completed'), ('failed', 'Failed')], default='active', max_length=20),
+        ),
+    ]
@@ -1,6 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
+import uuid
+
+from .rules import RuleSyntaxError, compile_rules
 
 User = get_user_model()
 
@@ -10,6 +14,7 @@ class Scheme(models.Model):
     category = models.CharField(max_length=100)
     description = models.TextField()
     eligibility = models.TextField()
+    eligibility_rules = models.TextField(blank=True, default='', help_text="Structured criteria, e.g. income <= 250000 and category in (sc, st)")
     documents = models.TextField()
     apply_link = models.URLField()
     deadline = models.DateTimeField(null=True, blank=True)
@@ -31,6 +36,23 @@ class Scheme(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored deadline so saves can tell whether it changed
+        instance._loaded_deadline = instance.__dict__.get('deadline')
+        return instance
+
+    @property
+    def deadline_changed(self):
+        return getattr(self, '_loaded_deadline', None) != self.deadline
+
+    def clean(self):
+        try:
+            compile_rules(self.eligibility_rules)
+        except RuleSyntaxError as e:
+            raise ValidationError({'eligibility_rules': str(e)})
+
 
 class DocumentChecklist(models.Model):
     """Model to store required documents for schemes based on user profile"""
@@ -41,6 +63,7 @@ class DocumentChecklist(models.Model):
     occupation = models.CharField(max_length=100)
     state = models.CharField(max_length=50)
     completion_percentage = models.IntegerField(default=0)
+    version = models.PositiveIntegerField(default=0)  # bumped on every documents change
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -52,14 +75,13 @@ class DocumentChecklist(models.Model):
     def __str__(self):
         return f"Checklist for {self.user.username} - {self.scheme.name}"
 
-    def calculate_completion(self):
+    def calculate_completion(self, save=True):
         """Calculate document completion percentage"""
-        if not self.documents:
-            return 0
-        total = len(self.documents)
-        completed = sum(1 for v in self.documents.values() if v)
-        self.completion_percentage = (completed / total) * 100 if total > 0 else 0
-        self.save()
+        total = len(self.documents or {})
+        completed = sum(1 for v in (self.documents or {}).values() if v)
+        self.completion_percentage = int(completed * 100 / total) if total > 0 else 0
+        if save:
+            self.save(update_fields=['completion_percentage', 'updated_at'])
         return self.completion_percentage
 
 
@@ -90,8 +112,10 @@ class SchemeReminder(models.Model):
     """Model to manage scheme deadline reminders"""
     REMINDER_STATUS_CHOICES = [
         ('active', 'Active'),
+        ('sending', 'Sending'),
         ('sent', 'Sent'),
         ('completed', 'Completed'),
+        ('failed', 'Failed'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scheme_reminders')
@@ -104,10 +128,20 @@ class SchemeReminder(models.Model):
         default='deadline'
     )
     sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True, help_text="When a dispatcher took the reminder for sending")
+    email_sent_at = models.DateTimeField(null=True, blank=True)
+    sms_sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="Dispatches that failed to deliver the reminder")
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="When a failed delivery is retried")
+    auto_generated = models.BooleanField(default=False, help_text="Created from the scheme deadline, not by the user")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['reminder_date']
+        indexes = [
+            models.Index(fields=['status', 'reminder_date'], name='schemes_reminder_due_idx'),
+            models.Index(fields=['scheme', 'user'], name='schemes_reminder_scheme_idx'),
+        ]
         verbose_name = 'Scheme Reminder'
         verbose_name_plural = 'Scheme Reminders'
 
@@ -128,3 +162,143 @@ class UserSavedScheme(models.Model):
 
     def __str__(self):
         return f"{self.user.username} saved {self.scheme.name}"
+
+
+class DocumentBlob(models.Model):
+    """Content-addressed file stored once and shared by every identical upload"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='vault/', max_length=255)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Document Blob'
+        verbose_name_plural = 'Document Blobs'
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class UserDocument(models.Model):
+    """A document in the user's vault, one per canonical document type"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vault_documents')
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, related_name='user_documents')
+    document_type = models.CharField(max_length=100)  # canonical checklist key, e.g. aadhar_card
+    original_name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'document_type')
+        verbose_name = 'User Document'
+        verbose_name_plural = 'User Documents'
+
+    def __str__(self):
+        return f"{self.user.username} - {self.document_type}"
+
+
+class UploadSession(models.Model):
+    """Resumable chunked upload staged on local disk until it is completed"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    document_type = models.CharField(max_length=100)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    total_size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    document = models.ForeignKey(UserDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='schemes_upload_stale_idx'),
+        ]
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.total_size})"
+
+
+class SchemeStats(models.Model):
+    """Materialized popularity counters for a scheme, maintained by schemes.counters"""
+    scheme = models.OneToOneField(Scheme, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    views = models.BigIntegerField(default=0)
+    applies = models.BigIntegerField(default=0)
+    saves = models.BigIntegerField(default=0)
+    shares = models.BigIntegerField(default=0)
+    score = models.BigIntegerField(default=0, help_text="Weighted sum used for ?ordering=popular")
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='schemes_stats_score_idx'),
+        ]
+        verbose_name = 'Scheme Stats'
+        verbose_name_plural = 'Scheme Stats'
+
+    def __str__(self):
+        return f"Stats for {self.scheme_id}: {self.views} views, {self.applies} applies"
+
+
+class TrendingScore(models.Model):
+    """Checkpointed time-decayed trending score of a scheme, overall (state '') or in one state"""
+    scheme = models.ForeignKey(Scheme, on_delete=models.CASCADE, related_name='trending_scores')
+    state = models.CharField(max_length=50, blank=True, default='')
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField()  # score is as of this time and decays from here
+
+    class Meta:
+        unique_together = ('scheme', 'state')
+        verbose_name = 'Trending Score'
+        verbose_name_plural = 'Trending Scores'
+
+    def __str__(self):
+        return f"{self.scheme_id} {self.state or 'all states'}: {self.score:.2f}"
+
+
+class SchemeRecommendation(models.Model):
+    """Precomputed co-occurrence neighbours of a scheme, built by schemes.recommendations"""
+    scheme = models.OneToOneField(Scheme, on_delete=models.CASCADE, primary_key=True, related_name='recommendations')
+    neighbours = models.JSONField(default=list)  # [{scheme, score, count}] best first
+    user_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Scheme Recommendation'
+        verbose_name_plural = 'Scheme Recommendations'
+
+    def __str__(self):
+        return f"Recommendations for {self.scheme_id} ({len(self.neighbours)})"
+
+
+class SchemeTranslation(models.Model):
+    """Offline machine translation of a scheme's text, made by schemes.translations"""
+    scheme = models.ForeignKey(Scheme, on_delete=models.CASCADE, related_name='translations')
+    language = models.CharField(max_length=10)
+    fields = models.JSONField(default=dict)  # {field_name: translated text}
+    source_updated_at = models.DateTimeField(help_text="Scheme.updated_at of the text that was translated")
+    backend = models.CharField(max_length=200, blank=True)
+    translated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('scheme', 'language')
+        verbose_name = 'Scheme Translation'
+        verbose_name_plural = 'Scheme Translations'
+
+    def __str__(self):
+        return f"{self.scheme_id} ({self.language})"
+
+    @property
+    def is_current(self):
+        return self.source_updated_at == self.scheme.updated_at
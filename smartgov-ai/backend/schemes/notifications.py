@@ -0,0 +1,130 @@
+"""
+Real-time notifications over WebSockets
+
+Each connected socket (schemes.consumers.NotificationConsumer) joins a
+per-user group on the channel layer: Redis in production, in memory for
+tests and single-process development (CHANNEL_LAYERS). Code that changes
+something a client would otherwise poll for calls notify()/notify_many()
+and the event is sent to the user's group once the transaction commits.
+
+Events:
+    reminder.due        reminders that were just delivered as a digest
+    checklist.updated   a document checklist changed
+    scheme.eligible     a new scheme the user is eligible for
+
+Sockets count themselves in the shared cache while connected, so events for
+users with no open socket (most of them) never reach the channel layer.
+Pushing is best effort: the REST endpoints stay the source of truth.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+try:
+    from channels.layers import get_channel_layer
+except ImportError:
+    get_channel_layer = None
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_PREFIX = 'notifications:online:'
+
+REMINDER_DUE = 'reminder.due'
+CHECKLIST_UPDATED = 'checklist.updated'
+SCHEME_ELIGIBLE = 'scheme.eligible'
+
+
+def group_name(user_id):
+    return f'user-{user_id}'
+
+
+def connected(user_id):
+    """Count a new socket of the user"""
+    key = PRESENCE_PREFIX + str(user_id)
+    cache.add(key, 0, settings.NOTIFICATIONS_PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, settings.NOTIFICATIONS_PRESENCE_TTL)
+
+
+def disconnected(user_id):
+    key = PRESENCE_PREFIX + str(user_id)
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+
+def still_connected(user_id):
+    """Keep the presence entry of a long-lived socket from expiring"""
+    cache.touch(PRESENCE_PREFIX + str(user_id), settings.NOTIFICATIONS_PRESENCE_TTL)
+
+
+def online_users(user_ids):
+    """The users among user_ids with at least one open socket"""
+    keys = {PRESENCE_PREFIX + str(user_id): user_id for user_id in user_ids}
+    return {keys[key] for key, count in cache.get_many(list(keys)).items() if count and count > 0}
+
+
+async def send_messages(layer, messages):
+    for user_id, event, data in messages:
+        await layer.group_send(group_name(user_id), {'type': 'notify', 'event': event, 'data': data})
+
+
+def _send(messages):
+    layer = get_channel_layer() if get_channel_layer else None
+    if layer is None:
+        return
+    try:
+        online = online_users({user_id for user_id, _, _ in messages})
+        messages = [message for message in messages if message[0] in online]
+        if messages:
+            async_to_sync(send_messages)(layer, messages)
+    except Exception:
+        logger.exception('Could not push %s notifications', len(messages))
+
+
+def notify_many(messages):
+    """Push [(user_id, event, data)] after the current transaction commits"""
+    messages = list(messages)
+    if messages:
+        transaction.on_commit(lambda: _send(messages))
+
+
+def notify(user_id, event, data):
+    notify_many([(user_id, event, data)])
+
+
+def checklist_data(checklist):
+    return {
+        'id': checklist.pk,
+        'scheme_id': checklist.scheme_id,
+        'completion_percentage': checklist.completion_percentage,
+        'version': checklist.version,
+        'updated_at': checklist.updated_at.isoformat() if checklist.updated_at else None,
+    }
+
+
+def reminder_data(reminder):
+    return {
+        'id': reminder.pk,
+        'scheme_id': reminder.scheme_id,
+        'scheme_name': reminder.scheme.name,
+        'reminder_type': reminder.reminder_type,
+        'reminder_date': reminder.reminder_date.isoformat(),
+    }
+
+
+def scheme_data(scheme):
+    return {
+        'scheme_id': scheme.pk,
+        'name': scheme.name,
+        'deadline': scheme.deadline.isoformat() if scheme.deadline else None,
+        'apply_link': scheme.apply_link,
+    }
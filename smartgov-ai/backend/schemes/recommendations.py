@@ -0,0 +1,234 @@
+"""
+"People also applied for" recommendations
+
+Users' scheme history forms a binary user x scheme matrix X. The scheme x
+scheme co-occurrence matrix C = X.T @ X counts the users who interacted with
+both schemes, and its diagonal counts the users of each scheme. Neighbours
+are ranked by cosine similarity C[i, j] / sqrt(C[i, i] * C[j, j]), and
+the top RECOMMENDATION_NEIGHBOURS per scheme are stored in
+SchemeRecommendation so requests only read one row.
+
+C is saved to default storage along with the last SchemeHistory id it has
+seen. update() folds in newer events: only the users behind them are
+reloaded, and their contribution to C is swapped for the new one.
+
+update() is approximate, so a periodic full build() is required (the
+build_recommendations command does one every --rebuild-interval seconds):
+- an event whose lower id commits after a higher one was folded in is
+  below the watermark and is never picked up;
+- history removed by cascade deletes is never subtracted from C;
+- rows whose counts did not change keep their old neighbour scores.
+"""
+import io
+from dataclasses import dataclass
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+from .eligibility import filter_by_rules, has_complete_profile, schemes_for_user_q
+from .models import Scheme, SchemeHistory, SchemeRecommendation
+
+MATRIX_NAME = 'recommendations/cooccurrence.npz'
+FETCH_CHUNK_SIZE = 50000
+USER_CHUNK_SIZE = 500
+
+
+def _require_scipy():
+    if sparse is None:
+        raise ImproperlyConfigured('Building recommendations requires scipy (pip install scipy)')
+
+
+def interaction_matrix(user_ids, scheme_ids, num_schemes):
+    """Binary CSR matrix with a 1 wherever a user interacted with a scheme"""
+    _require_scipy()
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    scheme_ids = np.asarray(scheme_ids, dtype=np.int64)
+    num_users = int(user_ids.max()) + 1 if len(user_ids) else 0
+    matrix = sparse.csr_matrix(
+        (np.ones(len(user_ids), dtype=np.int32), (user_ids, scheme_ids)),
+        shape=(num_users, num_schemes)
+    )
+    # Repeated events collapse to a single interaction
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def cooccurrence(matrix):
+    return (matrix.T @ matrix).tocsr()
+
+
+def top_neighbours(matrix, rows=None, limit=None, min_support=None):
+    """{scheme_id: [(neighbour_id, score, count)]} for the given rows of C"""
+    limit = limit or settings.RECOMMENDATION_NEIGHBOURS
+    min_support = min_support or settings.RECOMMENDATION_MIN_SUPPORT
+    users = matrix.diagonal().astype(np.float64)
+    rows = range(matrix.shape[0]) if rows is None else rows
+    neighbours = {}
+    for row in rows:
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        columns = matrix.indices[start:end]
+        counts = matrix.data[start:end]
+        keep = (columns != row) & (counts >= min_support)
+        columns, counts = columns[keep], counts[keep]
+        if not len(columns) or not users[row]:
+            neighbours[int(row)] = []
+            continue
+        scores = counts / np.sqrt(users[row] * users[columns])
+        order = np.argsort(-scores, kind='stable')[:limit]
+        neighbours[int(row)] = [
+            (int(columns[i]), round(float(scores[i]), 4), int(counts[i])) for i in order
+        ]
+    return neighbours
+
+
+def _history_arrays(queryset):
+    """Stream (user_id, scheme_id, id) rows into NumPy arrays a chunk at a time"""
+    rows = queryset.values_list('user_id', 'scheme_id', 'id').order_by().iterator(chunk_size=FETCH_CHUNK_SIZE)
+    blocks = []
+    while True:
+        chunk = list(islice(rows, FETCH_CHUNK_SIZE))
+        if not chunk:
+            break
+        blocks.append(np.array(chunk, dtype=np.int64))
+    block = np.vstack(blocks) if blocks else np.zeros((0, 3), dtype=np.int64)
+    return block[:, 0], block[:, 1], block[:, 2]
+
+
+def save_matrix(matrix, watermark):
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+        shape=np.array(matrix.shape), watermark=np.array([watermark])
+    )
+    if default_storage.exists(MATRIX_NAME):
+        default_storage.delete(MATRIX_NAME)
+    default_storage.save(MATRIX_NAME, ContentFile(buffer.getvalue()))
+
+
+def load_matrix():
+    """(C, watermark) from storage, or (None, 0) if nothing has been built yet"""
+    _require_scipy()
+    if not default_storage.exists(MATRIX_NAME):
+        return None, 0
+    with default_storage.open(MATRIX_NAME, 'rb') as stored:
+        arrays = np.load(io.BytesIO(stored.read()))
+    matrix = sparse.csr_matrix(
+        (arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape'])
+    )
+    return matrix, int(arrays['watermark'][0])
+
+
+def store_neighbours(neighbours, matrix):
+    """Upsert SchemeRecommendation rows for schemes that still exist"""
+    existing = set(Scheme.objects.filter(pk__in=list(neighbours)).values_list('pk', flat=True))
+    users = matrix.diagonal()
+    rows = [
+        SchemeRecommendation(
+            scheme_id=scheme_id,
+            neighbours=[{'scheme': n, 'score': score, 'count': count} for n, score, count in items],
+            user_count=int(users[scheme_id])
+        )
+        for scheme_id, items in neighbours.items() if scheme_id in existing
+    ]
+    SchemeRecommendation.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['scheme'],
+        update_fields=['neighbours', 'user_count', 'updated_at']
+    )
+    return len(rows)
+
+
+@dataclass
+class BuildResult:
+    events: int
+    schemes: int
+    watermark: int
+
+
+def _num_schemes(*scheme_arrays):
+    highest = Scheme.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for array in scheme_arrays:
+        if len(array):
+            highest = max(highest, int(array.max()))
+    return highest + 1
+
+
+def build():
+    """Rebuild C and every scheme's neighbours from the whole history"""
+    _require_scipy()
+    users, schemes, ids = _history_arrays(SchemeHistory.objects.all())
+    watermark = int(ids.max()) if len(ids) else 0
+    matrix = cooccurrence(interaction_matrix(users, schemes, _num_schemes(schemes)))
+    with transaction.atomic():
+        stored = store_neighbours(top_neighbours(matrix), matrix)
+    save_matrix(matrix, watermark)
+    return BuildResult(events=len(ids), schemes=stored, watermark=watermark)
+
+
+def update():
+    """Fold history events newer than the stored watermark into C"""
+    matrix, watermark = load_matrix()
+    if matrix is None:
+        return build()
+
+    new_events = SchemeHistory.objects.filter(pk__gt=watermark)
+    new_watermark = new_events.order_by('-pk').values_list('pk', flat=True).first()
+    if new_watermark is None:
+        return BuildResult(events=0, schemes=0, watermark=watermark)
+    event_count = new_events.filter(pk__lte=new_watermark).count()
+    affected = list(SchemeHistory.objects.filter(
+        pk__gt=watermark, pk__lte=new_watermark
+    ).values_list('user_id', flat=True).distinct())
+
+    parts = [
+        _history_arrays(SchemeHistory.objects.filter(
+            user_id__in=affected[start:start + USER_CHUNK_SIZE], pk__lte=new_watermark
+        ))
+        for start in range(0, len(affected), USER_CHUNK_SIZE)
+    ]
+    users, schemes, ids = (np.concatenate(arrays) for arrays in zip(*parts))
+    old = ids <= watermark
+
+    size = max(matrix.shape[0], _num_schemes(schemes))
+    if size > matrix.shape[0]:
+        matrix.resize((size, size))
+    delta = (
+        cooccurrence(interaction_matrix(users, schemes, size))
+        - cooccurrence(interaction_matrix(users[old], schemes[old], size))
+    )
+    delta.eliminate_zeros()
+    matrix = (matrix + delta).tocsr()
+    # Rows whose counts changed; other rows keep slightly stale scores until the next build()
+    rows = np.unique(delta.nonzero()[0])
+    with transaction.atomic():
+        stored = store_neighbours(top_neighbours(matrix, rows=rows), matrix)
+    save_matrix(matrix, new_watermark)
+    return BuildResult(events=event_count, schemes=stored, watermark=new_watermark)
+
+
+def similar_schemes(scheme_id, user=None, limit=10):
+    """Neighbours of a scheme, best first, restricted to schemes the user is eligible for"""
+    neighbours = (
+        SchemeRecommendation.objects.filter(scheme_id=scheme_id).values_list('neighbours', flat=True).first()
+        or []
+    )
+    scores = {item['scheme']: item for item in neighbours}
+    schemes = Scheme.objects.filter(pk__in=list(scores)).select_related('stats')
+    if user is not None and user.is_authenticated and has_complete_profile(user):
+        schemes = filter_by_rules(schemes.filter(schemes_for_user_q(user)), user)
+    ranked = sorted(schemes, key=lambda scheme: -scores[scheme.pk]['score'])
+    return [(scheme, scores[scheme.pk]) for scheme in ranked[:limit]]
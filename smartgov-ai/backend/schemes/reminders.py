@@ -0,0 +1,256 @@
+"""
+Reminder dispatch
+
+Due reminders are pulled with the (status, reminder_date) index, one chunk of
+users at a time, so every user gets all of their due reminders in a single
+digest. Emails go over one reused SMTP connection, SMS through the configured
+gateway, and delivered reminders are marked sent with one UPDATE per chunk.
+
+Before sending, a chunk's reminders are claimed with a conditional UPDATE
+(active -> sending), so the cron dispatcher and the near-term scheduler
+never send the same reminder twice. Email and SMS delivery are recorded per
+reminder: when one channel fails the reminder goes back to active and the
+next run only retries that channel. Retries back off from
+REMINDER_RETRY_DELAY and a reminder still undelivered after
+REMINDER_MAX_ATTEMPTS dispatches is marked failed. Claims of a dispatcher
+that died are taken over after REMINDER_CLAIM_TIMEOUT.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import notifications
+from .models import SchemeReminder
+from .sms import get_sms_gateway
+
+logger = logging.getLogger(__name__)
+
+class DispatchStats:
+    def __init__(self):
+        self.reminders = 0
+        self.digests = 0
+        self.emails = 0
+        self.sms = 0
+        self.failed = 0
+        self.abandoned = 0
+        self.elapsed = 0.0
+
+    @property
+    def per_second(self):
+        return self.reminders / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f'{self.reminders} reminders in {self.digests} digests '
+            f'({self.emails} emails, {self.sms} SMS, {self.failed} failed, {self.abandoned} given up) '
+            f'in {self.elapsed:.2f}s: {self.per_second:.1f} reminders/s'
+        )
+
+
+def due_reminders(now=None):
+    """Due reminders nobody is sending, including claims that timed out and retries whose delay passed"""
+    now = now or timezone.now()
+    claimable = (
+        Q(status='active', next_attempt_at__isnull=True)
+        | Q(status='active', next_attempt_at__lte=timezone.now())
+        | Q(status='sending', claimed_at__lt=timezone.now() - settings.REMINDER_CLAIM_TIMEOUT)
+    )
+    return SchemeReminder.objects.filter(claimable, reminder_date__lte=now)
+
+
+def _claim(user_ids, now):
+    """Mark the due reminders of user_ids as being sent by this dispatcher and return their claim time"""
+    claimed_at = timezone.now()
+    due_reminders(now).filter(user_id__in=user_ids).update(status='sending', claimed_at=claimed_at)
+    return claimed_at
+
+
+def _channels(user):
+    """Return (send_email, send_sms) according to the user's preferences"""
+    try:
+        preferences = user.preferences
+    except ObjectDoesNotExist:
+        preferences = None
+    if preferences is not None and not preferences.enable_notifications:
+        return False, False
+    preferred = preferences.preferred_communication if preferences else 'email'
+    email_enabled = preferences.enable_email_reminders if preferences else True
+    send_email = preferred in ('email', 'both') and email_enabled and bool(user.email)
+    send_sms = preferred in ('sms', 'both') and bool(user.phone_number)
+    return send_email, send_sms
+
+
+def _push_enabled(user):
+    try:
+        return user.preferences.enable_notifications
+    except ObjectDoesNotExist:
+        return True
+
+
+def _digest_lines(reminders):
+    lines = []
+    for reminder in reminders:
+        scheme = reminder.scheme
+        deadline = f' - deadline {scheme.deadline:%d %b %Y}' if scheme.deadline else ''
+        lines.append(f'* {scheme.name}{deadline}\n  Apply: {scheme.apply_link}')
+    return lines
+
+
+def build_email(user, reminders):
+    count = len(reminders)
+    subject = f'SmartGov: {count} scheme reminder{"s" if count != 1 else ""}'
+    body = '\n'.join([
+        f'Hello {user.first_name or user.username},',
+        '',
+        'These government schemes need your attention:',
+        '',
+        *_digest_lines(reminders),
+        '',
+        'SmartGov AI',
+    ])
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [user.email])
+
+
+def build_sms(user, reminders):
+    names = ', '.join(reminder.scheme.name for reminder in reminders)
+    return user.phone_number, f'SmartGov reminder: {names}. Check the app for deadlines and documents.'
+
+
+def dispatch_due_reminders(chunk_size=None, now=None, connection=None, sms_gateway=None):
+    """Send every due reminder as per-user digests and mark them sent"""
+    chunk_size = chunk_size or settings.REMINDER_DISPATCH_CHUNK_SIZE
+    now = now or timezone.now()
+    stats = DispatchStats()
+    start = time.perf_counter()
+
+    connection = connection or get_connection()
+    sms_gateway = sms_gateway or get_sms_gateway()
+    connection.open()
+    try:
+        last_user_id = 0
+        while True:
+            user_ids = list(
+                due_reminders(now).filter(user_id__gt=last_user_id)
+                .order_by('user_id').values_list('user_id', flat=True).distinct()[:chunk_size]
+            )
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+            _dispatch_chunk(user_ids, now, connection, sms_gateway, stats)
+    finally:
+        connection.close()
+        sms_gateway.close()
+
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def dispatch_user_reminders(user_ids, now=None):
+    """Send the due reminders of specific users (used by the scheduler)"""
+    now = now or timezone.now()
+    stats = DispatchStats()
+    start = time.perf_counter()
+    connection = get_connection()
+    sms_gateway = get_sms_gateway()
+    connection.open()
+    try:
+        _dispatch_chunk(list(user_ids), now, connection, sms_gateway, stats)
+    finally:
+        connection.close()
+        sms_gateway.close()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def _dispatch_chunk(user_ids, now, connection, sms_gateway, stats):
+    claimed_at = _claim(user_ids, now)
+    claimed = SchemeReminder.objects.filter(user_id__in=user_ids, status='sending', claimed_at=claimed_at)
+    reminders = claimed.select_related('user', 'user__preferences', 'scheme').order_by('user_id', 'reminder_date')
+    digests = {}
+    for reminder in reminders:
+        digests.setdefault(reminder.user_id, []).append(reminder)
+
+    emailed = []
+    texted = set()
+    sms_batch = []
+    sms_reminders = []
+    wanted = {}
+    for user_id, user_reminders in digests.items():
+        user = user_reminders[0].user
+        wanted[user_id] = send_email, send_sms = _channels(user)
+        stats.digests += 1
+        # A retry only repeats the channels that failed last time
+        unemailed = [reminder for reminder in user_reminders if reminder.email_sent_at is None]
+        if send_email and unemailed:
+            try:
+                connection.send_messages([build_email(user, unemailed)])
+                stats.emails += 1
+                emailed.extend(reminder.pk for reminder in unemailed)
+            except Exception:
+                logger.exception('Reminder email to user %s failed', user_id)
+        untexted = [reminder for reminder in user_reminders if reminder.sms_sent_at is None]
+        if send_sms and untexted:
+            sms_batch.append(build_sms(user, untexted))
+            sms_reminders.append([reminder.pk for reminder in untexted])
+
+    # Record emails before the SMS batch so an SMS failure can't send them again
+    if emailed:
+        SchemeReminder.objects.filter(pk__in=emailed).update(email_sent_at=timezone.now())
+    if sms_batch:
+        try:
+            sms_gateway.send_messages(sms_batch)
+            stats.sms += len(sms_batch)
+            for ids in sms_reminders:
+                texted.update(ids)
+            SchemeReminder.objects.filter(pk__in=texted).update(sms_sent_at=timezone.now())
+        except Exception:
+            logger.exception('Reminder SMS batch of %d messages failed', len(sms_batch))
+
+    # Users who opted out of every channel are marked sent so they are not retried
+    emailed = set(emailed)
+    delivered, retry, abandoned = [], {}, []
+    for user_id, user_reminders in digests.items():
+        send_email, send_sms = wanted[user_id]
+        for reminder in user_reminders:
+            done = (
+                (not send_email or reminder.email_sent_at is not None or reminder.pk in emailed)
+                and (not send_sms or reminder.sms_sent_at is not None or reminder.pk in texted)
+            )
+            if done:
+                delivered.append(reminder.pk)
+            elif reminder.attempts + 1 >= settings.REMINDER_MAX_ATTEMPTS:
+                abandoned.append(reminder.pk)
+            else:
+                retry.setdefault(reminder.attempts, []).append(reminder.pk)
+
+    if delivered:
+        claimed.filter(pk__in=delivered).update(status='sent', sent_at=timezone.now())
+    for attempts, ids in retry.items():
+        # Back off exponentially so a gateway outage isn't hammered every run
+        claimed.filter(pk__in=ids).update(
+            status='active', claimed_at=None, attempts=F('attempts') + 1,
+            next_attempt_at=timezone.now() + settings.REMINDER_RETRY_DELAY * 2 ** attempts
+        )
+    if abandoned:
+        claimed.filter(pk__in=abandoned).update(
+            status='failed', claimed_at=None, next_attempt_at=None, attempts=F('attempts') + 1
+        )
+        logger.error('Gave up on reminders %s after %d attempts', abandoned, settings.REMINDER_MAX_ATTEMPTS)
+    stats.reminders += len(delivered)
+    stats.failed += sum(len(ids) for ids in retry.values()) + len(abandoned)
+    stats.abandoned += len(abandoned)
+
+    # Open apps hear about the digest straight away
+    delivered = set(delivered)
+    notifications.notify_many([
+        (user_id, notifications.REMINDER_DUE, {
+            'reminders': [notifications.reminder_data(reminder) for reminder in user_reminders]
+        })
+        for user_id, user_reminders in digests.items()
+        if user_reminders[0].pk in delivered and _push_enabled(user_reminders[0].user)
+    ])
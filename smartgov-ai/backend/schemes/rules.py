@@ -0,0 +1,394 @@
+"""
+Structured eligibility rules
+
+Scheme.eligibility_rules holds a small boolean expression over the user's
+profile, for criteria the age/state/occupation columns can't express:
+
+    income <= 250000 and gender == female and category in (sc, st, obc)
+    occupation == farmer and (land_holding < 2 or not category == general)
+
+Fields are age, income, land_holding (numbers) and gender, category, state,
+occupation (text, compared case-insensitively). Numbers allow <, <=, >, >=,
+==, != and in (...); text allows ==, != and in (...). Values are numbers,
+quoted strings or bare words. A comparison against a field the user has not
+filled in is false, and `not` simply negates its operand.
+
+compile_rules() parses an expression once (results are cached by text) into
+a CompiledRule that can test a single profile, evaluate a whole column
+snapshot of users at once with NumPy, or filter a user queryset in SQL.
+"""
+import operator
+import re
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache, reduce
+
+import numpy as np
+from django.db.models import Q
+
+Field = namedtuple('Field', ['kind', 'attribute'])
+
+NUMBER = 'number'
+TEXT = 'text'
+
+FIELDS = {
+    'age': Field(NUMBER, 'age'),
+    'income': Field(NUMBER, 'annual_income'),
+    'annual_income': Field(NUMBER, 'annual_income'),
+    'land_holding': Field(NUMBER, 'land_holding'),
+    'land': Field(NUMBER, 'land_holding'),
+    'gender': Field(TEXT, 'gender'),
+    'category': Field(TEXT, 'social_category'),
+    'social_category': Field(TEXT, 'social_category'),
+    'state': Field(TEXT, 'state'),
+    'occupation': Field(TEXT, 'occupation'),
+}
+NUMBER_ATTRIBUTES = ('age', 'annual_income', 'land_holding')
+TEXT_ATTRIBUTES = ('state', 'occupation', 'gender', 'social_category')
+
+COMPARISONS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+LOOKUPS = {'<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte'}
+KEYWORDS = {'and', 'or', 'not', 'in'}
+
+TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<number>\d[\d_]*(?:\.\d+)?)
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<op><=|>=|==|!=|<|>|=)
+  | (?P<punct>[(),])
+  | (?P<name>[A-Za-z_][A-Za-z0-9_-]*)
+''', re.VERBOSE)
+
+
+class RuleSyntaxError(ValueError):
+    """The rule text could not be parsed; position is a character offset"""
+
+    def __init__(self, message, position=None):
+        if position is not None:
+            message = f'{message} (at character {position + 1})'
+        super().__init__(message)
+        self.position = position
+
+
+Token = namedtuple('Token', ['kind', 'value', 'position'])
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            raise RuleSyntaxError(f'Unexpected character {text[position]!r}', position)
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'number':
+            value = Decimal(value.replace('_', ''))
+        elif kind == 'string':
+            value = value[1:-1]
+        elif kind == 'op' and value == '=':
+            value = '=='
+        elif kind == 'name' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        if kind != 'space':
+            tokens.append(Token(kind, value, position))
+        position = match.end()
+    tokens.append(Token('end', None, len(text)))
+    return tokens
+
+
+class Parser:
+    """
+    Recursive descent over:
+        expression := conjunction ('or' conjunction)*
+        conjunction := negation ('and' negation)*
+        negation := 'not' negation | '(' expression ')' | test
+        test := field operator value | field ['not'] 'in' '(' value (',' value)* ')'
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.index = 0
+
+    @property
+    def current(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        token = self.current
+        self.index += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.current
+        if token.kind == kind and (value is None or token.value == value):
+            return self.advance()
+        return None
+
+    def expect(self, kind, value=None, description=None):
+        token = self.accept(kind, value)
+        if token is None:
+            found = self.current.value if self.current.kind != 'end' else 'end of rule'
+            raise RuleSyntaxError(f'Expected {description or value or kind}, found {found!r}', self.current.position)
+        return token
+
+    def parse(self):
+        node = self.expression()
+        self.expect('end', description='end of rule')
+        return node
+
+    def expression(self):
+        nodes = [self.conjunction()]
+        while self.accept('keyword', 'or'):
+            nodes.append(self.conjunction())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def conjunction(self):
+        nodes = [self.negation()]
+        while self.accept('keyword', 'and'):
+            nodes.append(self.negation())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def negation(self):
+        if self.accept('keyword', 'not'):
+            return ('not', self.negation())
+        if self.accept('punct', '('):
+            node = self.expression()
+            self.expect('punct', ')')
+            return node
+        return self.test()
+
+    def test(self):
+        token = self.expect('name', description='a field name')
+        field = FIELDS.get(token.value.lower())
+        if field is None:
+            raise RuleSyntaxError(
+                f'Unknown field {token.value!r}; expected one of {", ".join(sorted(FIELDS))}', token.position
+            )
+        negated = bool(self.accept('keyword', 'not'))
+        if negated or self.current.kind == 'keyword' and self.current.value == 'in':
+            self.expect('keyword', 'in')
+            self.expect('punct', '(')
+            values = [self.value(field)]
+            while self.accept('punct', ','):
+                values.append(self.value(field))
+            self.expect('punct', ')')
+            return ('in', field, tuple(values), negated)
+
+        op = self.expect('op', description='a comparison operator')
+        if field.kind == TEXT and op.value not in ('==', '!='):
+            raise RuleSyntaxError(f'{token.value} is text and only supports ==, != and in', op.position)
+        return ('compare', field, op.value, self.value(field))
+
+    def value(self, field):
+        token = self.current
+        if field.kind == NUMBER:
+            self.expect('number', description='a number')
+            return float(token.value)
+        if token.kind not in ('string', 'name', 'number'):
+            raise RuleSyntaxError(f'Expected a value, found {token.value!r}', token.position)
+        self.advance()
+        value = str(token.value).strip().lower()
+        if not value:
+            raise RuleSyntaxError('Empty value', token.position)
+        return value
+
+
+# Single profile: values maps attribute -> float / lowercased str / None
+
+def _predicate(node):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        predicates = [_predicate(child) for child in node[1]]
+        combine = all if kind == 'and' else any
+        return lambda values: combine(predicate(values) for predicate in predicates)
+    if kind == 'not':
+        predicate = _predicate(node[1])
+        return lambda values: not predicate(values)
+    if kind == 'compare':
+        _, field, op, expected = node
+        compare, attribute = COMPARISONS[op], field.attribute
+
+        def test(values):
+            value = values.get(attribute)
+            return value is not None and compare(value, expected)
+        return test
+    _, field, options, negated = node
+    options, attribute = frozenset(options), field.attribute
+
+    def test(values):
+        value = values.get(attribute)
+        return value is not None and (value in options) != negated
+    return test
+
+
+# Column snapshot: columns.numbers[attribute] is a float array with NaN for
+# missing values; columns.codes[attribute] indexes columns.vocabularies[attribute],
+# whose code 0 means missing
+
+def _vectorized(node):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        evaluators = [_vectorized(child) for child in node[1]]
+        combine = np.logical_and if kind == 'and' else np.logical_or
+        return lambda columns: reduce(combine, (evaluate(columns) for evaluate in evaluators))
+    if kind == 'not':
+        evaluate = _vectorized(node[1])
+        return lambda columns: ~evaluate(columns)
+
+    field, attribute = node[1], node[1].attribute
+    if field.kind == NUMBER:
+        if kind == 'compare':
+            _, _, op, expected = node
+            compare = COMPARISONS[op]
+
+            def evaluate(columns):
+                values = columns.numbers[attribute]
+                # NaN compares false except for !=
+                result = compare(values, expected)
+                return result & ~np.isnan(values) if op == '!=' else result
+            return evaluate
+        _, _, options, negated = node
+
+        def evaluate(columns):
+            values = columns.numbers[attribute]
+            found = np.isin(values, options)
+            return (~found & ~np.isnan(values)) if negated else found
+        return evaluate
+
+    if kind == 'compare':
+        _, _, op, expected = node
+        options, negated = (expected,), op == '!='
+    else:
+        _, _, options, negated = node
+
+    def evaluate(columns):
+        vocabulary = columns.vocabularies[attribute]
+        # One lookup per distinct value, then broadcast by code
+        table = np.zeros(len(vocabulary.values), dtype=bool)
+        for option in options:
+            code = vocabulary.lookup(option)
+            if code:
+                table[code] = True
+        if negated:
+            table = ~table
+            table[0] = False
+        return table[columns.codes[attribute]]
+    return evaluate
+
+
+# User queryset
+
+def _q(node):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        combine = operator.and_ if kind == 'and' else operator.or_
+        return reduce(combine, (_q(child) for child in node[1]))
+    if kind == 'not':
+        return ~_q(node[1])
+
+    field, attribute = node[1], node[1].attribute
+    if kind == 'compare':
+        _, _, op, expected = node
+        options, negated = (expected,), op == '!='
+        if field.kind == NUMBER and op in LOOKUPS:
+            return Q(**{f'{attribute}__{LOOKUPS[op]}': expected})
+    else:
+        _, _, options, negated = node
+
+    lookup = 'iexact' if field.kind == TEXT else 'exact'
+    found = reduce(operator.or_, (Q(**{f'{attribute}__{lookup}': option}) for option in options))
+    if not negated:
+        return found
+    present = Q(**{f'{attribute}__isnull': False})
+    if field.kind == TEXT:
+        present &= ~Q(**{attribute: ''})
+    return present & ~found
+
+
+def _source(node, top=True):
+    """Canonical text of a parsed rule"""
+    kind = node[0]
+    if kind in ('and', 'or'):
+        text = f' {kind} '.join(_source(child, top=False) for child in node[1])
+        return text if top else f'({text})'
+    if kind == 'not':
+        return f'not {_source(node[1], top=False)}'
+    name = next(name for name, field in FIELDS.items() if field == node[1])
+    if kind == 'compare':
+        return f'{name} {node[2]} {_format(node[3])}'
+    options = ', '.join(_format(option) for option in node[2])
+    return f'{name} {"not in" if node[3] else "in"} ({options})'
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f'{value:g}' if value != int(value) else str(int(value))
+    return value if re.fullmatch(r'[a-z_][a-z0-9_-]*', value) and value not in KEYWORDS else f'"{value}"'
+
+
+def _attributes(node):
+    if node[0] in ('and', 'or'):
+        return set().union(*(_attributes(child) for child in node[1]))
+    if node[0] == 'not':
+        return _attributes(node[1])
+    return {node[1].attribute}
+
+
+class CompiledRule:
+    """A parsed rule with its single-profile, vectorized and SQL forms"""
+
+    def __init__(self, text, node):
+        self.text = text
+        self.node = node
+        self.attributes = frozenset(_attributes(node)) if node else frozenset()
+        self._predicate = _predicate(node) if node else None
+        self._vectorized = _vectorized(node) if node else None
+        # Top-level clauses, to tell users which criteria they miss
+        self.clauses = [
+            (_source(child), _predicate(child)) for child in (node[1] if node[0] == 'and' else [node])
+        ] if node else []
+
+    def __bool__(self):
+        return self.node is not None
+
+    def __str__(self):
+        return _source(self.node) if self.node else ''
+
+    def matches(self, values):
+        return self._predicate is None or self._predicate(values)
+
+    def evaluate(self, columns):
+        if self._vectorized is None:
+            return np.ones(len(columns), dtype=bool)
+        return self._vectorized(columns)
+
+    def to_q(self):
+        return _q(self.node) if self.node else Q()
+
+    def unmet(self, values):
+        """Source text of the top-level clauses the profile does not satisfy"""
+        return [text for text, predicate in self.clauses if not predicate(values)]
+
+
+@lru_cache(maxsize=2048)
+def compile_rules(text):
+    """Parse rule text once; raises RuleSyntaxError"""
+    text = (text or '').strip()
+    return CompiledRule(text, Parser(text).parse() if text else None)
+
+
+def profile_values(user):
+    """The rule fields of a user, normalized the way compiled rules compare them"""
+    values = {}
+    for attribute in NUMBER_ATTRIBUTES:
+        value = getattr(user, attribute, None)
+        values[attribute] = float(value) if value is not None else None
+    for attribute in TEXT_ATTRIBUTES:
+        value = (getattr(user, attribute, None) or '').strip().lower()
+        values[attribute] = value or None
+    return values
+
@@ -0,0 +1,197 @@
+"""
+In-process scheduler for near-term reminders
+
+Instead of polling the whole SchemeReminder table, the scheduler loads only
+unclaimed reminders due within the next REMINDER_SCHEDULER_WINDOW into a heap
+and sleeps until the earliest one is due, so reminders fire within a tick
+(sub-second) of their time. Saves and deletes of reminders reach it through
+signals: directly when the scheduler runs in the same process, otherwise by
+bumping a shared generation stamp that makes the leader reload its window.
+
+Only one process schedules at a time. Leadership is a lease in the shared
+cache (use Redis when running several workers); the leader renews it every
+tick and another process takes over if it lapses.
+"""
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import SchemeReminder
+from .reminders import dispatch_user_reminders
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = 'reminder_scheduler:leader'
+GENERATION_KEY = 'reminder_scheduler:generation'
+
+_scheduler = None
+
+
+class CacheLease:
+    """Leader lease held in the shared cache"""
+
+    def __init__(self, key, ttl):
+        self.key = key
+        self.ttl = ttl
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def acquire(self):
+        """Take or renew the lease; return True while this process is the leader"""
+        if cache.add(self.key, self.owner, self.ttl):
+            return True
+        if cache.get(self.key) != self.owner or not cache.touch(self.key, self.ttl):
+            return False
+        # The lease may have lapsed and been taken between the get and the touch,
+        # in which case the touch renewed the new leader's lease: step down
+        return cache.get(self.key) == self.owner
+
+    def release(self):
+        if cache.get(self.key) == self.owner:
+            cache.delete(self.key)
+
+
+def bump_generation():
+    """Tell the leader (possibly in another process) to reload its window"""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+class ReminderScheduler:
+    def __init__(self, callback=None, window=None, tick=None):
+        self.callback = callback or dispatch_user_reminders
+        self.window = window or settings.REMINDER_SCHEDULER_WINDOW
+        self.tick = tick or settings.REMINDER_SCHEDULER_TICK
+        self.lease = CacheLease(LEASE_KEY, ttl=max(int(self.tick * 10), 5))
+        self._heap = []
+        self._due = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._window_end = 0.0
+        self._generation = None
+        self._leading = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reminder-dispatch')
+
+    # Signal entry points
+
+    def schedule(self, reminder_id, when):
+        """Add or move a reminder; ignored if it falls outside the loaded window"""
+        timestamp = when.timestamp()
+        with self._condition:
+            if not self._leading or timestamp > self._window_end:
+                return False
+            self._due[reminder_id] = timestamp
+            heapq.heappush(self._heap, (timestamp, reminder_id))
+            self._condition.notify()
+        return True
+
+    def cancel(self, reminder_id):
+        with self._condition:
+            self._due.pop(reminder_id, None)
+
+    # Scheduling loop
+
+    def load_window(self):
+        now = timezone.now()
+        window_end = now + self.window
+        # Only reminders nobody has tried yet: claimed and failed ones are
+        # retried by the dispatcher on its own schedule
+        rows = SchemeReminder.objects.filter(
+            status='active', claimed_at__isnull=True, attempts=0, reminder_date__lte=window_end
+        ).values_list('id', 'reminder_date')
+        with self._condition:
+            self._due = {reminder_id: when.timestamp() for reminder_id, when in rows}
+            self._heap = [(timestamp, reminder_id) for reminder_id, timestamp in self._due.items()]
+            heapq.heapify(self._heap)
+            self._window_end = window_end.timestamp()
+            self._condition.notify()
+
+    def _pop_due(self, now):
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            timestamp, reminder_id = heapq.heappop(self._heap)
+            # Lazy deletion: skip entries that were cancelled or rescheduled
+            if self._due.get(reminder_id) == timestamp:
+                del self._due[reminder_id]
+                fired.append(reminder_id)
+        return fired
+
+    def _fire(self, reminder_ids):
+        close_old_connections()
+        try:
+            user_ids = set(
+                SchemeReminder.objects.filter(pk__in=reminder_ids, status='active').values_list('user_id', flat=True)
+            )
+            if user_ids:
+                self.callback(user_ids)
+        except Exception:
+            logger.exception('Reminder dispatch failed')
+        finally:
+            close_old_connections()
+
+    def run(self):
+        reload_every = self.window.total_seconds() / 2
+        next_reload = 0.0
+        try:
+            while not self._stopped.is_set():
+                if not self.lease.acquire():
+                    self._leading = False
+                    self._stopped.wait(self.tick)
+                    continue
+
+                generation = cache.get(GENERATION_KEY)
+                now = time.time()
+                if not self._leading or generation != self._generation or now >= next_reload:
+                    self._leading = True
+                    self._generation = generation
+                    close_old_connections()
+                    self.load_window()
+                    next_reload = now + reload_every
+
+                with self._condition:
+                    fired = self._pop_due(time.time())
+                    if not fired:
+                        timeout = self.tick
+                        if self._heap:
+                            timeout = min(timeout, max(self._heap[0][0] - time.time(), 0))
+                        self._condition.wait(timeout)
+                if fired:
+                    self._executor.submit(self._fire, fired)
+        finally:
+            self._leading = False
+            self.lease.release()
+            self._executor.shutdown(wait=True)
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
+
+
+def get_scheduler():
+    """The scheduler running in this process, if any"""
+    return _scheduler
+
+
+def start_scheduler(**kwargs):
+    """Start the scheduler in a background thread of this process"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReminderScheduler(**kwargs)
+        threading.Thread(target=_scheduler.run, name='reminder-scheduler', daemon=True).start()
+    return _scheduler
+
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
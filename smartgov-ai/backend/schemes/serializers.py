@@ -1,19 +1,67 @@
 from rest_framework import serializers
+from django.conf import settings
+
+from .documents import canonical_document_key, get_document_vocabulary
 from .models import (
     Scheme, DocumentChecklist, SchemeHistory,
-    SchemeReminder, UserSavedScheme
+    SchemeReminder, UserSavedScheme, UploadSession, UserDocument, SchemeStats
 )
+from .rules import RuleSyntaxError, compile_rules
+from .translations import TRANSLATED_FIELDS, attach_translations, translated_fields
+
+
+class SchemeStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SchemeStats
+        fields = ['views', 'applies', 'saves', 'shares', 'score']
+        read_only_fields = fields
+
+
+class SchemeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        schemes = list(data.all() if hasattr(data, 'all') else data)
+        language = self.context.get('language')
+        if language:
+            # One query for the whole page instead of one per scheme
+            attach_translations(schemes, language)
+        return super().to_representation(schemes)
 
 
 class SchemeSerializer(serializers.ModelSerializer):
+    """With context['language'], text fields come from the stored translation when it is current"""
+    stats = serializers.SerializerMethodField()
+
     class Meta:
         model = Scheme
         fields = [
-            'id', 'name', 'category', 'description', 'eligibility',
+            'id', 'name', 'category', 'description', 'eligibility', 'eligibility_rules',
             'documents', 'apply_link', 'deadline', 'age_min', 'age_max',
             'applicable_states', 'applicable_occupations', 'benefits',
-            'application_process', 'contact_info', 'created_at', 'updated_at'
+            'application_process', 'contact_info', 'stats', 'created_at', 'updated_at'
         ]
+        list_serializer_class = SchemeListSerializer
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        language = self.context.get('language')
+        if language:
+            fields = translated_fields(instance, language)
+            data.update({name: text for name, text in (fields or {}).items() if name in TRANSLATED_FIELDS})
+            data['language'] = language if fields else 'en'
+        return data
+
+    def validate_eligibility_rules(self, value):
+        try:
+            compile_rules(value)
+        except RuleSyntaxError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def get_stats(self, obj):
+        try:
+            return SchemeStatsSerializer(obj.stats).data
+        except SchemeStats.DoesNotExist:
+            return SchemeStatsSerializer(SchemeStats()).data
 
 
 class DocumentChecklistSerializer(serializers.ModelSerializer):
@@ -24,9 +72,9 @@ class DocumentChecklistSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'scheme', 'scheme_name', 'documents',
             'age', 'occupation', 'state', 'completion_percentage',
-            'created_at', 'updated_at'
+            'version', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'completion_percentage', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'completion_percentage', 'version', 'created_at', 'updated_at']
 
 
 class SchemeHistorySerializer(serializers.ModelSerializer):
@@ -64,3 +112,47 @@ class UserSavedSchemeSerializer(serializers.ModelSerializer):
         model = UserSavedScheme
         fields = ['id', 'user', 'scheme', 'saved_at']
         read_only_fields = ['id', 'saved_at']
+
+
+class UserDocumentSerializer(serializers.ModelSerializer):
+    sha256 = serializers.CharField(source='blob.sha256', read_only=True)
+    size = serializers.IntegerField(source='blob.size', read_only=True)
+    content_type = serializers.CharField(source='blob.content_type', read_only=True)
+
+    class Meta:
+        model = UserDocument
+        fields = [
+            'id', 'document_type', 'original_name', 'sha256', 'size',
+            'content_type', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'document_type', 'file_name', 'content_type', 'total_size',
+            'received', 'status', 'document', 'chunk_size', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'received', 'status', 'document', 'created_at', 'updated_at']
+
+    def get_chunk_size(self, obj):
+        return settings.VAULT_CHUNK_SIZE
+
+    def validate_document_type(self, value):
+        key = canonical_document_key(value)
+        # Vault documents tick checklist entries, so the type must be one a checklist can list
+        if key not in get_document_vocabulary():
+            raise serializers.ValidationError(f'"{value}" is not a document any scheme asks for.')
+        return key
+
+    def validate_total_size(self, value):
+        if value <= 0 or value > settings.VAULT_MAX_FILE_SIZE:
+            raise serializers.ValidationError(
+                f'File size must be between 1 and {settings.VAULT_MAX_FILE_SIZE} bytes'
+            )
+        return value
+
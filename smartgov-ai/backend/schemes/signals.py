@@ -0,0 +1,101 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, notifications, trending
+from .matcher import schedule_new_scheme_notifications
+from .deadlines import sync_deadline_reminders
+from .documents import invalidate_scheme_documents
+from .models import DocumentChecklist, Scheme, SchemeHistory, SchemeReminder, UserDocument, UserSavedScheme
+from .scheduler import get_scheduler, bump_generation
+from .vault import release_blob
+
+
+@receiver(post_save, sender=Scheme)
+@receiver(post_delete, sender=Scheme)
+def invalidate_documents(sender, instance, **kwargs):
+    """Scheme edits invalidate the parsed document list and vocabulary"""
+    invalidate_scheme_documents(instance.pk)
+
+
+@receiver(post_save, sender=Scheme)
+def sync_scheme_deadline(sender, instance, created, **kwargs):
+    """Regenerate deadline reminders for the scheme's audience when its deadline changes"""
+    if not instance.deadline_changed:
+        return
+    instance._loaded_deadline = instance.deadline
+    transaction.on_commit(lambda: sync_deadline_reminders(instance))
+
+
+@receiver(post_save, sender=Scheme)
+def notify_eligible_users(sender, instance, created, raw=False, **kwargs):
+    """Tell every user eligible for a newly added scheme about it"""
+    if created and not raw and settings.NOTIFY_ELIGIBLE_ON_NEW_SCHEME:
+        schedule_new_scheme_notifications(instance.pk)
+
+
+@receiver(post_save, sender=DocumentChecklist)
+def push_checklist_update(sender, instance, raw=False, **kwargs):
+    """Open apps refresh the checklist instead of polling user_checklists"""
+    if not raw:
+        notifications.notify(instance.user_id, notifications.CHECKLIST_UPDATED, notifications.checklist_data(instance))
+
+
+@receiver(post_save, sender=SchemeReminder)
+def schedule_reminder(sender, instance, **kwargs):
+    """Feed new, moved and cancelled reminders to the near-term scheduler"""
+    scheduler = get_scheduler()
+    if instance.status != 'active':
+        if scheduler:
+            scheduler.cancel(instance.pk)
+        return
+    if not isinstance(instance.reminder_date, datetime):
+        # create_reminder passes the raw request value through
+        instance.refresh_from_db(fields=['reminder_date'])
+    if scheduler and scheduler.schedule(instance.pk, instance.reminder_date):
+        return
+    if instance.reminder_date <= timezone.now() + settings.REMINDER_SCHEDULER_WINDOW:
+        bump_generation()
+
+
+@receiver(post_delete, sender=UserDocument)
+def release_document_blob(sender, instance, **kwargs):
+    """Every deleted vault document, including cascades from a deleted user, drops its blob reference"""
+    blob_id = instance.blob_id
+    transaction.on_commit(lambda: release_blob(blob_id))
+
+
+@receiver(post_delete, sender=SchemeReminder)
+def cancel_reminder(sender, instance, **kwargs):
+    scheduler = get_scheduler()
+    if scheduler:
+        scheduler.cancel(instance.pk)
+
+
+@receiver(post_save, sender=SchemeHistory)
+@receiver(post_delete, sender=SchemeHistory)
+def count_history_event(sender, instance, created=False, **kwargs):
+    """Views, applications and shares feed the scheme popularity counters"""
+    field = counters.HISTORY_FIELDS.get(instance.action)
+    if field is None or (kwargs['signal'] is post_save and not created):
+        return
+    counters.record(instance.scheme_id, field, 1 if created else -1)
+
+
+@receiver(post_save, sender=SchemeHistory)
+def record_trending_event(sender, instance, created, **kwargs):
+    """New history events feed the decayed trending scores, overall and for the user's state"""
+    if created:
+        trending.record_event(instance.scheme_id, instance.user.state, instance.action)
+
+
+@receiver(post_save, sender=UserSavedScheme)
+@receiver(post_delete, sender=UserSavedScheme)
+def count_saved_scheme(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_save and not created:
+        return
+    counters.record(instance.scheme_id, 'saves', 1 if created else -1)
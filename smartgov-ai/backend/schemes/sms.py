@@ -0,0 +1,41 @@
+"""
+Pluggable SMS gateways
+
+SMS_GATEWAY names the gateway class. ConsoleSMSGateway is the local
+stand-in, mirroring Django's console email backend.
+"""
+import sys
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BaseSMSGateway:
+    """Interface for SMS providers"""
+
+    def send_messages(self, messages):
+        """Send (phone_number, text) pairs; return how many were accepted"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ConsoleSMSGateway(BaseSMSGateway):
+    """Writes messages to stdout instead of sending them"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self._lock:
+            for phone_number, text in messages:
+                self.stream.write(f'SMS to {phone_number}:\n{text}\n{"-" * 79}\n')
+            self.stream.flush()
+        return len(messages)
+
+
+def get_sms_gateway():
+    return import_string(settings.SMS_GATEWAY)()
@@ -1,3 +1,144 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from backend.idempotency import HEADER
+from users.models import CustomUser
+
+from .models import DocumentBlob, DocumentChecklist, Scheme, UploadSession, UserDocument
+from .vault import append_chunk, complete_upload, delete_document
+
+
+def make_scheme(**fields):
+    defaults = {
+        'name': 'PM Kisan', 'category': 'agriculture', 'description': 'Income support',
+        'eligibility': 'Farmers', 'documents': 'Aadhar card, Land records',
+        'apply_link': 'https://pmkisan.gov.in', 'applicable_states': 'All',
+        'benefits': 'Rs 6000 a year', 'application_process': 'Apply online',
+    }
+    defaults.update(fields)
+    return Scheme.objects.create(**defaults)
+
+
+class ToggleDocumentsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ravi', password='secret-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.checklist = DocumentChecklist.objects.create(
+            user=self.user, scheme=make_scheme(), documents={'aadhar_card': False, 'land_records': False},
+            age=30, occupation='farmer', state='Bihar', version=3
+        )
+        self.url = f'/api/schemes/documents/{self.checklist.pk}/toggle_documents/'
+
+    def test_current_version_is_applied(self):
+        response = self.client.patch(self.url, {'documents': {'aadhar_card': True}, 'version': 3}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 4)
+        self.assertEqual(response.data['completion_percentage'], 50)
+
+    def test_stale_version_is_refused(self):
+        response = self.client.patch(self.url, {'documents': {'aadhar_card': True}, 'version': 2}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], 3)
+        self.checklist.refresh_from_db()
+        self.assertEqual(self.checklist.version, 3)
+        self.assertFalse(self.checklist.documents['aadhar_card'])
+
+    def test_non_numeric_id_is_not_found(self):
+        response = self.client.patch(
+            '/api/schemes/documents/abc/toggle_documents/', {'documents': {'aadhar_card': True}}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
+class VaultDeduplicationTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, VAULT_STAGING_DIR=f'{media_root}/staging')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, user, content, document_type='aadhar_card'):
+        session = UploadSession.objects.create(
+            user=user, document_type=document_type, file_name='aadhar.pdf',
+            content_type='application/pdf', total_size=len(content)
+        )
+        session = append_chunk(session, 0, io.BytesIO(content), len(content))
+        with self.captureOnCommitCallbacks(execute=True):
+            return complete_upload(session)
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload(CustomUser.objects.create_user(username='a'), b'same bytes')
+        second = self.upload(CustomUser.objects.create_user(username='b'), b'same bytes')
+
+        self.assertFalse(first.deduplicated)
+        self.assertTrue(second.deduplicated)
+        self.assertEqual(first.document.blob_id, second.document.blob_id)
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 2)
+
+    def test_last_release_deletes_blob_and_file(self):
+        first = self.upload(CustomUser.objects.create_user(username='a'), b'same bytes')
+        second = self.upload(CustomUser.objects.create_user(username='b'), b'same bytes')
+        blob = DocumentBlob.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_document(first.document)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_document(second.document)
+        self.assertFalse(DocumentBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+
+    def test_deleting_user_releases_their_documents(self):
+        owner = CustomUser.objects.create_user(username='a')
+        self.upload(owner, b'same bytes')
+        self.upload(owner, b'same bytes', document_type='pan_card')
+        self.upload(CustomUser.objects.create_user(username='b'), b'same bytes')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            owner.delete()
+
+        self.assertEqual(UserDocument.objects.count(), 1)
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 1)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='meera'))
+
+    def save_scheme(self, scheme, key):
+        return self.client.post(
+            '/api/schemes/schemes/save_scheme/', {'scheme_id': scheme.pk}, format='json',
+            headers={HEADER: key}
+        )
+
+    def test_retry_is_replayed(self):
+        scheme = make_scheme()
+        first = self.save_scheme(scheme, 'save-1')
+        retry = self.save_scheme(scheme, 'save-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.assertEqual(self.save_scheme(make_scheme(), 'save-1').status_code, 201)
+
+        response = self.save_scheme(make_scheme(name='Awas Yojana'), 'save-1')
+
+        self.assertEqual(response.status_code, 422)
@@ -0,0 +1,224 @@
+"""
+Offline scheme translation
+
+translate_schemes sends the text fields of several schemes per request to
+the configured LLM backend (chatbot.llm) as one JSON object and stores the
+translated object in SchemeTranslation. Each translation records the
+Scheme.updated_at it was made from; once the scheme is edited it is stale
+and the next run translates it again. Requests are spaced to stay under
+TRANSLATION_REQUESTS_PER_MINUTE.
+
+The read path (SchemeViewSet ?lang=) only loads stored translations and
+never calls the model.
+"""
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from chatbot import llm
+from .models import Scheme, SchemeTranslation
+
+logger = logging.getLogger(__name__)
+
+TRANSLATED_FIELDS = ('name', 'description', 'eligibility', 'documents', 'benefits', 'application_process')
+MAX_TOKENS = 4000
+MAX_RETRIES = 3
+
+SYSTEM_PROMPT = """You translate Indian government scheme information from English into {language}.
+You receive a JSON object mapping scheme ids to objects of English fields.
+Reply with only a JSON object of the same shape, with every value translated.
+Keep numbers, amounts, dates, URLs, acronyms and official scheme names recognisable;
+add the English term in brackets where a reader may need it on a form."""
+
+
+class TranslationError(Exception):
+    """The model's reply was not a usable translation"""
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart"""
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0.0
+
+    def wait(self):
+        now = self.clock()
+        if now < self._next:
+            self.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def current_translations(language):
+    """Translations of `language` made from the scheme's current text"""
+    return SchemeTranslation.objects.filter(language=language, source_updated_at=OuterRef('updated_at'))
+
+
+def schemes_needing_translation(language):
+    """Schemes with no translation into `language`, or only one of older text"""
+    return Scheme.objects.filter(
+        ~Exists(current_translations(language).filter(scheme=OuterRef('pk')))
+    ).order_by('pk')
+
+
+def build_request(schemes):
+    return json.dumps(
+        {str(scheme.pk): {name: getattr(scheme, name) or '' for name in TRANSLATED_FIELDS} for scheme in schemes},
+        ensure_ascii=False
+    )
+
+
+def parse_reply(text, schemes):
+    """{scheme_id: {field: text}} from the model's reply; raises TranslationError"""
+    # Models sometimes wrap JSON in a code fence despite the instructions
+    text = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', text or '')
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise TranslationError(f'Reply is not JSON: {e}')
+    if not isinstance(data, dict):
+        raise TranslationError('Reply is not a JSON object')
+
+    translations = {}
+    for scheme in schemes:
+        entry = data.get(str(scheme.pk))
+        if not isinstance(entry, dict):
+            raise TranslationError(f'Scheme {scheme.pk} is missing from the reply')
+        fields = {
+            name: entry[name].strip() for name in TRANSLATED_FIELDS
+            if isinstance(entry.get(name), str) and entry[name].strip()
+        }
+        missing = [name for name in TRANSLATED_FIELDS if getattr(scheme, name) and name not in fields]
+        if missing:
+            raise TranslationError(f'Scheme {scheme.pk} reply lacks {", ".join(missing)}')
+        translations[scheme.pk] = fields
+    return translations
+
+
+def store(schemes, translations, language, backend_name=''):
+    SchemeTranslation.objects.bulk_create(
+        [
+            SchemeTranslation(
+                scheme=scheme,
+                language=language,
+                fields=translations[scheme.pk],
+                # The text as read for this request, even if the scheme changed since
+                source_updated_at=scheme.updated_at,
+                backend=backend_name
+            )
+            for scheme in schemes
+        ],
+        update_conflicts=True,
+        unique_fields=['scheme', 'language'],
+        update_fields=['fields', 'source_updated_at', 'backend', 'translated_at']
+    )
+
+
+@dataclass
+class TranslationRun:
+    requests: int = 0
+    translated: int = 0
+    failed: list = field(default_factory=list)
+
+
+class Translator:
+    """Translates batches of schemes into one language, within the request rate limit"""
+
+    def __init__(self, language, backend=None, per_minute=None, max_retries=MAX_RETRIES):
+        if language not in settings.TRANSLATION_LANGUAGES:
+            raise ValueError(f'Unsupported language {language!r}')
+        self.language = language
+        self.backend = backend or llm.get_backend()
+        self.backend_name = f'{type(self.backend).__name__}:{getattr(self.backend, "model", "") or ""}'
+        self.limiter = RateLimiter(
+            settings.TRANSLATION_REQUESTS_PER_MINUTE if per_minute is None else per_minute
+        )
+        self.max_retries = max_retries
+        self.system_prompt = SYSTEM_PROMPT.format(language=settings.TRANSLATION_LANGUAGES[language])
+        self.run = TranslationRun()
+
+    def _request(self, schemes):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            self.run.requests += 1
+            try:
+                reply = self.backend.complete(
+                    [
+                        {'role': 'system', 'content': self.system_prompt},
+                        {'role': 'user', 'content': build_request(schemes)},
+                    ],
+                    temperature=0.2,
+                    max_tokens=MAX_TOKENS
+                )
+            except llm.LLMRateLimited:
+                if attempt == self.max_retries:
+                    raise
+                # Back off on top of the usual spacing
+                self.limiter.sleep(self.limiter.interval * 2 ** attempt)
+                continue
+            return parse_reply(reply, schemes)
+
+    def translate(self, schemes):
+        """Translate and store a batch; a bad reply is retried in halves down to single schemes"""
+        schemes = list(schemes)
+        try:
+            translations = self._request(schemes)
+        except TranslationError as e:
+            if len(schemes) == 1:
+                logger.warning('Could not translate scheme %s into %s: %s', schemes[0].pk, self.language, e)
+                self.run.failed.append(schemes[0].pk)
+                return
+            middle = len(schemes) // 2
+            self.translate(schemes[:middle])
+            self.translate(schemes[middle:])
+            return
+        store(schemes, translations, self.language, self.backend_name)
+        self.run.translated += len(schemes)
+
+
+def translate_pending(language, batch_size=None, limit=None, translator=None):
+    """Translate every scheme without a current translation into `language`"""
+    translator = translator or Translator(language)
+    batch_size = batch_size or settings.TRANSLATION_BATCH_SIZE
+    pending = schemes_needing_translation(language).only('pk', 'updated_at', *TRANSLATED_FIELDS)
+    if limit:
+        pending = pending[:limit]
+    batch = []
+    for scheme in pending.iterator(chunk_size=500):
+        batch.append(scheme)
+        if len(batch) == batch_size:
+            translator.translate(batch)
+            batch = []
+    if batch:
+        translator.translate(batch)
+    return translator.run
+
+
+def attach_translations(schemes, language):
+    """Load current translations for many schemes in one query, for the serializer"""
+    stored = {
+        translation.scheme_id: translation
+        for translation in SchemeTranslation.objects.filter(
+            scheme__in=[scheme.pk for scheme in schemes], language=language
+        )
+    }
+    for scheme in schemes:
+        translation = stored.get(scheme.pk)
+        current = translation is not None and translation.source_updated_at == scheme.updated_at
+        scheme.__dict__.setdefault('_translations', {})[language] = translation.fields if current else None
+
+
+def translated_fields(scheme, language):
+    """{field: text} of the scheme's current translation, or None"""
+    cached = scheme.__dict__.get('_translations', {})
+    if language not in cached:
+        attach_translations([scheme], language)
+    return scheme._translations[language]
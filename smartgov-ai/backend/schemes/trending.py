@@ -0,0 +1,269 @@
+"""
+Time-decayed trending schemes
+
+Each SchemeHistory event adds its weight to the scheme's score overall and
+in the user's state; scores halve every TRENDING_HALF_LIFE. Scores use
+forward decay: an event at time t is stored as weight * exp((t - t0) / tau),
+so old scores never need rewriting and ranking is a plain argpartition over
+a NumPy row. The real score is the stored value times exp(-(now - t0) / tau).
+
+Each process keeps scores loaded from TrendingScore (base) plus its own
+events since the last checkpoint (delta). Checkpoints merge the deltas into
+TrendingScore and reload the base, so processes see each other's events
+and a restart only has to read one small table.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .counters import POPULARITY_WEIGHTS, HISTORY_FIELDS
+from .models import TrendingScore
+
+logger = logging.getLogger(__name__)
+
+ALL_STATES = ''
+# Weight of each SchemeHistory action, on the same scale as the popularity score
+ACTION_WEIGHTS = {action: POPULARITY_WEIGHTS[field] for action, field in HISTORY_FIELDS.items()}
+ACTION_WEIGHTS['saved'] = POPULARITY_WEIGHTS['saves']
+# Rebase t0 before exp() of the stored values can overflow
+MAX_EXPONENT = 50.0
+MIN_SCORE = 0.01
+
+
+def normalize_state(state):
+    return (state or '').strip().lower()
+
+
+class TrendingEngine:
+    """Decayed per-scheme scores in (state x scheme) arrays; row 0 is all states"""
+
+    def __init__(self, half_life, checkpoint_interval=0, capacity=256):
+        self.tau = half_life.total_seconds() / math.log(2)
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._columns = {}
+        self._scheme_ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = {ALL_STATES: 0}
+        self._base = np.zeros((1, capacity))
+        self._delta = np.zeros((1, capacity))
+        self._t0 = time.time()
+        self._loaded = False
+        self._timer = None
+
+    # Array bookkeeping (callers hold self._lock)
+
+    def _column(self, scheme_id):
+        column = self._columns.get(scheme_id)
+        if column is None:
+            column = len(self._columns)
+            if column == self._base.shape[1]:
+                grow = ((0, 0), (0, column))
+                self._base = np.pad(self._base, grow)
+                self._delta = np.pad(self._delta, grow)
+                self._scheme_ids = np.pad(self._scheme_ids, (0, column))
+            self._columns[scheme_id] = column
+            self._scheme_ids[column] = scheme_id
+        return column
+
+    def _row(self, state):
+        row = self._rows.get(state)
+        if row is None:
+            row = len(self._rows)
+            self._rows[state] = row
+            self._base = np.vstack([self._base, np.zeros(self._base.shape[1])])
+            self._delta = np.vstack([self._delta, np.zeros(self._delta.shape[1])])
+        return row
+
+    def _rebase(self, now):
+        exponent = (now - self._t0) / self.tau
+        if exponent > MAX_EXPONENT:
+            factor = math.exp(-exponent)
+            self._base *= factor
+            self._delta *= factor
+            self._t0 = now
+
+    # Public API
+
+    def record(self, scheme_id, state, weight, at=None):
+        """Add an event's weight to the scheme overall and in the given state"""
+        now = time.time()
+        at = now if at is None else at
+        with self._lock:
+            self._rebase(now)
+            value = weight * math.exp((at - self._t0) / self.tau)
+            column = self._column(scheme_id)
+            self._delta[0, column] += value
+            state = normalize_state(state)
+            if state:
+                row = self._row(state)
+                self._delta[row, column] += value
+            self._ensure_timer()
+
+    def top(self, state=ALL_STATES, k=10):
+        """[(scheme_id, score)] for the k highest current scores"""
+        self.ensure_loaded()
+        with self._lock:
+            row = self._rows.get(normalize_state(state))
+            size = len(self._columns)
+            if row is None or not size or k <= 0:
+                return []
+            scores = self._base[row, :size] + self._delta[row, :size]
+            scale = math.exp(-(time.time() - self._t0) / self.tau)
+            scheme_ids = self._scheme_ids[:size]
+        k = min(k, size)
+        columns = np.argpartition(-scores, k - 1)[:k]
+        columns = columns[np.argsort(-scores[columns], kind='stable')]
+        return [
+            (int(scheme_ids[column]), float(scores[column] * scale))
+            for column in columns if scores[column] * scale >= MIN_SCORE
+        ]
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def load(self):
+        """Replace the base scores with the checkpointed ones"""
+        rows = list(TrendingScore.objects.values_list('scheme_id', 'state', 'score', 'updated_at'))
+        with self._lock:
+            self._base[:] = 0
+            for scheme_id, state, score, updated_at in rows:
+                value = score * math.exp((updated_at.timestamp() - self._t0) / self.tau)
+                row, column = self._row(state), self._column(scheme_id)
+                self._base[row, column] = value
+            self._loaded = True
+            # Readers that never record still need the periodic reload
+            self._ensure_timer()
+
+    def checkpoint(self, reload=True):
+        """Merge this process's events into TrendingScore and, after a merge, reload everyone's"""
+        with self._checkpoint_lock:
+            with self._lock:
+                delta, self._delta = self._delta, np.zeros_like(self._delta)
+                t0 = self._t0
+                states = {row: state for state, row in self._rows.items()}
+                scheme_ids = self._scheme_ids.copy()
+            try:
+                merged = self._merge(delta, t0, states, scheme_ids)
+            except Exception:
+                with self._lock:
+                    rows, columns = delta.shape
+                    self._delta[:rows, :columns] += delta
+                raise
+            if merged and reload:
+                self.load()
+            return merged
+
+    def discard(self):
+        """Drop events not yet checkpointed"""
+        with self._lock:
+            self._delta[:] = 0
+
+    def _merge(self, delta, t0, states, scheme_ids):
+        now = timezone.now()
+        scale = math.exp(-(now.timestamp() - t0) / self.tau)
+        rows, columns = np.nonzero(delta)
+        if not len(rows):
+            return 0
+        additions = {
+            (int(scheme_ids[column]), states[row]): float(delta[row, column] * scale)
+            for row, column in zip(rows, columns)
+        }
+
+        with transaction.atomic():
+            existing = TrendingScore.objects.select_for_update().filter(
+                scheme_id__in={scheme_id for scheme_id, _ in additions}
+            )
+            scores = {
+                (row.scheme_id, row.state): row.score * math.exp(-(now - row.updated_at).total_seconds() / self.tau)
+                for row in existing
+            }
+            for key, value in additions.items():
+                scores[key] = scores.get(key, 0.0) + value
+            TrendingScore.objects.bulk_create(
+                [
+                    TrendingScore(scheme_id=scheme_id, state=state, score=score, updated_at=now)
+                    for (scheme_id, state), score in scores.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['scheme', 'state'],
+                update_fields=['score', 'updated_at']
+            )
+            # Scores that have decayed away are dropped to keep the table small
+            TrendingScore.objects.filter(
+                updated_at__lt=now - settings.TRENDING_HALF_LIFE * 20
+            ).delete()
+        return len(additions)
+
+    def _ensure_timer(self):
+        """Start the checkpoint thread if it is configured and not running (callers hold self._lock)"""
+        if self._timer is None and self.checkpoint_interval:
+            self._start_timer()
+
+    def _start_timer(self):
+        self._timer = threading.Thread(target=self._run, name='trending-checkpoint', daemon=True)
+        self._timer.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.checkpoint_interval)
+            try:
+                # A process with nothing to merge still picks up the others' merges
+                if not self.checkpoint() and self._loaded:
+                    self.load()
+            except Exception:
+                logger.exception('Could not checkpoint trending scores')
+            finally:
+                close_old_connections()
+
+
+engine = TrendingEngine(
+    half_life=settings.TRENDING_HALF_LIFE,
+    checkpoint_interval=settings.TRENDING_CHECKPOINT_INTERVAL,
+)
+
+
+@atexit.register
+def _checkpoint_on_exit():
+    try:
+        # Nothing reads the scores after this, so don't reload them; with nothing
+        # to merge no query runs (the test database may already be gone)
+        engine.checkpoint(reload=False)
+    except Exception:
+        logger.exception('Could not checkpoint trending scores on exit')
+
+
+def record_event(scheme_id, state, action, at=None):
+    """Count a history event once the current transaction commits"""
+    weight = ACTION_WEIGHTS.get(action)
+    if weight:
+        transaction.on_commit(lambda: engine.record(scheme_id, state, weight, at))
+
+
+def rebuild(since):
+    """Recompute every score from SchemeHistory events after `since` and checkpoint them"""
+    from .models import SchemeHistory
+
+    TrendingScore.objects.all().delete()
+    fresh = TrendingEngine(half_life=settings.TRENDING_HALF_LIFE)
+    fresh._loaded = True
+    events = SchemeHistory.objects.filter(
+        timestamp__gte=since, action__in=ACTION_WEIGHTS
+    ).values_list('scheme_id', 'user__state', 'action', 'timestamp')
+    count = 0
+    for scheme_id, state, action, timestamp in events.iterator(chunk_size=5000):
+        fresh.record(scheme_id, state, ACTION_WEIGHTS[action], timestamp.timestamp())
+        count += 1
+    fresh.checkpoint()
+    # Local events are part of the replayed history now
+    engine.discard()
+    engine.load()
+    return count
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     SchemeViewSet, DocumentChecklistViewSet,
-    SchemeHistoryViewSet, SchemeReminderViewSet
+    SchemeHistoryViewSet, SchemeReminderViewSet,
+    UploadSessionViewSet, DocumentVaultViewSet
 )
 
 router = DefaultRouter()
@@ -10,6 +11,8 @@ router.register(r'schemes', SchemeViewSet, basename='scheme')
 router.register(r'documents', DocumentChecklistViewSet, basename='document-checklist')
 router.register(r'history', SchemeHistoryViewSet, basename='scheme-history')
 router.register(r'reminders', SchemeReminderViewSet, basename='reminder')
+router.register(r'vault/uploads', UploadSessionViewSet, basename='vault-upload')
+router.register(r'vault/documents', DocumentVaultViewSet, basename='vault-document')
 
 app_name = 'schemes'
 
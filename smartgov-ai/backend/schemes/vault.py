@@ -0,0 +1,226 @@
+"""
+Deduplicating document vault
+
+Uploads arrive as sequential chunks that are appended to a staging file on
+local disk, so memory use is bounded by the chunk size. On completion the
+staging file is hashed in a streaming pass and stored in default storage
+under its SHA-256 plus a random suffix, which works the same for
+FileSystemStorage and django-storages backends. Identical files are stored
+once and shared through a reference count.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .documents import set_document_status
+from .models import DocumentBlob, DocumentChecklist, UploadSession, UserDocument
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """The upload request cannot be applied to the session"""
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the previous one ended"""
+
+    def __init__(self, expected):
+        super().__init__(f'Expected a chunk at offset {expected}')
+        self.expected = expected
+
+
+def staging_path(session):
+    return os.path.join(settings.VAULT_STAGING_DIR, f'{session.id}.part')
+
+
+def blob_name(digest):
+    """
+    A storage name no other blob uses, even one of the same digest
+    Backends that overwrite (S3 with file_overwrite) don't pick free names
+    """
+    return f'vault/{digest[:2]}/{digest[2:4]}/{digest}-{uuid.uuid4().hex}'
+
+
+def append_chunk(session, offset, stream, length):
+    """
+    Append one chunk from a file-like stream to the session's staging file
+    Chunks must arrive in order; a client resumes from session.received
+    """
+    if session.status != 'open':
+        raise UploadError('Upload session is not open')
+    if length <= 0 or length > settings.VAULT_CHUNK_SIZE:
+        raise UploadError(f'Chunks must be between 1 and {settings.VAULT_CHUNK_SIZE} bytes')
+    if offset + length > session.total_size:
+        raise UploadError('Chunk goes past the declared file size')
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if offset != session.received:
+            raise OffsetMismatch(session.received)
+
+        path = staging_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with open(path, 'ab') as staged:
+            # Drop bytes left behind by a chunk that failed part way through
+            staged.truncate(offset)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                staged.write(data)
+                written += len(data)
+        if written != length:
+            raise UploadError(f'Received {written} of {length} bytes')
+
+        session.received = offset + length
+        session.save(update_fields=['received', 'updated_at'])
+    return session
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as staged:
+        for data in iter(lambda: staged.read(READ_SIZE), b''):
+            sha.update(data)
+    return sha.hexdigest()
+
+
+def _acquire_blob(digest, path, size, content_type):
+    """Return the blob for a digest with one more reference, storing the file if it is new"""
+    blob = DocumentBlob.objects.select_for_update().filter(sha256=digest).first()
+    if blob is None:
+        # A released blob of the same digest may still have its file pending
+        # deletion, so the new file gets a name of its own
+        with open(path, 'rb') as staged:
+            name = default_storage.save(blob_name(digest), File(staged))
+        try:
+            with transaction.atomic():
+                blob = DocumentBlob.objects.create(
+                    sha256=digest, file=name, size=size, content_type=content_type
+                )
+        except IntegrityError:
+            # Another upload of the same bytes finished first; keep its file
+            default_storage.delete(name)
+            blob = DocumentBlob.objects.select_for_update().get(sha256=digest)
+    DocumentBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference; the stored file is deleted with the last one
+    Deleted UserDocuments release their blob through a post_delete receiver
+    """
+    with transaction.atomic():
+        blob = DocumentBlob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            DocumentBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+            return
+        name = blob.file.name
+        blob.delete()
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def link_checklists(user, document_type, uploaded=True):
+    """Mark the document on every checklist of the user that lists it"""
+    checklist_ids = DocumentChecklist.objects.filter(
+        user=user, documents__has_key=document_type
+    ).values_list('id', flat=True)
+    for checklist_id in checklist_ids:
+        set_document_status(checklist_id, user, {document_type: uploaded})
+    return list(checklist_ids)
+
+
+@dataclass
+class CompletedUpload:
+    document: UserDocument
+    deduplicated: bool
+    checklist_ids: list = field(default_factory=list)
+
+
+def complete_upload(session, expected_sha256=None):
+    """Hash the staged file, store it content-addressed and attach it to the user's vault"""
+    if session.status != 'open':
+        raise UploadError('Upload session is not open')
+    if session.received != session.total_size:
+        raise UploadError(f'Received {session.received} of {session.total_size} bytes')
+
+    path = staging_path(session)
+    digest = file_digest(path)
+    if expected_sha256 and expected_sha256.lower() != digest:
+        raise UploadError('SHA-256 of the uploaded file does not match')
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'open':
+            raise UploadError('Upload session is not open')
+
+        deduplicated = DocumentBlob.objects.filter(sha256=digest).exists()
+        blob = _acquire_blob(digest, path, session.total_size, session.content_type)
+        previous = UserDocument.objects.select_for_update().filter(
+            user_id=session.user_id, document_type=session.document_type
+        ).first()
+        if previous is None:
+            document = UserDocument.objects.create(
+                user_id=session.user_id,
+                blob=blob,
+                document_type=session.document_type,
+                original_name=session.file_name
+            )
+        else:
+            old_blob_id = previous.blob_id
+            previous.blob = blob
+            previous.original_name = session.file_name
+            previous.save(update_fields=['blob', 'original_name', 'updated_at'])
+            release_blob(old_blob_id)
+            document = previous
+
+        session.status = 'complete'
+        session.document = document
+        session.save(update_fields=['status', 'document', 'updated_at'])
+        transaction.on_commit(lambda: _remove_staging(path))
+
+    checklist_ids = link_checklists(session.user, session.document_type)
+    return CompletedUpload(document=document, deduplicated=deduplicated, checklist_ids=checklist_ids)
+
+
+def abort_upload(session):
+    UploadSession.objects.filter(pk=session.pk, status='open').update(status='aborted', updated_at=timezone.now())
+    _remove_staging(staging_path(session))
+
+
+def delete_document(document):
+    """Remove a document from the vault and untick it on the user's checklists"""
+    # The post_delete receiver releases the blob once the deletion commits
+    document.delete()
+    link_checklists(document.user, document.document_type, uploaded=False)
+
+
+def purge_stale_uploads(older_than=None):
+    """Abort open sessions that have not received a chunk recently and delete their staging files"""
+    cutoff = timezone.now() - (older_than or settings.VAULT_UPLOAD_TTL)
+    stale = UploadSession.objects.filter(status='open', updated_at__lt=cutoff)
+    count = 0
+    for session in stale.iterator():
+        abort_upload(session)
+        count += 1
+    return count
+
+
+def _remove_staging(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -4,18 +4,36 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import F
 from datetime import datetime, timedelta
 import json
 
+from django.conf import settings
+from django.http import FileResponse
+
+from backend.idempotency import idempotent
+
 from .models import (
     Scheme, DocumentChecklist, SchemeHistory,
-    SchemeReminder, UserSavedScheme
+    SchemeReminder, UserSavedScheme, UploadSession, UserDocument
 )
+from . import trending
+from .deadlines import sync_deadline_reminders
+from .documents import (
+    ChecklistVersionConflict, UnknownDocument, canonical_document_key, document_label,
+    get_scheme_documents, replace_documents, save_checklists, set_document_status
+)
+from .eligibility import filter_by_rules, has_complete_profile, schemes_for_user_q
+from .recommendations import similar_schemes
 from .serializers import (
     SchemeSerializer, DocumentChecklistSerializer,
     SchemeHistorySerializer, SchemeReminderSerializer,
-    UserSavedSchemeSerializer
+    UserSavedSchemeSerializer, UploadSessionSerializer, UserDocumentSerializer
+)
+from .translations import attach_translations
+from .vault import (
+    OffsetMismatch, UploadError, abort_upload, append_chunk,
+    complete_upload, delete_document
 )
 
 
@@ -27,18 +45,38 @@ class SchemeViewSet(viewsets.ModelViewSet):
     serializer_class = SchemeSerializer
     permission_classes = [AllowAny]
 
+    # ?ordering= values backed by the materialized SchemeStats counters
+    STATS_ORDERING = {
+        'popular': 'score',
+        'most_viewed': 'views',
+        'most_applied': 'applies',
+        'most_saved': 'saves',
+        'most_shared': 'shares',
+    }
+
     def get_queryset(self):
-        queryset = Scheme.objects.all()
+        queryset = Scheme.objects.select_related('stats')
         category = self.request.query_params.get('category')
         state = self.request.query_params.get('state')
+        ordering = self.request.query_params.get('ordering')
 
         if category:
             queryset = queryset.filter(category=category)
         if state:
             queryset = queryset.filter(applicable_states__icontains=state)
+        if ordering in self.STATS_ORDERING:
+            queryset = queryset.order_by(F(f'stats__{self.STATS_ORDERING[ordering]}').desc(nulls_last=True), 'id')
 
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # ?lang= serves stored translations (see schemes.translations); no LLM calls here
+        language = self.request.query_params.get('lang')
+        if language in settings.TRANSLATION_LANGUAGES:
+            context['language'] = language
+        return context
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def personalized(self, request):
         """
@@ -46,22 +84,13 @@ class SchemeViewSet(viewsets.ModelViewSet):
         """
         user = request.user
 
-        if not all([user.age, user.occupation, user.state]):
+        if not has_complete_profile(user):
             return Response({
                 'error': 'User profile incomplete. Please update age, occupation, and state.'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Filter schemes based on user profile
-        schemes = Scheme.objects.filter(
-            applicable_states__icontains=user.state
-        ).filter(
-            Q(age_min__isnull=True) | Q(age_min__lte=user.age)
-        ).filter(
-            Q(age_max__isnull=True) | Q(age_max__gte=user.age)
-        ).filter(
-            Q(applicable_occupations__isnull=True) |
-            Q(applicable_occupations__icontains=user.occupation)
-        )
+        # Filter schemes based on user profile, then on their structured rules in-process
+        schemes = filter_by_rules(Scheme.objects.filter(schemes_for_user_q(user)).select_related('stats'), user)
 
         # Track as viewed
         for scheme in schemes:
@@ -72,13 +101,75 @@ class SchemeViewSet(viewsets.ModelViewSet):
                 defaults={'timestamp': datetime.now()}
             )
 
-        serializer = SchemeSerializer(schemes, many=True)
+        serializer = SchemeSerializer(schemes, many=True, context=self.get_serializer_context())
         return Response({
             'message': 'Personalized schemes based on your profile',
-            'count': schemes.count(),
+            'count': len(schemes),
             'schemes': serializer.data
         })
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        Schemes with the most activity recently, overall or in ?state=
+        Ranked from in-memory decayed scores, without reading scheme history
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        state = request.query_params.get('state', '')
+        ranked = trending.engine.top(state, limit)
+        schemes = Scheme.objects.select_related('stats').in_bulk([scheme_id for scheme_id, _ in ranked])
+        context = self.get_serializer_context()
+        if 'language' in context:
+            attach_translations(list(schemes.values()), context['language'])
+        results = []
+        for scheme_id, score in ranked:
+            if scheme_id in schemes:
+                data = SchemeSerializer(schemes[scheme_id], context=context).data
+                data['trending_score'] = round(score, 3)
+                results.append(data)
+        return Response({
+            'state': state,
+            'count': len(results),
+            'schemes': results
+        })
+
+    @action(detail=True, methods=['get'])
+    def also_applied(self, request, pk=None):
+        """
+        Schemes that people who used this scheme also used
+        Limited to schemes the user is eligible for when their profile is complete
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            pk = int(pk)
+        except ValueError:
+            return Response({'error': 'Scheme not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not Scheme.objects.filter(pk=pk).exists():
+            return Response({'error': 'Scheme not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        neighbours = similar_schemes(pk, request.user, limit)
+        context = self.get_serializer_context()
+        if 'language' in context:
+            attach_translations([scheme for scheme, _ in neighbours], context['language'])
+        results = []
+        for scheme, neighbour in neighbours:
+            data = SchemeSerializer(scheme, context=context).data
+            data['similarity'] = neighbour['score']
+            data['shared_users'] = neighbour['count']
+            results.append(data)
+        return Response({
+            'scheme_id': pk,
+            'count': len(results),
+            'schemes': results
+        })
+
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def track_view(self, request):
         """Track that user viewed a scheme"""
@@ -96,6 +187,7 @@ class SchemeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Scheme not found'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
     def save_scheme(self, request):
         """Save/bookmark a scheme"""
         scheme_id = request.data.get('scheme_id')
@@ -106,6 +198,8 @@ class SchemeViewSet(viewsets.ModelViewSet):
                 user=request.user,
                 scheme=scheme
             )
+            if created and scheme.deadline:
+                sync_deadline_reminders(scheme, user_ids=[request.user.pk])
             message = 'Scheme saved' if created else 'Scheme already saved'
             return Response({'message': message}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
         except Scheme.DoesNotExist:
@@ -142,38 +236,12 @@ class DocumentChecklistViewSet(viewsets.ViewSet):
             scheme = Scheme.objects.get(id=scheme_id)
             user = request.user
 
-            # Generate document list based on user profile
-            documents = {
-                'identity_proof': False,
-                'address_proof': False,
-                'age_proof': False,
-                'income_certificate': False,
-                'occupation_certificate': False,
-                'state_residency_proof': False,
-                'bank_account_details': False,
-                'aadhar_card': False,
-                'application_form': False,
-                'supporting_documents': False
-            }
-
-            # Add specific documents based on scheme requirements
-            scheme_docs = [doc.strip() for doc in scheme.documents.split(',') if doc.strip()]
-            for doc in scheme_docs:
-                doc_key = doc.lower().replace(' ', '_')
-                documents[doc_key] = False
-
-            # Create or update checklist
-            checklist, created = DocumentChecklist.objects.update_or_create(
-                user=user,
-                scheme=scheme,
-                defaults={
-                    'documents': documents,
-                    'age': user.age or 0,
-                    'occupation': user.occupation or '',
-                    'state': user.state or '',
-                    'completion_percentage': 0
-                }
+            # Create or regenerate the checklist, keeping documents already ticked
+            checklists, created = save_checklists(
+                user, {scheme.id: get_scheme_documents([scheme.id])[scheme.id]},
+                uploaded=set(UserDocument.objects.filter(user=user).values_list('document_type', flat=True))
             )
+            checklist = checklists[scheme.id]
 
             serializer = DocumentChecklistSerializer(checklist)
             return Response({
@@ -181,10 +249,80 @@ class DocumentChecklistViewSet(viewsets.ViewSet):
                 'checklist': serializer.data
             }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-        except Scheme.DoesNotExist:
+        except (Scheme.DoesNotExist, ValueError, TypeError):
             return Response({
                 'error': 'Scheme not found'
             }, status=status.HTTP_404_NOT_FOUND)
+        except ChecklistVersionConflict:
+            return Response({
+                'error': 'Checklist was changed by another request, try again'
+            }, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=False, methods=['post'])
+    def generate_checklists(self, request):
+        """
+        Generate checklists for several schemes in one request
+        Documents already ticked on an existing checklist stay ticked
+        """
+        scheme_ids = request.data.get('scheme_ids')
+        if not isinstance(scheme_ids, list) or not scheme_ids:
+            return Response({
+                'error': 'scheme_ids must be a non-empty list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            scheme_ids = list(dict.fromkeys(int(scheme_id) for scheme_id in scheme_ids))
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'scheme_ids must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        scheme_documents = get_scheme_documents(scheme_ids)
+        uploaded = set(UserDocument.objects.filter(user=user).values_list('document_type', flat=True))
+        try:
+            checklists, created = save_checklists(user, scheme_documents, uploaded)
+        except ChecklistVersionConflict:
+            return Response({
+                'error': 'Checklists were changed by another request, try again'
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'message': 'Document checklists generated',
+            'checklists': DocumentChecklistSerializer(
+                [checklists[scheme_id] for scheme_id in scheme_ids if scheme_id in checklists], many=True
+            ).data,
+            'not_found': [scheme_id for scheme_id in scheme_ids if scheme_id not in scheme_documents]
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def document_wallet(self, request):
+        """
+        Documents needed across all of the user's checklists
+        Each document lists the schemes it covers, most widely used first
+        """
+        wallet = {}
+        checklists = DocumentChecklist.objects.filter(user=request.user).values_list(
+            'scheme_id', 'scheme__name', 'documents'
+        )
+        for scheme_id, scheme_name, documents in checklists:
+            for name, uploaded in (documents or {}).items():
+                key = canonical_document_key(name)
+                entry = wallet.setdefault(key, {
+                    'document': key,
+                    'label': document_label(key),
+                    'uploaded': False,
+                    'schemes': []
+                })
+                entry['uploaded'] = entry['uploaded'] or bool(uploaded)
+                entry['schemes'].append({'id': scheme_id, 'name': scheme_name, 'uploaded': bool(uploaded)})
+
+        documents = sorted(wallet.values(), key=lambda entry: (-len(entry['schemes']), entry['document']))
+        for entry in documents:
+            entry['scheme_count'] = len(entry['schemes'])
+        return Response({
+            'documents': documents,
+            'shared_documents': [entry['document'] for entry in documents if entry['scheme_count'] > 1]
+        })
 
     @action(detail=False, methods=['get'])
     def user_checklists(self, request):
@@ -195,20 +333,90 @@ class DocumentChecklistViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['put'])
     def update_checklist(self, request):
-        """Update document checklist status"""
+        """
+        Update document checklist status
+        Optionally send the "version" last seen to refuse overwriting newer changes
+        """
         checklist_id = request.data.get('checklist_id')
         documents = request.data.get('documents')
+        if not isinstance(documents, dict) or not all(isinstance(value, bool) for value in documents.values()):
+            return Response({
+                'error': 'documents must be an object of true or false values'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        expected_version = request.data.get('version')
+        if expected_version is not None:
+            try:
+                expected_version = int(expected_version)
+            except (TypeError, ValueError):
+                return Response({
+                    'error': 'version must be an integer'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            checklist = DocumentChecklist.objects.get(id=checklist_id, user=request.user)
-            checklist.documents = documents
-            checklist.calculate_completion()
-            serializer = DocumentChecklistSerializer(checklist)
-            return Response(serializer.data)
-        except DocumentChecklist.DoesNotExist:
+            checklist = replace_documents(checklist_id, request.user, documents, expected_version)
+        except (DocumentChecklist.DoesNotExist, ValueError, TypeError):
+            return Response({
+                'error': 'Checklist not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except ChecklistVersionConflict as e:
+            return Response({
+                'error': 'Checklist was changed by another request',
+                'version': e.current_version
+            }, status=status.HTTP_409_CONFLICT)
+        serializer = DocumentChecklistSerializer(checklist)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['patch'])
+    def toggle_documents(self, request, pk=None):
+        """
+        Set the status of individual documents without replacing the checklist
+        Send {"documents": {name: uploaded}} and optionally the "version" last seen
+        """
+        changes = request.data.get('documents')
+        if not isinstance(changes, dict) or not changes:
+            return Response({
+                'error': 'documents must be a non-empty object'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        invalid = [name for name, uploaded in changes.items() if not isinstance(uploaded, bool)]
+        if invalid:
+            # bool("false") is True, so strings and numbers are refused rather than coerced
+            return Response({
+                'error': f'Document status must be true or false: {", ".join(invalid)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        expected_version = request.data.get('version')
+        if expected_version is not None:
+            try:
+                expected_version = int(expected_version)
+            except (TypeError, ValueError):
+                return Response({
+                    'error': 'version must be an integer'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            checklist = set_document_status(pk, request.user, changes, expected_version)
+        except (DocumentChecklist.DoesNotExist, ValueError, TypeError):
             return Response({
                 'error': 'Checklist not found'
             }, status=status.HTTP_404_NOT_FOUND)
+        except UnknownDocument as e:
+            return Response({
+                'error': f'{e} is not on this checklist'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ChecklistVersionConflict as e:
+            return Response({
+                'error': 'Checklist was changed by another request',
+                'version': e.current_version
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'id': checklist.id,
+            'documents': checklist.documents,
+            'completion_percentage': checklist.completion_percentage,
+            'version': checklist.version,
+            'updated_at': checklist.updated_at
+        })
 
 
 class SchemeHistoryViewSet(viewsets.ViewSet):
@@ -247,6 +455,7 @@ class SchemeReminderViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def create_reminder(self, request):
         """Create a scheme deadline reminder"""
         scheme_id = request.data.get('scheme_id')
@@ -300,3 +509,127 @@ class SchemeReminderViewSet(viewsets.ViewSet):
             return Response({
                 'error': 'Reminder not found'
             }, status=status.HTTP_404_NOT_FOUND)
+
+
+class UploadSessionViewSet(viewsets.ViewSet):
+    """
+    API endpoints for resumable chunked uploads into the document vault
+    Start a session, PUT chunks in order with ?offset=, then complete it
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _get_session(self, request, pk):
+        return UploadSession.objects.get(pk=pk, user=request.user)
+
+    def create(self, request):
+        """Start an upload session"""
+        serializer = UploadSessionSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def retrieve(self, request, pk=None):
+        """Get session progress; clients resume from 'received'"""
+        try:
+            return Response(UploadSessionSerializer(self._get_session(request, pk)).data)
+        except UploadSession.DoesNotExist:
+            return Response({
+                'error': 'Upload session not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """Append the raw request body at ?offset="""
+        try:
+            session = self._get_session(request, pk)
+            offset = int(request.query_params.get('offset', 0))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except UploadSession.DoesNotExist:
+            return Response({
+                'error': 'Upload session not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except ValueError:
+            return Response({
+                'error': 'offset must be an integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            session = append_chunk(session, offset, request.stream, length)
+        except OffsetMismatch as e:
+            return Response({
+                'error': str(e),
+                'received': e.expected
+            }, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'received': session.received, 'total_size': session.total_size})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Finish the upload and add the file to the vault"""
+        try:
+            session = self._get_session(request, pk)
+            result = complete_upload(session, request.data.get('sha256'))
+        except UploadSession.DoesNotExist:
+            return Response({
+                'error': 'Upload session not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except UploadError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'message': 'Document stored',
+            'document': UserDocumentSerializer(result.document).data,
+            'deduplicated': result.deduplicated,
+            'checklists_updated': result.checklist_ids
+        }, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        """Abort an upload and discard the staged chunks"""
+        try:
+            abort_upload(self._get_session(request, pk))
+        except UploadSession.DoesNotExist:
+            return Response({
+                'error': 'Upload session not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DocumentVaultViewSet(viewsets.ViewSet):
+    """
+    API endpoints for documents stored in the user's vault
+    """
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        documents = UserDocument.objects.filter(user=request.user).select_related('blob')
+        return Response(UserDocumentSerializer(documents, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        try:
+            document = UserDocument.objects.select_related('blob').get(pk=pk, user=request.user)
+        except UserDocument.DoesNotExist:
+            return Response({
+                'error': 'Document not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            document.blob.file.open('rb'),
+            as_attachment=True,
+            filename=document.original_name,
+            content_type=document.blob.content_type or None
+        )
+
+    def destroy(self, request, pk=None):
+        try:
+            document = UserDocument.objects.get(pk=pk, user=request.user)
+        except UserDocument.DoesNotExist:
+            return Response({
+                'error': 'Document not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        delete_document(document)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,92 @@
+"""
+Aadhar number helpers and verification provider clients
+
+Aadhar numbers are looked up through a keyed HMAC digest, so duplicate
+detection is an indexed equality match and never scans plaintext numbers.
+The provider call sits behind AadharVerificationClient; the stub client is
+a local stand-in used until the real service is wired in.
+"""
+import asyncio
+import hashlib
+import hmac
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_client = None
+
+
+def aadhar_digest(aadhar_number):
+    """Keyed digest used as the unique lookup column"""
+    return hmac.new(
+        settings.AADHAR_HMAC_KEY.encode(), aadhar_number.encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def mask_aadhar(aadhar_number):
+    return 'XXXX-XXXX-' + aadhar_number[-4:]
+
+
+def is_valid_format(aadhar_number):
+    return isinstance(aadhar_number, str) and len(aadhar_number) == 12 and aadhar_number.isdigit()
+
+
+class VerificationResult:
+    def __init__(self, verified, reason=''):
+        self.verified = verified
+        self.reason = reason
+
+
+class AadharVerificationClient:
+    """Interface for the external Aadhar verification provider"""
+
+    def verify(self, aadhar_number):
+        raise NotImplementedError
+
+    async def averify(self, aadhar_number):
+        """Async variant used by batch verification; override for native async clients"""
+        return await sync_to_async(self.verify, thread_sensitive=False)(aadhar_number)
+
+
+class StubAadharVerificationClient(AadharVerificationClient):
+    """
+    Local stand-in for the verification service
+    Accepts any well-formed number after AADHAR_STUB_LATENCY seconds
+    """
+
+    def _check(self, aadhar_number):
+        if not is_valid_format(aadhar_number):
+            return VerificationResult(False, 'Invalid Aadhar number')
+        return VerificationResult(True)
+
+    def verify(self, aadhar_number):
+        return self._check(aadhar_number)
+
+    async def averify(self, aadhar_number):
+        latency = getattr(settings, 'AADHAR_STUB_LATENCY', 0)
+        if latency:
+            await asyncio.sleep(latency)
+        return self._check(aadhar_number)
+
+
+def get_verification_client():
+    global _client
+    if _client is None:
+        _client = import_string(settings.AADHAR_VERIFICATION_CLIENT)()
+    return _client
+
+
+async def verify_many(aadhar_numbers, concurrency):
+    """Verify numbers concurrently with at most `concurrency` provider calls in flight"""
+    client = get_verification_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def verify_one(aadhar_number):
+        async with semaphore:
+            try:
+                return await client.averify(aadhar_number)
+            except Exception as e:
+                return VerificationResult(False, str(e))
+
+    return await asyncio.gather(*(verify_one(number) for number in aadhar_numbers))
@@ -1,15 +1,31 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, AadharVerification, UserPreferences, UserHistory
+from django.utils.html import format_html
+from .images import variant_urls
+from .models import CustomUser, AadharVerification, UserPreferences, UserHistory, ExpiringToken
 
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
-        ('Additional Info', {'fields': ('age', 'occupation', 'state', 'phone_number', 'aadhar_number', 'aadhar_verified', 'profile_picture')}),
+        ('Additional Info', {'fields': ('age', 'occupation', 'state', 'annual_income', 'gender', 'social_category', 'land_holding', 'phone_number', 'aadhar_number', 'aadhar_verified', 'profile_picture', 'avatar')}),
     )
-    list_display = ['username', 'email', 'first_name', 'last_name', 'age', 'state', 'aadhar_verified']
+    list_display = ['avatar', 'username', 'email', 'first_name', 'last_name', 'age', 'state', 'aadhar_verified']
+    list_display_links = ['username']
     search_fields = ['username', 'email', 'aadhar_number']
+    readonly_fields = ['avatar']
+
+    @admin.display(description='')
+    def avatar(self, obj):
+        """Smallest thumbnail, WebP with a JPEG fallback, instead of the full upload"""
+        urls = variant_urls(obj).get(str(min(settings.PROFILE_PICTURE_SIZES)))
+        if not urls:
+            return ''
+        return format_html(
+            '<picture><source srcset="{}" type="image/webp"><img src="{}" width="32" height="32" alt=""></picture>',
+            urls['webp'], urls['jpeg']
+        )
 
 
 @admin.register(AadharVerification)
@@ -33,3 +49,11 @@ class UserHistoryAdmin(admin.ModelAdmin):
     list_filter = ['action', 'timestamp']
     search_fields = ['user__username', 'action']
     readonly_fields = ['timestamp']
+
+
+@admin.register(ExpiringToken)
+class ExpiringTokenAdmin(admin.ModelAdmin):
+    list_display = ['user', 'created', 'expires_at']
+    list_filter = ['created', 'expires_at']
+    search_fields = ['user__username']
+    readonly_fields = ['key', 'created']
@@ -0,0 +1,169 @@
+"""
+Async login and registration endpoints
+
+Password hashing is CPU-bound, so under ASGI it must not run on the event
+loop or in Django's single thread-sensitive worker. The hashing unit of work
+is offloaded to a bounded pool; hashlib and argon2 release the GIL while
+hashing, so threads scale across cores without a process pool.
+"""
+import functools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .models import UserPreferences, UserHistory, ExpiringToken
+from .serializers import CustomUserSerializer, UserRegistrationSerializer
+
+# AUTH_HASHER_WORKERS = 0 runs hashing on Django's shared sync thread instead,
+# which keeps the work inside the caller's transaction (e.g. in TestCase)
+_executor = (
+    ThreadPoolExecutor(max_workers=settings.AUTH_HASHER_WORKERS, thread_name_prefix='auth-hasher')
+    if settings.AUTH_HASHER_WORKERS else None
+)
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _json_response(data, status_code):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _request_data(request):
+    """The request's fields, or None when a JSON body is not an object"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _invalid_body_response():
+    return _json_response({
+        'error': 'Request body must be a JSON object'
+    }, status.HTTP_400_BAD_REQUEST)
+
+
+def _with_fresh_connections(func):
+    """Pool threads outlive requests, so close their stale or expired connections like request threads do"""
+    @functools.wraps(func)
+    def run(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return run
+
+
+async def _offload(func, *args):
+    """Run func in the hasher pool, refusing work once the queue is full"""
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.AUTH_HASHER_MAX_PENDING:
+            raise HasherBusy()
+        _pending += 1
+    try:
+        if _executor is None:
+            return await sync_to_async(func)(*args)
+        return await sync_to_async(_with_fresh_connections(func), thread_sensitive=False, executor=_executor)(*args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+def _busy_response():
+    response = _json_response({
+        'error': 'Authentication service busy, please retry shortly'
+    }, status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    return response
+
+
+def _register(data):
+    serializer = UserRegistrationSerializer(data=data)
+    if not serializer.is_valid():
+        return serializer.errors, status.HTTP_400_BAD_REQUEST
+    user = serializer.save()
+    # Create user preferences
+    UserPreferences.objects.create(user=user)
+    # Create token
+    token = ExpiringToken.objects.issue(user)
+    return {
+        'message': 'User registered successfully',
+        'user': CustomUserSerializer(user).data,
+        'token': token.key,
+        'expires_at': token.expires_at
+    }, status.HTTP_201_CREATED
+
+
+def _login(username, password):
+    # Outdated hashes are upgraded to the configured hasher inside authenticate()
+    user = authenticate(username=username, password=password)
+    if not user:
+        return {'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED
+    token = ExpiringToken.objects.issue(user)
+    # Log user action
+    UserHistory.objects.create(
+        user=user,
+        action='login',
+        description=f'User logged in at {datetime.now()}'
+    )
+    return {
+        'message': 'Login successful',
+        'user': CustomUserSerializer(user).data,
+        'token': token.key,
+        'expires_at': token.expires_at
+    }, status.HTTP_200_OK
+
+
+@csrf_exempt
+@require_POST
+async def register(request):
+    """User registration"""
+    data = _request_data(request)
+    if data is None:
+        return _invalid_body_response()
+    try:
+        data, status_code = await _offload(_register, data)
+    except HasherBusy:
+        return _busy_response()
+    return _json_response(data, status_code)
+
+
+@csrf_exempt
+@require_POST
+async def login(request):
+    """User login"""
+    data = _request_data(request)
+    if data is None:
+        return _invalid_body_response()
+    username = data.get('username')
+    password = data.get('password')
+
+    if not username or not password:
+        return _json_response({
+            'error': 'Username and password are required'
+        }, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        data, status_code = await _offload(_login, username, password)
+    except HasherBusy:
+        return _busy_response()
+    return _json_response(data, status_code)
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import ExpiringToken
+
+CACHE_PREFIX = 'auth:token:'
+
+
+class LocalTokenCache:
+    """
+    Small per-process LRU of token snapshots with a TTL
+    Kept short-lived so revocations issued from other processes are
+    picked up quickly once the shared entry is gone
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, snapshot = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalTokenCache(
+    max_size=getattr(settings, 'TOKEN_AUTH_LOCAL_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_AUTH_LOCAL_CACHE_TTL', 2),
+)
+
+
+def _user_fields():
+    return [field.attname for field in get_user_model()._meta.concrete_fields]
+
+
+def make_snapshot(user):
+    """Capture the user's column values so the instance can be rebuilt without a query"""
+    return tuple(getattr(user, name) for name in _user_fields())
+
+
+def restore_snapshot(snapshot):
+    """Rebuild a fresh user instance from a snapshot"""
+    User = get_user_model()
+    return User.from_db('default', _user_fields(), list(snapshot))
+
+
+def evict_token(key):
+    """Drop a token from both cache tiers"""
+    local_cache.delete(key)
+    cache.delete(CACHE_PREFIX + key)
+
+
+def _evict_keys(keys):
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many([CACHE_PREFIX + key for key in keys])
+
+
+def evict_user_tokens(user_ids):
+    """Drop every cached token that belongs to the given users, again once the transaction commits"""
+    keys = list(ExpiringToken.objects.filter(user_id__in=list(user_ids)).values_list('key', flat=True))
+    _evict_keys(keys)
+    if transaction.get_connection().in_atomic_block:
+        # A request authenticating before the commit still reads the old user row and caches it
+        transaction.on_commit(lambda: _evict_keys(keys))
+
+
+def _cache_entry(key, entry):
+    cache.set(CACHE_PREFIX + key, entry, getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 60))
+    local_cache.set(key, entry)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Expiring-token authentication backed by a two-tier cache
+    Lookups hit the per-process LRU first, then the shared cache backend,
+    and only fall back to the token/user join on a miss
+    """
+    model = ExpiringToken
+
+    def authenticate_credentials(self, key):
+        entry = local_cache.get(key)
+        if entry is None:
+            entry = cache.get(CACHE_PREFIX + key)
+            if entry is None:
+                entry = self._load_entry(key)
+                _cache_entry(key, entry)
+            else:
+                local_cache.set(key, entry)
+
+        expires_at, snapshot = entry
+        now = timezone.now()
+        if expires_at <= now:
+            evict_token(key)
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        if expires_at - now < settings.AUTH_TOKEN_TTL - settings.AUTH_TOKEN_RENEW_INTERVAL:
+            expires_at = self._renew(key, now)
+            entry = (expires_at, snapshot)
+            _cache_entry(key, entry)
+
+        user = restore_snapshot(snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (user, ExpiringToken(key=key, user=user, expires_at=expires_at))
+
+    def _load_entry(self, key):
+        try:
+            token = ExpiringToken.objects.select_related('user').get(key=key)
+        except ExpiringToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return (token.expires_at, make_snapshot(token.user))
+
+    def _renew(self, key, now):
+        """Slide the expiry forward; at most one write per renew interval"""
+        expires_at = now + settings.AUTH_TOKEN_TTL
+        if not ExpiringToken.objects.filter(key=key).update(expires_at=expires_at):
+            evict_token(key)
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return expires_at
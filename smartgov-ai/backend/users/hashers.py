@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from settings"""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt with the CPU/memory cost (N) taken from settings"""
+
+    @property
+    def work_factor(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', hashers.ScryptPasswordHasher.work_factor)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with time and memory cost taken from settings (requires argon2-cffi)"""
+
+    @property
+    def time_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
@@ -0,0 +1,161 @@
+"""
+Profile picture pipeline
+
+After a new profile picture is saved, a worker pool re-encodes the original
+without EXIF metadata (capped at PROFILE_PICTURE_MAX_SIZE) and renders
+square thumbnails at each of PROFILE_PICTURE_SIZES as WebP with a JPEG
+fallback. The user row is switched to the re-encoded file only if the
+picture has not been replaced in the meantime.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .authentication import evict_user_tokens
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Pillow releases the GIL while decoding, resizing and encoding, so threads
+# are enough to keep this off the request path
+_executor = (
+    ThreadPoolExecutor(max_workers=settings.PROFILE_IMAGE_WORKERS, thread_name_prefix='profile-images')
+    if settings.PROFILE_IMAGE_WORKERS else None
+)
+
+
+def schedule_profile_picture(user_id, name):
+    """Process the picture once the transaction that saved it commits"""
+    def submit():
+        if _executor is None:
+            process_profile_picture(user_id, name)
+        else:
+            _executor.submit(process_profile_picture, user_id, name)
+    transaction.on_commit(submit)
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    # Only the pixels are written; EXIF, GPS and other metadata are dropped
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _open(name):
+    with default_storage.open(name, 'rb') as source:
+        data = source.read()
+    image = Image.open(io.BytesIO(data))
+    # Decode JPEGs at reduced scale when only a smaller copy is needed
+    image.draft('RGB', (settings.PROFILE_PICTURE_MAX_SIZE, settings.PROFILE_PICTURE_MAX_SIZE))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image, len(data)
+
+
+def render_variants(name):
+    """Return (original_name, files, variants) for a stored picture; files maps storage names to bytes"""
+    image, source_bytes = _open(name)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    files = {}
+
+    original = image.copy()
+    original.thumbnail((settings.PROFILE_PICTURE_MAX_SIZE, settings.PROFILE_PICTURE_MAX_SIZE), Image.LANCZOS)
+    original_name = f'profiles/{stem}.jpg'
+    files[original_name] = _encode(original, 'jpeg')
+
+    variants = {
+        'source_bytes': source_bytes,
+        'original_bytes': len(files[original_name]),
+        'sizes': {},
+    }
+    for size in settings.PROFILE_PICTURE_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        entry = {}
+        for fmt in FORMATS:
+            variant_name = f'profiles/variants/{stem}_{size}.{"jpg" if fmt == "jpeg" else fmt}'
+            files[variant_name] = _encode(thumbnail, fmt)
+            entry[fmt] = {'name': variant_name, 'bytes': len(files[variant_name])}
+        variants['sizes'][str(size)] = entry
+    return original_name, files, variants
+
+
+def process_profile_picture(user_id, name):
+    """Re-encode a profile picture and store its thumbnails"""
+    try:
+        original_name, files, variants = render_variants(name)
+    except Exception:
+        logger.exception('Could not process profile picture %s for user %s', name, user_id)
+        return False
+
+    stored = {}
+    for file_name, data in files.items():
+        # Storage may pick a new name if the target exists
+        stored[file_name] = default_storage.save(file_name, ContentFile(data))
+    original_name = stored[original_name]
+    for entry in variants['sizes'].values():
+        for fmt in entry.values():
+            fmt['name'] = stored[fmt['name']]
+
+    previous = CustomUser.objects.filter(pk=user_id).values_list('profile_picture_variants', flat=True).first()
+    # Compare-and-set: a picture uploaded meanwhile wins over this result
+    updated = CustomUser.objects.filter(pk=user_id, profile_picture=name).update(
+        profile_picture=original_name,
+        profile_picture_variants=variants
+    )
+    if not updated:
+        delete_files(stored.values())
+        return False
+
+    # profile_cache imports the serializers, which import this module
+    from .profile_cache import bump_profile_version
+
+    if original_name != name:
+        delete_files([name])
+    delete_files(variant_names(previous))
+    evict_user_tokens([user_id])
+    bump_profile_version(user_id)
+    return True
+
+
+def variant_names(variants):
+    names = []
+    for entry in ((variants or {}).get('sizes') or {}).values():
+        names.extend(fmt['name'] for fmt in entry.values())
+    return names
+
+
+def variant_urls(user, request=None):
+    """{size: {format: url}} for a user's profile picture thumbnails"""
+    urls = {}
+    for size, entry in ((user.profile_picture_variants or {}).get('sizes') or {}).items():
+        urls[size] = {}
+        for fmt, info in entry.items():
+            url = default_storage.url(info['name'])
+            urls[size][fmt] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def delete_files(names):
+    for file_name in names:
+        try:
+            default_storage.delete(file_name)
+        except OSError:
+            logger.warning('Could not delete %s', file_name)
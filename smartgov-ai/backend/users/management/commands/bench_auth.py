@@ -0,0 +1,45 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.test import APIRequestFactory
+
+from users.authentication import CachedTokenAuthentication, local_cache
+from users.models import CustomUser, ExpiringToken
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request token authentication overhead (plain vs cached)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(username='bench-auth-user', password='x')
+            token = ExpiringToken.objects.issue(user)
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+            plain = TokenAuthentication()
+            plain.model = ExpiringToken
+            self._report('TokenAuthentication', plain, request, count)
+            local_cache.clear()
+            cache.clear()
+            self._report('CachedTokenAuthentication', CachedTokenAuthentication(), request, count)
+
+            transaction.set_rollback(True)
+
+    def _report(self, label, authenticator, request, count):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(count):
+                authenticator.authenticate(request)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label:<28} {elapsed / count * 1e6:8.1f} us/request  '
+            f'{len(queries) / count:.3f} queries/request'
+        )
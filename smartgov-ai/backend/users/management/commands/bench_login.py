@@ -0,0 +1,39 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Benchmark password verification throughput (logins per second per core) for the configured hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=settings.AUTH_HASHER_WORKERS or 1)
+
+    def handle(self, *args, **options):
+        count = options['logins']
+        workers = options['workers']
+        cores = os.cpu_count() or 1
+        hasher = get_hasher()
+        encoded = make_password('bench-password')
+
+        self.stdout.write(f'Hasher: {hasher.algorithm} ({type(hasher).__module__}.{type(hasher).__name__})')
+
+        start = time.perf_counter()
+        for _ in range(count):
+            check_password('bench-password', encoded)
+        serial = count / (time.perf_counter() - start)
+        self.stdout.write(f'{"serial":<12} {serial:8.1f} logins/s')
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda _: check_password('bench-password', encoded), range(count)))
+            parallel = count / (time.perf_counter() - start)
+        self.stdout.write(
+            f'{f"{workers} threads":<12} {parallel:8.1f} logins/s  '
+            f'({parallel / min(workers, cores):.1f} logins/s per core, {cores} cores)'
+        )
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.images import process_profile_picture
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Report bandwidth saved by serving profile picture thumbnails instead of the uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--process-missing', action='store_true',
+            help='Generate thumbnails for pictures uploaded before the pipeline existed'
+        )
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+
+        if options['process_missing']:
+            processed = 0
+            for user_id, name in users.filter(profile_picture_variants={}).values_list('id', 'profile_picture'):
+                processed += process_profile_picture(user_id, name)
+            self.stdout.write(f'Processed {processed} profile pictures')
+
+        # Each page shows one avatar size; compare it against sending the upload
+        pages = {
+            'admin user list': str(min(settings.PROFILE_PICTURE_SIZES)),
+            'profile page': str(max(settings.PROFILE_PICTURE_SIZES)),
+        }
+        totals = {'source': 0, 'original': 0, 'count': 0, 'pending': 0}
+        served = {page: {'webp': 0, 'jpeg': 0} for page in pages}
+
+        for variants in users.values_list('profile_picture_variants', flat=True).iterator():
+            if not variants:
+                totals['pending'] += 1
+                continue
+            totals['count'] += 1
+            totals['source'] += variants['source_bytes']
+            totals['original'] += variants['original_bytes']
+            for page, size in pages.items():
+                for fmt in served[page]:
+                    served[page][fmt] += variants['sizes'][size][fmt]['bytes']
+
+        self.stdout.write(f"Pictures with thumbnails: {totals['count']} ({totals['pending']} pending)")
+        if not totals['count']:
+            return
+        self.stdout.write(
+            f"Stored originals: {_size(totals['source'])} uploaded -> {_size(totals['original'])} "
+            f"re-encoded ({_saved(totals['source'], totals['original'])} saved)"
+        )
+        for page, size in pages.items():
+            self.stdout.write(f'{page} ({size}px), bytes per view of every avatar:')
+            for fmt, total in served[page].items():
+                self.stdout.write(
+                    f"  {fmt:5s} {_size(totals['source'])} -> {_size(total)} "
+                    f"({_saved(totals['source'], total)} saved)"
+                )
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f'{num_bytes:.1f} {unit}'
+        num_bytes /= 1024
+    return f'{num_bytes:.1f} GB'
+
+
+def _saved(before, after):
+    return f'{(1 - after / before) * 100:.1f}%' if before else '0%'
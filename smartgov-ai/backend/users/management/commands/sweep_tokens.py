@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.models import ExpiringToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired API tokens in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and sweep every N seconds (0 = sweep once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = ExpiringToken.objects.purge_expired(chunk_size=options['chunk_size'])
+            self.stdout.write(f'Deleted {deleted} expired tokens')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_existing_tokens(apps, schema_editor):
+    """Carry over DRF tokens so signed-in clients keep working until they expire"""
+    Token = apps.get_model('authtoken', 'Token')
+    ExpiringToken = apps.get_model('users', 'ExpiringToken')
+    expires_at = django.utils.timezone.now() + settings.AUTH_TOKEN_TTL
+    ExpiringToken.objects.bulk_create(
+        (
+            ExpiringToken(key=token.key, user_id=token.user_id, created=token.created, expires_at=expires_at)
+            for token in Token.objects.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('authtoken', '0003_tokenproxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiringToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='expiring_token', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'API Token',
+                'verbose_name_plural': 'API Tokens',
+                'indexes': [models.Index(fields=['created'], name='users_token_created_idx'), models.Index(fields=['expires_at'], name='users_token_expires_idx')],
+            },
+        ),
+        migrations.RunPython(copy_existing_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:17
+
+from django.db import migrations, models
+
+
+def backfill_aadhar_hash(apps, schema_editor):
+    """Index existing verified numbers; later duplicates of a number stay unindexed"""
+    from users.aadhar import aadhar_digest
+
+    AadharVerification = apps.get_model('users', 'AadharVerification')
+    seen = set()
+    for verification in AadharVerification.objects.filter(verification_status='verified').order_by('pk').iterator():
+        digest = aadhar_digest(verification.aadhar_number)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        verification.aadhar_hash = digest
+        verification.save(update_fields=['aadhar_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_expiringtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aadharverification',
+            name='aadhar_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='aadharverification',
+            name='masked_aadhar',
+            field=models.CharField(max_length=14),
+        ),
+        migrations.RunPython(backfill_aadhar_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='annual_income',
+            field=models.PositiveIntegerField(blank=True, help_text='Annual household income in rupees', null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='gender',
+            field=models.CharField(blank=True, choices=[('male', 'Male'), ('female', 'Female'), ('other', 'Other')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='land_holding',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Agricultural land owned, in acres', max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='social_category',
+            field=models.CharField(blank=True, choices=[('general', 'General'), ('obc', 'OBC'), ('sc', 'SC'), ('st', 'ST'), ('ews', 'EWS')], max_length=10, null=True),
+        ),
+    ]
@@ -1,16 +1,35 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from datetime import datetime
+import binascii
+import os
 
 class CustomUser(AbstractUser):
     """Extended user model with additional fields"""
+    GENDER_CHOICES = [('male', 'Male'), ('female', 'Female'), ('other', 'Other')]
+    SOCIAL_CATEGORY_CHOICES = [
+        ('general', 'General'),
+        ('obc', 'OBC'),
+        ('sc', 'SC'),
+        ('st', 'ST'),
+        ('ews', 'EWS'),
+    ]
+
     age = models.IntegerField(null=True, blank=True)
     occupation = models.CharField(max_length=100, null=True, blank=True)
     state = models.CharField(max_length=50, null=True, blank=True)
+    # Used by structured scheme eligibility rules (schemes.rules)
+    annual_income = models.PositiveIntegerField(null=True, blank=True, help_text="Annual household income in rupees")
+    gender = models.CharField(max_length=10, choices=GENDER_CHOICES, null=True, blank=True)
+    social_category = models.CharField(max_length=10, choices=SOCIAL_CATEGORY_CHOICES, null=True, blank=True)
+    land_holding = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, help_text="Agricultural land owned, in acres")
     phone_number = models.CharField(max_length=20, null=True, blank=True)
     aadhar_number = models.CharField(max_length=12, unique=True, null=True, blank=True)
     aadhar_verified = models.BooleanField(default=False)
     profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)  # Thumbnails from users.images
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -22,12 +41,25 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.email or self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored picture so a new upload can be detected on save
+        instance._loaded_profile_picture = instance.__dict__.get('profile_picture')
+        return instance
+
+    @property
+    def profile_picture_changed(self):
+        loaded = getattr(self, '_loaded_profile_picture', None)
+        return (self.profile_picture.name or None) != (getattr(loaded, 'name', loaded) or None)
+
 
 class AadharVerification(models.Model):
     """Model to store Aadhar verification details"""
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='aadhar_verification')
     aadhar_number = models.CharField(max_length=12)
-    masked_aadhar = models.CharField(max_length=12)  # Last 4 digits visible
+    aadhar_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)  # Keyed HMAC for lookups
+    masked_aadhar = models.CharField(max_length=14)  # Last 4 digits visible
     verification_status = models.CharField(
         max_length=20,
         choices=[('pending', 'Pending'), ('verified', 'Verified'), ('failed', 'Failed')],
@@ -85,3 +117,78 @@ class UserHistory(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.action}"
+
+
+class ExpiringTokenManager(models.Manager):
+    """Issue, renew, rotate and sweep expiring API tokens"""
+
+    def issue(self, user):
+        """Return the user's token, renewing it or replacing it if it has expired"""
+        now = timezone.now()
+        # get_or_create recovers when a concurrent first login created the row first
+        token, created = self.get_or_create(
+            user=user, defaults={'key': generate_token_key(), 'expires_at': now + settings.AUTH_TOKEN_TTL}
+        )
+        if created:
+            return token
+        if token.expires_at <= now:
+            return self.rotate(user)
+        token.expires_at = now + settings.AUTH_TOKEN_TTL
+        self.filter(pk=token.pk).update(expires_at=token.expires_at)
+        return token
+
+    def rotate(self, user):
+        """Replace the user's token key, revoking the old one"""
+        from .authentication import evict_token
+
+        now = timezone.now()
+        old_keys = list(self.filter(user=user).values_list('key', flat=True))
+        token, created = self.update_or_create(
+            user=user,
+            defaults={'key': generate_token_key(), 'created': now, 'expires_at': now + settings.AUTH_TOKEN_TTL}
+        )
+        for key in old_keys:
+            evict_token(key)
+        return token
+
+    def purge_expired(self, chunk_size=1000):
+        """Delete expired tokens in small chunks so each delete holds its locks briefly"""
+        deleted = 0
+        while True:
+            pks = list(
+                self.filter(expires_at__lte=timezone.now())
+                .order_by('expires_at')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                return deleted
+            deleted += self.filter(pk__in=pks).delete()[0]
+
+
+def generate_token_key():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+class ExpiringToken(models.Model):
+    """API token that expires and slides forward while it is being used"""
+    key = models.CharField(max_length=40, unique=True)
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='expiring_token')
+    created = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    objects = ExpiringTokenManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], name='users_token_created_idx'),
+            models.Index(fields=['expires_at'], name='users_token_expires_idx'),
+        ]
+        verbose_name = 'API Token'
+        verbose_name_plural = 'API Tokens'
+
+    def __str__(self):
+        return f"Token for {self.user.username}"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
@@ -0,0 +1,183 @@
+"""
+Bulk citizen onboarding from CSV/JSONL uploads
+
+Rows are read lazily from the uploaded file and processed in fixed-size
+chunks: validation, one username lookup per chunk, password hashing in a
+process pool, then batched inserts of users, preferences and tokens. Errors
+are streamed into a CSV report, so memory use depends on the chunk size,
+not on the file size.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import CustomUser, UserPreferences, ExpiringToken, generate_token_key
+from .serializers import BulkUserRowSerializer
+
+REPORT_DIR = 'onboarding_reports'
+REPORT_FIELDS = ['row', 'username', 'errors']
+# Rows that could not be read carry the reason under this key
+INVALID = '__invalid__'
+
+# Hashing is CPU-bound and holds the GIL, so it needs processes. The pool is
+# shared by every upload; its workers start on first use and stay warm, so
+# interpreter start-up and the Django import are paid once per worker
+_pool = (
+    ProcessPoolExecutor(
+        max_workers=settings.ONBOARDING_HASH_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+    if settings.ONBOARDING_HASH_WORKERS else None
+)
+
+
+class OnboardingResult:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.report_id = None
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.failed,
+            'report_id': self.report_id,
+        }
+
+
+def iter_rows(upload, file_format):
+    """Yield row dicts from an uploaded CSV or JSONL file without loading it whole"""
+    # Undecodable bytes become U+FFFD so one bad row doesn't fail the whole upload
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+    if file_format == 'csv':
+        for row in csv.DictReader(text):
+            row = {key: value for key, value in row.items() if key and value not in (None, '')}
+            if any('\ufffd' in str(value) for value in row.values()):
+                yield {INVALID: 'Not valid UTF-8 text.'}
+            else:
+                yield row
+    else:
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            if '\ufffd' in line:
+                yield {INVALID: 'Not valid UTF-8 text.'}
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {INVALID: 'Not a JSON object.'}
+
+
+def detect_format(upload, requested=None):
+    if requested in ('csv', 'jsonl'):
+        return requested
+    name = (upload.name or '').lower()
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def report_path(report_id):
+    return f'{REPORT_DIR}/{report_id}.csv'
+
+
+def import_users(upload, file_format=None):
+    """Create users, preferences and tokens for every valid row of the upload"""
+    file_format = detect_format(upload, file_format)
+    chunk_size = settings.ONBOARDING_CHUNK_SIZE
+    result = OnboardingResult()
+
+    with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as report:
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+
+        rows = enumerate(iter_rows(upload, file_format), start=1)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            result.processed += len(chunk)
+            _import_chunk(chunk, writer, result)
+
+        if result.failed:
+            result.report_id = uuid.uuid4().hex
+            report.seek(0)
+            default_storage.save(report_path(result.report_id), File(report))
+
+    return result
+
+
+def _import_chunk(chunk, writer, result):
+    def fail(row_number, username, errors):
+        writer.writerow({'row': row_number, 'username': username or '', 'errors': json.dumps(errors)})
+        result.failed += 1
+
+    valid = []
+    seen = set()
+    for row_number, row in chunk:
+        if INVALID in row:
+            fail(row_number, '', {'row': [row[INVALID]]})
+            continue
+        serializer = BulkUserRowSerializer(data=row)
+        if not serializer.is_valid():
+            fail(row_number, row.get('username'), serializer.errors)
+            continue
+        username = serializer.validated_data['username']
+        if username in seen:
+            fail(row_number, username, {'username': ['Duplicate username in file.']})
+            continue
+        seen.add(username)
+        valid.append((row_number, serializer.validated_data))
+
+    existing = set(
+        CustomUser.objects.filter(username__in=seen).values_list('username', flat=True)
+    )
+    accepted = []
+    for row_number, data in valid:
+        if data['username'] in existing:
+            fail(row_number, data['username'], {'username': ['A user with that username already exists.']})
+        else:
+            accepted.append((row_number, data))
+    if not accepted:
+        return
+
+    passwords = [data.pop('password') for _, data in accepted]
+    hashes = _pool.map(make_password, passwords, chunksize=32) if _pool else map(make_password, passwords)
+    users = [CustomUser(password=hashed, **data) for (_, data), hashed in zip(accepted, hashes)]
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                ids = dict(
+                    CustomUser.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id')
+                )
+                for user in users:
+                    user.pk = ids[user.username]
+            UserPreferences.objects.bulk_create([UserPreferences(user=user) for user in users])
+            ExpiringToken.objects.bulk_create([
+                ExpiringToken(user=user, key=generate_token_key(), created=now, expires_at=now + settings.AUTH_TOKEN_TTL)
+                for user in users
+            ])
+    except IntegrityError as e:
+        # e.g. a username registered concurrently; the whole chunk is rolled back
+        for row_number, data in accepted:
+            fail(row_number, data['username'], {'non_field_errors': [f'Could not be saved: {e}']})
+        return
+    result.created += len(users)
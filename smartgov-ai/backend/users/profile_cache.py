@@ -0,0 +1,61 @@
+"""
+Cached profile snapshots
+
+A snapshot holds the serialized profile and preferences of one user and is
+built with a single select_related query. Snapshots are stored under the
+user's current version stamp; every write to the user, their preferences or
+their Aadhar verification replaces the stamp, so a snapshot built from data
+read before the write can never be served afterwards. Writes inside a
+transaction replace it again on commit, since a snapshot built while the
+transaction was open still read the old rows.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CustomUser, UserPreferences
+from .serializers import UserProfileSerializer, UserPreferencesSerializer
+
+VERSION_KEY = 'profile:version:{}'
+SNAPSHOT_KEY = 'profile:snapshot:{}:{}'
+
+
+def _bump(user_ids):
+    cache.set_many({VERSION_KEY.format(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def bump_profile_version(*user_ids):
+    """Invalidate the cached snapshots of the given users"""
+    _bump(user_ids)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(user_ids))
+
+
+def _current_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_profile_snapshot(user_id):
+    """Return {'profile': ..., 'preferences': ...} for the user, zero queries when warm"""
+    version = _current_version(user_id)
+    key = SNAPSHOT_KEY.format(user_id, version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = CustomUser.objects.select_related('preferences', 'aadhar_verification').get(pk=user_id)
+        try:
+            preferences = UserPreferencesSerializer(user.preferences).data
+        except UserPreferences.DoesNotExist:
+            preferences = None
+        snapshot = {
+            'profile': UserProfileSerializer(user).data,
+            'preferences': preferences,
+        }
+        cache.set(key, snapshot, settings.PROFILE_CACHE_TTL)
+    return snapshot
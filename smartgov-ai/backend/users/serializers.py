@@ -1,15 +1,25 @@
 from rest_framework import serializers
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from .images import variant_urls
 from .models import CustomUser, AadharVerification, UserPreferences, UserHistory
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class ProfilePictureVariantsMixin(serializers.Serializer):
+    profile_picture_variants = serializers.SerializerMethodField()
+
+    def get_profile_picture_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
+
+
+class CustomUserSerializer(ProfilePictureVariantsMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'age', 'occupation', 'state', 'phone_number',
+            'age', 'occupation', 'state', 'annual_income', 'gender',
+            'social_category', 'land_holding', 'phone_number',
             'aadhar_number', 'aadhar_verified', 'profile_picture',
-            'created_at', 'updated_at'
+            'profile_picture_variants', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'aadhar_number', 'aadhar_verified', 'created_at', 'updated_at']
         extra_kwargs = {
@@ -30,7 +40,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = [
             'username', 'email', 'password', 'password_confirm',
             'first_name', 'last_name', 'age', 'occupation', 'state',
-            'phone_number'
+            'annual_income', 'gender', 'social_category', 'land_holding', 'phone_number'
         ]
 
     def validate(self, data):
@@ -44,6 +54,25 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
+class BulkUserRowSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of a bulk onboarding file
+    Username uniqueness is checked per chunk by the importer, not per row
+    """
+    password = serializers.CharField(write_only=True, min_length=8)
+
+    class Meta:
+        model = CustomUser
+        fields = [
+            'username', 'email', 'password', 'first_name', 'last_name',
+            'age', 'occupation', 'state', 'annual_income', 'gender',
+            'social_category', 'land_holding', 'phone_number'
+        ]
+        extra_kwargs = {
+            'username': {'validators': [UnicodeUsernameValidator()]}
+        }
+
+
 class AadharVerificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = AadharVerification
@@ -67,7 +96,7 @@ class UserHistorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(ProfilePictureVariantsMixin, serializers.ModelSerializer):
     preferences = UserPreferencesSerializer(read_only=True)
     aadhar_verification = AadharVerificationSerializer(read_only=True)
 
@@ -75,7 +104,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'age', 'occupation', 'state', 'phone_number',
-            'aadhar_verified', 'profile_picture', 'preferences',
-            'aadhar_verification', 'created_at'
+            'age', 'occupation', 'state', 'annual_income', 'gender',
+            'social_category', 'land_holding', 'phone_number',
+            'aadhar_verified', 'profile_picture', 'profile_picture_variants',
+            'preferences', 'aadhar_verification', 'created_at'
         ]
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import evict_token, evict_user_tokens
+from .images import delete_files, schedule_profile_picture, variant_names
+from .models import CustomUser, ExpiringToken, UserPreferences, AadharVerification
+from .profile_cache import bump_profile_version
+
+
+@receiver(post_save, sender=CustomUser)
+def evict_cached_user(sender, instance, created, update_fields=None, **kwargs):
+    """Password changes, deactivation and profile edits invalidate cached auth snapshots"""
+    if created:
+        return
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    evict_user_tokens([instance.pk])
+    bump_profile_version(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def process_profile_picture(sender, instance, created, **kwargs):
+    """New uploads get re-encoded with thumbnails; removed pictures drop their thumbnails"""
+    if not instance.profile_picture_changed:
+        return
+    instance._loaded_profile_picture = instance.profile_picture.name
+    if instance.profile_picture:
+        schedule_profile_picture(instance.pk, instance.profile_picture.name)
+    elif instance.profile_picture_variants:
+        names = variant_names(instance.profile_picture_variants)
+        CustomUser.objects.filter(pk=instance.pk).update(profile_picture_variants={})
+        instance.profile_picture_variants = {}
+        transaction.on_commit(lambda: delete_files(names))
+
+
+@receiver(post_save, sender=UserPreferences)
+@receiver(post_delete, sender=UserPreferences)
+@receiver(post_save, sender=AadharVerification)
+@receiver(post_delete, sender=AadharVerification)
+def invalidate_profile_snapshot(sender, instance, **kwargs):
+    """Preference and verification writes change the cached profile snapshot"""
+    bump_profile_version(instance.user_id)
+
+
+@receiver(post_delete, sender=ExpiringToken)
+def evict_deleted_token(sender, instance, **kwargs):
+    """Logout, sweeping and token deletion revoke the cached entry immediately"""
+    evict_token(instance.key)
@@ -1,3 +1,51 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .authentication import CACHE_PREFIX, local_cache
+from .models import CustomUser, ExpiringToken
+
+
+class CachedTokenEvictionTests(TestCase):
+    """Cached auth snapshots must not outlive logout or user changes"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = CustomUser.objects.create_user(username='asha', password='secret-123')
+        self.token = ExpiringToken.objects.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_profile(self):
+        return self.client.get('/api/users/profile/profile/')
+
+    def assert_cached(self, cached):
+        self.assertEqual(cache.get(CACHE_PREFIX + self.token.key) is not None, cached)
+        self.assertEqual(local_cache.get(self.token.key) is not None, cached)
+
+    def test_logout_evicts_token(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+        self.assert_cached(True)
+
+        self.assertEqual(self.client.post('/api/users/auth/logout/').status_code, 200)
+
+        self.assert_cached(False)
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_user_save_evicts_token(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+        self.assert_cached(True)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assert_cached(False)
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_last_login_save_keeps_token(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+
+        self.user.save(update_fields=['last_login'])
+
+        self.assert_cached(True)
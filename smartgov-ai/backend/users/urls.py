@@ -1,15 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AuthViewSet, UserViewSet, AadharVerificationViewSet, UserPreferencesViewSet
+from . import async_views
+from .views import (
+    AuthViewSet, UserViewSet, AadharVerificationViewSet,
+    UserPreferencesViewSet, BulkOnboardingViewSet
+)
 
 router = DefaultRouter()
 router.register(r'auth', AuthViewSet, basename='auth')
 router.register(r'profile', UserViewSet, basename='user')
 router.register(r'aadhar', AadharVerificationViewSet, basename='aadhar')
 router.register(r'preferences', UserPreferencesViewSet, basename='preferences')
+router.register(r'onboarding', BulkOnboardingViewSet, basename='onboarding')
 
 app_name = 'users'
 
 urlpatterns = [
+    path('auth/register/', async_views.register, name='auth-register'),
+    path('auth/login/', async_views.login, name='auth-login'),
     path('', include(router.urls)),
 ]
@@ -1,75 +1,39 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.parsers import MultiPartParser
+from django.core.files.storage import default_storage
+from django.http import FileResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from asgiref.sync import async_to_sync
 from datetime import datetime, timedelta
 
-from .models import CustomUser, AadharVerification, UserPreferences, UserHistory
+from .models import CustomUser, AadharVerification, UserPreferences, UserHistory, ExpiringToken
+from .onboarding import import_users, report_path
+from .aadhar import aadhar_digest, mask_aadhar, is_valid_format, get_verification_client, verify_many
+from .authentication import evict_user_tokens
+from .profile_cache import get_profile_snapshot, bump_profile_version
 from .serializers import (
-    CustomUserSerializer, UserRegistrationSerializer,
+    CustomUserSerializer,
     AadharVerificationSerializer, UserPreferencesSerializer,
-    UserHistorySerializer, UserProfileSerializer
+    UserHistorySerializer
 )
 
 
 class AuthViewSet(viewsets.ViewSet):
     """
-    API endpoint for user authentication (registration, login, logout)
+    API endpoint for user authentication (logout, token rotation)
+    Registration and login are async views in async_views.py
     """
     permission_classes = [AllowAny]
 
-    @action(detail=False, methods=['post'])
-    def register(self, request):
-        """User registration"""
-        serializer = UserRegistrationSerializer(data=request.data)
-        if serializer.is_valid():
-            user = serializer.save()
-            # Create user preferences
-            UserPreferences.objects.create(user=user)
-            # Create token
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({
-                'message': 'User registered successfully',
-                'user': CustomUserSerializer(user).data,
-                'token': token.key
-            }, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    @action(detail=False, methods=['post'])
-    def login(self, request):
-        """User login"""
-        username = request.data.get('username')
-        password = request.data.get('password')
-
-        if not username or not password:
-            return Response({
-                'error': 'Username and password are required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        user = authenticate(username=username, password=password)
-        if user:
-            token, created = Token.objects.get_or_create(user=user)
-            # Log user action
-            UserHistory.objects.create(
-                user=user,
-                action='login',
-                description=f'User logged in at {datetime.now()}'
-            )
-            return Response({
-                'message': 'Login successful',
-                'user': CustomUserSerializer(user).data,
-                'token': token.key
-            })
-        return Response({
-            'error': 'Invalid credentials'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def logout(self, request):
         """User logout"""
-        request.user.auth_token.delete()
+        ExpiringToken.objects.filter(user=request.user).delete()
         UserHistory.objects.create(
             user=request.user,
             action='logout',
@@ -77,6 +41,21 @@ class AuthViewSet(viewsets.ViewSet):
         )
         return Response({'message': 'Logged out successfully'})
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def rotate_token(self, request):
+        """Issue a new token and revoke the current one"""
+        token = ExpiringToken.objects.rotate(request.user)
+        UserHistory.objects.create(
+            user=request.user,
+            action='token_rotation',
+            description=f'API token rotated at {datetime.now()}'
+        )
+        return Response({
+            'message': 'Token rotated successfully',
+            'token': token.key,
+            'expires_at': token.expires_at
+        })
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -92,8 +71,7 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def profile(self, request):
         """Get user profile with preferences and history"""
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
+        return Response(get_profile_snapshot(request.user.pk)['profile'])
 
     @action(detail=False, methods=['put'])
     def update_profile(self, request):
@@ -127,64 +105,182 @@ class AadharVerificationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'])
     def verify_aadhar(self, request):
         """
-        Verify Aadhar number
-        In production, this would call actual Aadhar verification service
+        Verify Aadhar number through the configured verification client
+        Duplicates are detected through the indexed keyed-hash column
         """
         aadhar_number = request.data.get('aadhar_number')
 
-        if not aadhar_number or len(aadhar_number) != 12:
+        if not is_valid_format(aadhar_number):
             return Response({
                 'error': 'Invalid Aadhar number'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        digest = aadhar_digest(aadhar_number)
         try:
-            # Check if already verified
-            existing = AadharVerification.objects.filter(
-                user=request.user,
-                verification_status='verified'
-            ).first()
+            verification = AadharVerification.objects.filter(user=request.user).first()
 
-            if existing:
+            # Check if already verified
+            if verification and verification.verification_status == 'verified':
                 return Response({
                     'message': 'Aadhar already verified',
-                    'masked_aadhar': existing.masked_aadhar
+                    'masked_aadhar': verification.masked_aadhar
                 })
 
-            # Create or update verification record
-            verification, created = AadharVerification.objects.get_or_create(
-                user=request.user,
-                defaults={
-                    'aadhar_number': aadhar_number,
-                    'masked_aadhar': 'XXXX-XXXX-' + aadhar_number[-4:]
-                }
-            )
-
-            # Simulate verification (in production, call actual API)
-            verification.verification_status = 'verified'
-            verification.verification_date = datetime.now()
-            verification.save()
-
-            # Update user
-            request.user.aadhar_number = aadhar_number
-            request.user.aadhar_verified = True
-            request.user.save()
-
-            UserHistory.objects.create(
-                user=request.user,
-                action='aadhar_verification',
-                description='Aadhar verified successfully'
-            )
+            if AadharVerification.objects.filter(aadhar_hash=digest).exclude(user=request.user).exists():
+                return Response({
+                    'error': 'Aadhar number is already registered to another account'
+                }, status=status.HTTP_409_CONFLICT)
+
+            result = get_verification_client().verify(aadhar_number)
+
+            with transaction.atomic():
+                verification = verification or AadharVerification(user=request.user)
+                verification.aadhar_number = aadhar_number
+                verification.aadhar_hash = digest if result.verified else None
+                verification.masked_aadhar = mask_aadhar(aadhar_number)
+                verification.verification_status = 'verified' if result.verified else 'failed'
+                verification.verification_date = timezone.now()
+                verification.save()
+
+                if not result.verified:
+                    return Response({
+                        'error': result.reason or 'Aadhar verification failed'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                # Update user
+                request.user.aadhar_number = aadhar_number
+                request.user.aadhar_verified = True
+                request.user.save(update_fields=['aadhar_number', 'aadhar_verified', 'updated_at'])
+
+                UserHistory.objects.create(
+                    user=request.user,
+                    action='aadhar_verification',
+                    description='Aadhar verified successfully'
+                )
 
             return Response({
                 'message': 'Aadhar verified successfully',
                 'masked_aadhar': verification.masked_aadhar
             }, status=status.HTTP_201_CREATED)
 
+        except IntegrityError:
+            return Response({
+                'error': 'Aadhar number is already registered to another account'
+            }, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def batch_verify(self, request):
+        """
+        Verify many users' Aadhar numbers at once (staff only)
+        Expects {"records": [{"user_id": ..., "aadhar_number": ...}, ...]}
+        """
+        records = request.data.get('records')
+        if not isinstance(records, list) or not records:
+            return Response({
+                'error': 'records must be a non-empty list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(records)
+        pending = {}
+        digests = {}
+        for index, record in enumerate(records):
+            user_id = record.get('user_id') if isinstance(record, dict) else None
+            aadhar_number = record.get('aadhar_number') if isinstance(record, dict) else None
+            if not isinstance(user_id, int) or not is_valid_format(aadhar_number):
+                results[index] = {'user_id': user_id, 'status': 'invalid', 'error': 'Invalid record'}
+                continue
+            if user_id in pending:
+                results[index] = {'user_id': user_id, 'status': 'duplicate', 'error': 'User appears more than once in batch'}
+                continue
+            digest = aadhar_digest(aadhar_number)
+            if digest in digests:
+                results[index] = {'user_id': user_id, 'status': 'duplicate', 'error': 'Duplicate Aadhar number in batch'}
+                continue
+            digests[digest] = user_id
+            pending[user_id] = (index, aadhar_number, digest)
+
+        known_users = set(CustomUser.objects.filter(pk__in=pending).values_list('pk', flat=True))
+        owners = dict(
+            AadharVerification.objects.filter(aadhar_hash__in=digests).values_list('aadhar_hash', 'user_id')
+        )
+        already_verified = set(
+            AadharVerification.objects.filter(user_id__in=pending, verification_status='verified')
+            .values_list('user_id', flat=True)
+        )
+        for user_id in list(pending):
+            index, aadhar_number, digest = pending[user_id]
+            if user_id not in known_users:
+                results[index] = {'user_id': user_id, 'status': 'invalid', 'error': 'User not found'}
+            elif user_id in already_verified:
+                results[index] = {'user_id': user_id, 'status': 'verified'}
+            elif owners.get(digest, user_id) != user_id:
+                results[index] = {'user_id': user_id, 'status': 'duplicate', 'error': 'Aadhar number registered to another account'}
+            else:
+                continue
+            del pending[user_id]
+
+        user_ids = list(pending)
+        outcomes = async_to_sync(verify_many)(
+            [pending[user_id][1] for user_id in user_ids],
+            settings.AADHAR_BATCH_CONCURRENCY
+        )
+
+        now = timezone.now()
+        verifications = []
+        verified_users = []
+        for user_id, outcome in zip(user_ids, outcomes):
+            index, aadhar_number, digest = pending[user_id]
+            verifications.append(AadharVerification(
+                user_id=user_id,
+                aadhar_number=aadhar_number,
+                aadhar_hash=digest if outcome.verified else None,
+                masked_aadhar=mask_aadhar(aadhar_number),
+                verification_status='verified' if outcome.verified else 'failed',
+                verification_date=now
+            ))
+            if outcome.verified:
+                verified_users.append(CustomUser(pk=user_id, aadhar_number=aadhar_number, aadhar_verified=True, updated_at=now))
+                results[index] = {'user_id': user_id, 'status': 'verified'}
+            else:
+                results[index] = {'user_id': user_id, 'status': 'failed', 'error': outcome.reason}
+
+        try:
+            with transaction.atomic():
+                AadharVerification.objects.bulk_create(
+                    verifications,
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['aadhar_number', 'aadhar_hash', 'masked_aadhar', 'verification_status', 'verification_date']
+                )
+                CustomUser.objects.bulk_update(
+                    verified_users, ['aadhar_number', 'aadhar_verified', 'updated_at'], batch_size=500
+                )
+                UserHistory.objects.bulk_create([
+                    UserHistory(user_id=user.pk, action='aadhar_verification', description='Aadhar verified successfully')
+                    for user in verified_users
+                ], batch_size=500)
+        except IntegrityError as e:
+            return Response({
+                'error': f'Batch could not be saved: {e}'
+            }, status=status.HTTP_409_CONFLICT)
+
+        # Bulk writes bypass post_save, so drop cached auth and profile snapshots explicitly
+        evict_user_tokens([user.pk for user in verified_users])
+        bump_profile_version(*[verification.user_id for verification in verifications])
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return Response({
+            'summary': summary,
+            'results': results
+        })
+
     @action(detail=False, methods=['get'])
     def verification_status(self, request):
         """Get Aadhar verification status"""
@@ -209,11 +305,12 @@ class UserPreferencesViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def get_preferences(self, request):
         """Get user preferences"""
-        preferences, created = UserPreferences.objects.get_or_create(
-            user=request.user
-        )
-        serializer = UserPreferencesSerializer(preferences)
-        return Response(serializer.data)
+        preferences = get_profile_snapshot(request.user.pk)['preferences']
+        if preferences is None:
+            preferences = UserPreferencesSerializer(
+                UserPreferences.objects.get_or_create(user=request.user)[0]
+            ).data
+        return Response(preferences)
 
     @action(detail=False, methods=['put'])
     def update_preferences(self, request):
@@ -227,3 +324,45 @@ class UserPreferencesViewSet(viewsets.ViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+
+class BulkOnboardingViewSet(viewsets.ViewSet):
+    """
+    Staff-only bulk citizen onboarding from CSV/JSONL spreadsheets
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    @action(detail=False, methods=['post'])
+    def import_users(self, request):
+        """
+        Import users from an uploaded file
+        Rows failing validation are skipped and listed in a downloadable error report
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({
+                'error': 'file is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        result = import_users(upload, request.data.get('format'))
+        UserHistory.objects.create(
+            user=request.user,
+            action='bulk_onboarding',
+            description=f'Imported {result.created} users ({result.failed} rows failed)'
+        )
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def report(self, request, pk=None):
+        """Download the per-row error report of an import"""
+        if not pk or not pk.isalnum() or not default_storage.exists(report_path(pk)):
+            return Response({
+                'error': 'Report not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            default_storage.open(report_path(pk), 'rb'),
+            as_attachment=True,
+            filename=f'onboarding-errors-{pk}.csv',
+            content_type='text/csv'
+        )
@@ -0,0 +1,57 @@
+"""
+Token authentication for WebSocket connections
+
+Browsers can't set headers on a WebSocket handshake, so the token is read
+from the ?token= query parameter, or from an Authorization: Token header
+for other clients. It is checked with the same cached, expiring-token
+lookup as the REST API. Tokens expire and rotate while sockets stay open,
+so consumers call token_still_valid() periodically (on every ping) and close
+sockets whose token no longer authenticates the same user.
+"""
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+
+
+def _token(scope):
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return token[0]
+    headers = dict(scope.get('headers', []))
+    auth = headers.get(b'authorization', b'').decode().split()
+    if len(auth) == 2 and auth[0].lower() == 'token':
+        return auth[1]
+    return None
+
+
+@database_sync_to_async
+def _authenticate(key):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except exceptions.AuthenticationFailed:
+        return AnonymousUser()
+    return user
+
+
+async def token_still_valid(scope):
+    """Whether the token the socket connected with still authenticates its user"""
+    if 'auth_token' not in scope:
+        return True
+    user = await _authenticate(scope['auth_token'])
+    return user.is_authenticated and user.pk == scope['user'].pk
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """Sets scope['user'] from the connection's API token"""
+
+    async def __call__(self, scope, receive, send):
+        key = _token(scope)
+        scope['user'] = await _authenticate(key) if key else AnonymousUser()
+        if key:
+            scope['auth_token'] = key
+        return await super().__call__(scope, receive, send)